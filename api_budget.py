@@ -0,0 +1,237 @@
+import os
+import json
+import sqlite3
+import argparse
+import logging
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone, timedelta
+
+USAGE_FILENAME = "_api_usage.sqlite"
+
+# API calls charged per request, by endpoint (the first segment of the request path).
+# Fundamentals requests are billed as 10 API calls each by EODHD.
+DEFAULT_COSTS = {
+    "fundamentals": 10,
+    "exchanges-list": 1,
+    "exchange-symbol-list": 1,
+    "user": 0,  # Account details, used to reconcile the ledger, are not billed
+}
+
+# Cost of a request to an endpoint missing from the cost table
+DEFAULT_COST = 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS usage (
+    day TEXT NOT NULL,
+    endpoint TEXT NOT NULL,
+    requests INTEGER NOT NULL DEFAULT 0,
+    calls INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, endpoint)
+);
+CREATE TABLE IF NOT EXISTS reported (
+    day TEXT PRIMARY KEY,
+    calls INTEGER NOT NULL,
+    local_calls INTEGER NOT NULL,
+    checked_at REAL NOT NULL
+);
+"""
+
+def usage_path(data_dir):
+    """
+    Returns the default location of the API usage ledger for a data directory.
+    """
+    return os.path.join(data_dir, USAGE_FILENAME)
+
+def load_costs(path=None):
+    """
+    Returns the cost table: the defaults, updated with the endpoint -> cost mapping in the
+    JSON file at `path`, e.g. {"fundamentals": 10, "eod": 1}.
+    """
+    costs = dict(DEFAULT_COSTS)
+    if path:
+        with open(path, "r") as file:
+            costs.update({endpoint: int(cost) for endpoint, cost in json.load(file).items()})
+    return costs
+
+def endpoint_of(path):
+    """
+    Returns the endpoint a request path belongs to, e.g. 'fundamentals/AAPL.US' -> 'fundamentals'.
+    """
+    return path.strip("/").split("/", 1)[0]
+
+def usage_day(timestamp=None):
+    """
+    Returns the quota day (UTC date, as EODHD resets the daily quota at midnight UTC) of a timestamp.
+    """
+    return datetime.fromtimestamp(timestamp or time.time(), timezone.utc).strftime("%Y-%m-%d")
+
+class ApiUsage:
+    """
+    Per-day ledger of API requests and the calls they were charged, by endpoint, kept in
+    a SQLite file so every process using the same API key can share it.
+
+    The ledger only sees the requests made by these tools. `reconcile()` folds in the
+    usage the API itself reports, so calls made elsewhere with the same key count too.
+    """
+
+    def __init__(self, db_path, costs=None):
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.costs = costs or dict(DEFAULT_COSTS)
+        self.lock = threading.Lock()
+        # Requests are recorded from the fetch worker threads
+        self.conn = sqlite3.connect(db_path, timeout=60, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def cost(self, endpoint):
+        """
+        Returns the number of API calls a request to `endpoint` is charged.
+        """
+        return self.costs.get(endpoint, DEFAULT_COST)
+
+    def record(self, path):
+        """
+        Charges one request to the endpoint of `path` to today's usage.
+        """
+        endpoint = endpoint_of(path)
+        with self.lock, self.conn:
+            self.conn.execute(
+                """
+                INSERT INTO usage (day, endpoint, requests, calls) VALUES (?, ?, 1, ?)
+                ON CONFLICT(day, endpoint) DO UPDATE SET requests = requests + 1, calls = calls + excluded.calls
+                """,
+                (usage_day(), endpoint, self.cost(endpoint)),
+            )
+
+    def local_calls(self, day=None):
+        """
+        Returns the calls recorded in this ledger on `day` (default: today).
+        """
+        with self.lock:
+            return self.conn.execute("SELECT COALESCE(SUM(calls), 0) FROM usage WHERE day = ?",
+                                     (day or usage_day(),)).fetchone()[0]
+
+    def used(self, day=None):
+        """
+        Returns the calls spent on `day` (default: today): the local ledger, or the usage
+        last reported by the API plus what was recorded since, whichever is higher.
+        """
+        day = day or usage_day()
+        local = self.local_calls(day)
+        with self.lock:
+            row = self.conn.execute("SELECT calls, local_calls FROM reported WHERE day = ?", (day,)).fetchone()
+        if row is None:
+            return local
+        reported, local_at_report = row
+        return max(local, reported + local - local_at_report)
+
+    def reconcile(self, reported_calls, day=None):
+        """
+        Stores the number of calls the API reports as spent on `day` (default: today).
+        """
+        day = day or usage_day()
+        local = self.local_calls(day)
+        with self.lock, self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO reported (day, calls, local_calls, checked_at) VALUES (?, ?, ?, ?)",
+                              (day, reported_calls, local, time.time()))
+
+    def by_endpoint(self, day=None):
+        """
+        Returns (endpoint, requests, calls) for every endpoint used on `day` (default: today).
+        """
+        with self.lock:
+            return self.conn.execute("SELECT endpoint, requests, calls FROM usage WHERE day = ? ORDER BY calls DESC",
+                                     (day or usage_day(),)).fetchall()
+
+class DailyBudget:
+    """
+    The API calls a fetch may still spend today: the daily limit, less what was already
+    used and a reserve kept for other jobs sharing the API key.
+    """
+
+    def __init__(self, usage, daily_limit=None, reserve=0):
+        self.usage = usage
+        self.daily_limit = daily_limit
+        self.reserve = reserve
+
+    def refresh(self, api_client):
+        """
+        Reconciles the ledger with the usage reported by the API's user endpoint and, when
+        no daily limit was configured, adopts the plan's limit. Failures are logged and the
+        local figures are kept.
+        """
+        try:
+            info = api_client.get_user()
+        except Exception as e:
+            logging.warning(f"Could not read API usage from the user endpoint; using the local ledger: {e}")
+            return
+        if self.daily_limit is None and info.get("dailyRateLimit"):
+            self.daily_limit = int(info["dailyRateLimit"])
+        # The endpoint reports the calls spent on its own quota day
+        if info.get("apiRequestsDate", usage_day()) == usage_day() and info.get("apiRequests") is not None:
+            self.usage.reconcile(int(info["apiRequests"]))
+
+    def remaining(self):
+        """
+        Returns the calls left today, or None when no daily limit is known.
+        """
+        if self.daily_limit is None:
+            return None
+        return max(0, self.daily_limit - self.reserve - self.usage.used())
+
+    def can_afford(self, calls):
+        remaining = self.remaining()
+        return remaining is None or remaining >= calls
+
+def plan_within_budget(plan, remaining, cost):
+    """
+    Cuts a scored fetch plan (see fetch_scheduler.schedule) to the entries the remaining
+    budget pays for. The plan is already in order of priority and staleness, so this keeps
+    the most valuable refreshes.
+
+    Returns:
+        tuple: The selected entries and the entries left for a later day.
+    """
+    if remaining is None or cost <= 0:
+        return plan, []
+    affordable = remaining // cost
+    return plan[:affordable], plan[affordable:]
+
+def print_plan(selected, skipped, cost, remaining):
+    """
+    Prints a fetch plan, one symbol per line, followed by its cost against the budget.
+    """
+    spent = 0
+    for position, (score, item) in enumerate(selected, 1):
+        spent += cost
+        print(f"{position:>7}  {item.symbol:<24} {item.exchange or '':<12} {item.country or '':<8} "
+              f"{item.asset_type or '':<16} {f'every {item.days:g} days' if item.days else 'new report':<16} "
+              f"score {score:8.2f}  {spent:>9} calls")
+    by_country = Counter(item.country for _, item in selected)
+    print(f"Plan: {len(selected)} of {len(selected) + len(skipped)} due symbols, {spent} calls"
+          + ("" if remaining is None else f" of {remaining} remaining today") + ".")
+    if by_country:
+        print("By country: " + ", ".join(f"{country} {count}" for country, count in by_country.most_common()))
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    parser = argparse.ArgumentParser(description="Show the API calls spent per day and endpoint.")
+    parser.add_argument("--data_dir", default="./data/fundamental_data", help="Directory containing the usage ledger.")
+    parser.add_argument("--usage_db", help="Path to the usage ledger (default: <data_dir>/_api_usage.sqlite).")
+    parser.add_argument("--days", type=int, default=1, help="Number of days to show, most recent first.")
+    args = parser.parse_args()
+
+    usage = ApiUsage(args.usage_db or usage_path(args.data_dir))
+    today = datetime.now(timezone.utc)
+    for offset in range(args.days):
+        day = (today - timedelta(days=offset)).strftime("%Y-%m-%d")
+        print(f"{day}: {usage.used(day)} calls")
+        for endpoint, requests, calls in usage.by_endpoint(day):
+            print(f"  {endpoint}: {requests} requests, {calls} calls")
+    usage.close()
@@ -0,0 +1,125 @@
+import logging
+import random
+import threading
+import time
+from collections import namedtuple
+from email.utils import parsedate_to_datetime
+
+# Classified fetch outcomes
+OK = "ok"
+NOT_FOUND = "not_found"          # Unknown, delisted or empty: permanent miss, never retried
+RATE_LIMITED = "rate_limited"    # HTTP 429: throttled, retried after a delay
+QUOTA_EXHAUSTED = "quota_exhausted"  # HTTP 402, or our daily budget: nothing more today; ends the pass
+SERVER_ERROR = "server_error"    # HTTP 5xx or an undecodable body
+NETWORK_ERROR = "network_error"  # Connection failures and timeouts
+CLIENT_ERROR = "client_error"    # Other 4xx, e.g. a ticker the plan doesn't cover: the request, not the API
+UNAUTHORIZED = "unauthorized"    # HTTP 401: the API key is invalid or revoked
+INTERNAL_ERROR = "internal_error"  # Unexpected exception while fetching or saving one symbol
+
+# Outcomes worth retrying after a backoff delay
+RETRYABLE = {RATE_LIMITED, SERVER_ERROR, NETWORK_ERROR}
+
+# Outcomes that indicate the API (or our access to it) is unhealthy
+UNHEALTHY = {RATE_LIMITED, SERVER_ERROR, NETWORK_ERROR, UNAUTHORIZED}
+
+# Outcomes that point at the symbol itself rather than the API; symbols that keep failing
+# with them are quarantined (see FetchManifest.record_failure). Internal errors are ours,
+# e.g. a full disk, so they are recorded but never count.
+SYMBOL_FAILURES = {NOT_FOUND, CLIENT_ERROR}
+
+def parse_retry_after(value, now=None):
+    """
+    Returns the seconds to wait given by a Retry-After header, which is either a number of
+    seconds or an HTTP date, or None if the header is missing or unparsable.
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        pass
+    try:
+        retry_at = parsedate_to_datetime(str(value))
+    except (TypeError, ValueError, IndexError):
+        return None
+    if retry_at is None:
+        return None
+    return max(0.0, retry_at.timestamp() - (now or time.time()))
+
+FetchResult = namedtuple("FetchResult", ["status", "data", "retry_after"], defaults=[None, None])
+
+class BackoffPolicy:
+    """
+    Exponential backoff with full jitter for retryable outcomes.
+    """
+
+    def __init__(self, base_delay=2.0, max_delay=300.0, max_retries=5):
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_retries = max_retries
+
+    def delay(self, attempt, retry_after=None):
+        """
+        Returns the number of seconds to wait before retry number `attempt` (0-based).
+        A server-provided Retry-After value (seconds or an HTTP date) is honored as a lower
+        bound; an unparsable one is ignored.
+        """
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+        retry_after = parse_retry_after(retry_after)
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.max_delay))
+        return delay
+
+class CircuitBreaker:
+    """
+    Pauses all workers while the API is unhealthy.
+
+    The breaker opens after `failure_threshold` consecutive unhealthy outcomes and stays
+    open for a cooldown that starts at `cooldown` seconds and doubles on every re-open,
+    up to `max_cooldown`. Once the cooldown elapses, requests are let through again; the
+    first success closes the breaker and resets the cooldown, the first unhealthy outcome
+    re-opens it. Permanent misses such as unknown tickers count as healthy responses.
+    """
+
+    def __init__(self, failure_threshold=50, cooldown=60.0, max_cooldown=3600.0):
+        self.failure_threshold = failure_threshold
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.current_cooldown = cooldown
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+        self.half_open = False
+        self.lock = threading.Lock()
+
+    def wait_until_closed(self):
+        """
+        Blocks the calling thread while the breaker is open.
+        """
+        while True:
+            with self.lock:
+                remaining = self.open_until - time.monotonic()
+            if remaining <= 0:
+                return
+            time.sleep(min(remaining, 5.0))
+
+    def record_success(self):
+        with self.lock:
+            if self.half_open:
+                logging.info("API healthy again; closing circuit breaker.")
+            self.consecutive_failures = 0
+            self.current_cooldown = self.base_cooldown
+            self.half_open = False
+
+    def record_failure(self):
+        with self.lock:
+            now = time.monotonic()
+            if now < self.open_until:
+                return
+            self.consecutive_failures += 1
+            if self.half_open or self.consecutive_failures >= self.failure_threshold:
+                if self.half_open:
+                    self.current_cooldown = min(self.current_cooldown * 2, self.max_cooldown)
+                self.open_until = now + self.current_cooldown
+                self.half_open = True
+                self.consecutive_failures = 0
+                logging.warning(f"API unhealthy; circuit breaker open for {self.current_cooldown:.0f} seconds.")
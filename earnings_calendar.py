@@ -0,0 +1,107 @@
+import calendar
+import argparse
+import logging
+import statistics
+import time
+from datetime import date, datetime, timezone
+from fetch_manifest import FetchManifest, manifest_path
+
+# Typical spacing of quarterly reports, used when a record gives no better estimate
+QUARTER_DAYS = 91
+
+# Bounds on the delay between a quarter's end and its report, learned per symbol
+MIN_REPORT_LAG_DAYS = 0
+MAX_REPORT_LAG_DAYS = 120
+
+def parse_date(value):
+    """
+    Parses a 'YYYY-MM-DD' date; returns None for anything else.
+    """
+    try:
+        return date.fromisoformat(str(value)[:10])
+    except (TypeError, ValueError):
+        return None
+
+def to_timestamp(day):
+    """
+    Returns the UTC midnight timestamp of a date, or None.
+    """
+    return None if day is None else float(calendar.timegm(day.timetuple()))
+
+def report_dates(record, now=None):
+    """
+    Extracts a symbol's earnings calendar from a stored fundamentals record.
+
+    The last report is the latest `Earnings.History` entry with a past `reportDate` and an
+    actual EPS. The next report is the earliest future `reportDate` in the history, or,
+    when the history has none, the end of the next quarter in `Earnings.Trend` plus the
+    symbol's usual delay between quarter end and report. Failing that, it is one quarter
+    after the last report.
+
+    Returns:
+        tuple: (last report, next expected report) as UTC timestamps, each None if unknown.
+    """
+    earnings = record.get("Earnings") if isinstance(record, dict) else None
+    if not isinstance(earnings, dict):
+        return None, None
+    today = datetime.fromtimestamp(now or time.time(), timezone.utc).date()
+
+    reported = []   # (report date, quarter end)
+    upcoming = []
+    for entry in (earnings.get("History") or {}).values():
+        if not isinstance(entry, dict):
+            continue
+        report_date = parse_date(entry.get("reportDate"))
+        if report_date is None:
+            continue
+        if report_date > today:
+            upcoming.append(report_date)
+        elif entry.get("epsActual") is not None:
+            reported.append((report_date, parse_date(entry.get("date"))))
+    latest = max(reported, key=lambda entry: entry[0]) if reported else None
+    last_report = latest and latest[0]
+
+    next_report = min(upcoming) if upcoming else None
+    if next_report is None and reported:
+        lags = [(report_date - quarter_end).days for report_date, quarter_end in reported if quarter_end]
+        lags = [lag for lag in lags if MIN_REPORT_LAG_DAYS <= lag <= MAX_REPORT_LAG_DAYS]
+        last_quarter = latest[1]
+        quarter_ends = sorted(day for day in (parse_date(key) for key in (earnings.get("Trend") or {}))
+                              if day and (last_quarter is None or day > last_quarter))
+        if lags and quarter_ends:
+            next_report = date.fromordinal(quarter_ends[0].toordinal() + int(statistics.median(lags)))
+        else:
+            next_report = date.fromordinal(last_report.toordinal() + QUARTER_DAYS)
+    return to_timestamp(last_report), to_timestamp(next_report)
+
+def record_report_dates(symbol, record):
+    """
+    Scan extractor returning a record's (last, next) report dates, or None if both are unknown.
+    """
+    dates = report_dates(record)
+    return dates if any(dates) else None
+
+if __name__ == "__main__":
+    from fundamental_store import FundamentalStore
+    from parallel_scan import DEFAULT_WORKERS
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    parser = argparse.ArgumentParser(
+        description="Fill the fetch manifest's earnings calendar from the stored fundamentals records.")
+    parser.add_argument("--data_dir", default="./data/fundamental_data", help="Directory containing fundamentals data.")
+    parser.add_argument("--manifest", help="Path to the fetch manifest database (default: <data_dir>/_manifest.sqlite).")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help="Processes decoding records (default: one per CPU).")
+    args = parser.parse_args()
+
+    manifest = FetchManifest(args.manifest or manifest_path(args.data_dir))
+    found = 0
+    with FundamentalStore(args.data_dir, workers=args.workers) as store:
+        for found, (symbol, (last_report, next_report)) in enumerate(store.map(record_report_dates), 1):
+            manifest.record_profile(symbol, last_report_at=last_report, next_report_at=next_report)
+            if found % 1000 == 0:
+                manifest.commit()
+    manifest.commit()
+    manifest.close()
+    logging.info(f"Stored the earnings calendar of {found} symbols.")
@@ -0,0 +1,97 @@
+import os
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+
+BASE_URL = "https://eodhd.com/api"
+
+# Timeouts and pool sizes can be tuned through the environment (or the .env file)
+CONNECT_TIMEOUT = float(os.getenv("EODHD_CONNECT_TIMEOUT", "10"))
+READ_TIMEOUT = float(os.getenv("EODHD_READ_TIMEOUT", "60"))
+POOL_MAXSIZE = int(os.getenv("EODHD_POOL_MAXSIZE", "16"))
+
+_shared_session = None
+_session_lock = threading.Lock()
+
+def create_session(pool_maxsize=POOL_MAXSIZE, pool_connections=4):
+    """
+    Creates a requests session with a keep-alive connection pool and compressed transfer.
+
+    Args:
+        pool_maxsize (int): Maximum number of open connections kept per host. Callers
+            block when the pool is exhausted instead of opening extra connections.
+        pool_connections (int): Number of per-host pools to cache.
+
+    Returns:
+        requests.Session: The configured session.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, pool_block=True)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({
+        "Accept": "application/json",
+        "Accept-Encoding": "gzip, deflate",
+        "Connection": "keep-alive",
+    })
+    return session
+
+def get_session(pool_maxsize=POOL_MAXSIZE):
+    """
+    Returns the process-wide shared session, creating it on first use.
+    """
+    global _shared_session
+    with _session_lock:
+        if _shared_session is None:
+            _shared_session = create_session(pool_maxsize=pool_maxsize)
+        return _shared_session
+
+class EODHDClient:
+    """
+    Minimal EODHD API client that routes every call through one pooled session.
+    """
+
+    def __init__(self, api_key, session=None, timeout=None, base_url=BASE_URL, usage=None):
+        self.api_key = api_key
+        self.session = session or get_session()
+        self.timeout = timeout or (CONNECT_TIMEOUT, READ_TIMEOUT)
+        self.base_url = base_url
+        self.usage = usage  # Optional api_budget.ApiUsage ledger charged for every request
+
+    def get_json(self, path, **params):
+        """
+        Performs a GET request against the API and returns the decoded JSON body.
+        Raises requests.HTTPError for non-2xx responses.
+        """
+        params.update({"api_token": self.api_key, "fmt": "json"})
+        response = self.session.get(f"{self.base_url}/{path}", params=params, timeout=self.timeout)
+        if self.usage is not None:
+            # Count answered requests whatever their status, so the ledger never under-counts
+            self.usage.record(path)
+        response.raise_for_status()
+        return response.json()
+
+    def get_user(self):
+        """Fetches the account details, including today's API usage and the daily limit."""
+        return self.get_json("user")
+
+    def get_exchanges(self):
+        """Fetches the list of exchanges."""
+        return self.get_json("exchanges-list/")
+
+    def get_exchange_symbols(self, exchange_code):
+        """Fetches the list of symbols for a given exchange."""
+        return self.get_json(f"exchange-symbol-list/{exchange_code}")
+
+    def get_fundamentals_data(self, ticker, sections=None):
+        """
+        Fetches the fundamentals payload for a ticker. When `sections` is given, only those
+        top-level sections are requested and the result is always keyed by section name.
+        """
+        if not sections:
+            return self.get_json(f"fundamentals/{ticker}")
+        data = self.get_json(f"fundamentals/{ticker}", filter=",".join(sections))
+        if len(sections) == 1 and data:
+            # A single-section filter returns the section body without its key
+            return {sections[0]: data}
+        return data
@@ -0,0 +1,630 @@
+import os
+import sqlite3
+import argparse
+import logging
+import time
+import uuid
+from collections import namedtuple
+from datetime import datetime, timedelta
+from fundamental_io import list_record_files, symbol_from_path, qualify_symbol
+from pack_store import PackStore, has_pack
+from backoff import SYMBOL_FAILURES
+
+MANIFEST_FILENAME = "_manifest.sqlite"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS fetches (
+    symbol TEXT PRIMARY KEY,
+    exchange TEXT,
+    fetched_at REAL,
+    attempted_at REAL,
+    status TEXT,
+    payload_size INTEGER,
+    content_hash TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_fetches_fetched_at ON fetches(fetched_at);
+CREATE INDEX IF NOT EXISTS idx_fetches_exchange ON fetches(exchange);
+CREATE TABLE IF NOT EXISTS section_fetches (
+    symbol TEXT NOT NULL,
+    section TEXT NOT NULL,
+    fetched_at REAL NOT NULL,
+    PRIMARY KEY (symbol, section)
+);
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    run_key TEXT NOT NULL,
+    started_at REAL NOT NULL,
+    finished_at REAL,
+    total INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_runs_key ON runs(run_key, finished_at);
+CREATE TABLE IF NOT EXISTS run_items (
+    run_id TEXT NOT NULL,
+    symbol TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    exchange TEXT,
+    status TEXT,
+    PRIMARY KEY (run_id, symbol)
+);
+CREATE INDEX IF NOT EXISTS idx_run_items_position ON run_items(run_id, position);
+"""
+
+# Columns added after the original schema, applied to existing manifests on open.
+# `full_fetched_at` is the last fetch of the complete payload; `sections` is the
+# profile of the last successful fetch ('*' for the complete payload). `dict_id` is the
+# zstd dictionary the stored record was compressed with, if any. `changed_at` is the last
+# time the stored record's content hash changed. `asset_type` and `is_delisted` come from
+# General.Type and General.IsDelisted of the stored record (see refresh_policy).
+# `last_report_at` and `next_report_at` are the last and next expected earnings reports
+# (see earnings_calendar). `failure_count` counts consecutive symbol failures, and
+# `quarantined_until` is when a quarantined symbol may be probed again.
+MIGRATIONS = [
+    ("full_fetched_at", "REAL", "UPDATE fetches SET full_fetched_at = fetched_at WHERE status = 'ok'"),
+    ("sections", "TEXT", "UPDATE fetches SET sections = '*' WHERE status = 'ok'"),
+    ("dict_id", "INTEGER", None),
+    ("changed_at", "REAL", "UPDATE fetches SET changed_at = fetched_at WHERE status = 'ok'"),
+    ("asset_type", "TEXT", None),
+    ("is_delisted", "INTEGER", None),
+    ("last_report_at", "REAL", None),
+    ("next_report_at", "REAL", None),
+    ("failure_count", "INTEGER NOT NULL DEFAULT 0", None),
+    ("quarantined_until", "REAL", None),
+]
+
+FULL_PROFILE = "*"
+
+# Consecutive symbol failures (backoff.SYMBOL_FAILURES: not found, or a 4xx other than 401
+# for that symbol's request) after which a symbol is quarantined: it is skipped until a
+# re-probe, which waits QUARANTINE_BASE_DAYS and doubles with every further failure, up to
+# QUARANTINE_MAX_DAYS. Internal errors are ours, not the symbol's, and never count.
+DEAD_LETTER_THRESHOLD = 3
+QUARANTINE_BASE_DAYS = 7
+QUARANTINE_MAX_DAYS = 180
+
+# What the scheduler needs to know about a symbol (see FetchManifest.freshness)
+Freshness = namedtuple("Freshness", ["symbol", "refreshed_at", "asset_type", "is_delisted", "last_report_at",
+                                     "next_report_at", "quarantined_until"])
+
+# Seconds to wait for another process holding the manifest's write lock
+BUSY_TIMEOUT = 60
+
+# An unfinished run older than this is abandoned instead of resumed
+RUN_MAX_AGE = 24 * 3600
+
+def manifest_path(data_dir):
+    """
+    Returns the default manifest location for a fundamentals data directory.
+    """
+    return os.path.join(data_dir, MANIFEST_FILENAME)
+
+class FetchManifest:
+    """
+    Persistent record of every fundamentals fetch: symbol, exchange, last fetch time,
+    status, payload size and content hash.
+
+    Fetch and run updates are buffered in memory and applied in one short transaction by
+    `commit()`, which should be called once per batch. Because the write lock is only held
+    for that moment, several fetch processes can share one manifest.
+
+    A new manifest uses WAL, which only works for processes on one host. Open it with
+    `shared=True` when processes on other hosts use it too (over a network filesystem): it
+    is then switched to a rollback journal, and stays that way for every later user.
+    """
+
+    def __init__(self, db_path, shared=False):
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.db_path = db_path
+        self.pending_writes = []
+        created = not os.path.exists(db_path)
+        self.conn = sqlite3.connect(db_path, timeout=BUSY_TIMEOUT)
+        if shared:
+            try:
+                journal_mode = self.conn.execute("PRAGMA journal_mode=DELETE").fetchone()[0]
+            except sqlite3.OperationalError:
+                journal_mode = "wal"
+            if journal_mode.lower() != "delete":
+                # Leaving WAL needs the file to itself
+                self.conn.close()
+                raise RuntimeError(f"Could not switch manifest {db_path} from WAL to a rollback journal; "
+                                   f"stop the other processes using it and retry.")
+        elif created:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+        # NORMAL is only crash safe with WAL
+        wal = self.conn.execute("PRAGMA journal_mode").fetchone()[0].lower() == "wal"
+        self.conn.execute(f"PRAGMA synchronous={'NORMAL' if wal else 'FULL'}")
+        # Create and migrate under the write lock, so processes opening a new manifest at once don't race
+        self.conn.executescript("BEGIN IMMEDIATE;" + SCHEMA)
+        self._migrate()
+        self.conn.commit()
+
+    def _migrate(self):
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(fetches)")}
+        for column, column_type, backfill in MIGRATIONS:
+            if column not in columns:
+                self.conn.execute(f"ALTER TABLE fetches ADD COLUMN {column} {column_type}")
+                if backfill:
+                    self.conn.execute(backfill)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_fetches_full_fetched_at ON fetches(full_fetched_at)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_fetches_changed_at ON fetches(changed_at)")
+
+    def close(self):
+        self.commit()
+        self.conn.close()
+
+    def _write(self, sql, params, many=False):
+        self.pending_writes.append((sql, params, many))
+
+    def commit(self):
+        """
+        Applies the buffered updates in one transaction.
+        """
+        with self.conn:
+            for sql, params, many in self.pending_writes:
+                if many:
+                    self.conn.executemany(sql, params)
+                else:
+                    self.conn.execute(sql, params)
+        self.pending_writes.clear()
+
+    def is_empty(self):
+        return self.conn.execute("SELECT 1 FROM fetches LIMIT 1").fetchone() is None
+
+    def content_hash(self, symbol):
+        """
+        Returns the content hash of the record last stored for `symbol`, or None.
+        """
+        row = self.conn.execute("SELECT content_hash FROM fetches WHERE symbol = ?", (symbol,)).fetchone()
+        return None if row is None else row[0]
+
+    def record_success(self, symbol, exchange, payload_size, content_hash, sections=None, fetched_at=None,
+                       dict_id=None):
+        """
+        Records a successful fetch that stored new content, and marks the symbol fresh for
+        the fetched profile.
+
+        Args:
+            sections (list): Top-level sections that were fetched, or None for the
+                complete payload. A partial fetch only refreshes the named sections and
+                never counts as a complete fetch.
+        """
+        fetched_at = fetched_at or time.time()
+        full_fetched_at = fetched_at if sections is None else None
+        profile = FULL_PROFILE if sections is None else ",".join(sections)
+        self._write(
+            """
+            INSERT INTO fetches (symbol, exchange, fetched_at, attempted_at, status, payload_size, content_hash,
+                                 full_fetched_at, sections, dict_id, changed_at)
+            VALUES (?, ?, ?, ?, 'ok', ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(symbol) DO UPDATE SET
+                exchange = excluded.exchange,
+                fetched_at = excluded.fetched_at,
+                attempted_at = excluded.attempted_at,
+                status = excluded.status,
+                payload_size = excluded.payload_size,
+                content_hash = excluded.content_hash,
+                full_fetched_at = COALESCE(excluded.full_fetched_at, fetches.full_fetched_at),
+                sections = excluded.sections,
+                dict_id = excluded.dict_id,
+                changed_at = excluded.changed_at,
+                failure_count = 0,
+                quarantined_until = NULL
+            """,
+            (symbol, exchange, fetched_at, fetched_at, payload_size, content_hash, full_fetched_at, profile, dict_id,
+             fetched_at),
+        )
+        self._record_sections(symbol, sections, fetched_at)
+
+    def record_unchanged(self, symbol, exchange, sections=None, fetched_at=None):
+        """
+        Records a successful fetch whose content matched the stored record: the symbol is
+        marked fresh for the fetched profile, while its size, hash and `changed_at` are kept.
+        """
+        fetched_at = fetched_at or time.time()
+        full_fetched_at = fetched_at if sections is None else None
+        self._write(
+            """
+            UPDATE fetches SET
+                exchange = ?,
+                fetched_at = ?,
+                attempted_at = ?,
+                status = 'ok',
+                full_fetched_at = COALESCE(?, full_fetched_at),
+                sections = ?,
+                failure_count = 0,
+                quarantined_until = NULL
+            WHERE symbol = ?
+            """,
+            (exchange, fetched_at, fetched_at, full_fetched_at,
+             FULL_PROFILE if sections is None else ",".join(sections), symbol),
+        )
+        self._record_sections(symbol, sections, fetched_at)
+
+    def record_storage(self, symbol, payload_size, dict_id=None):
+        """
+        Records that the stored record was rewritten in another format (e.g. recompressed
+        with a new dictionary); its content, and so its hash and freshness, are unchanged.
+        """
+        self._write("UPDATE fetches SET payload_size = ?, dict_id = ? WHERE symbol = ?",
+                    (payload_size, dict_id, symbol))
+
+    def _record_sections(self, symbol, sections, fetched_at):
+        if sections is not None:
+            self._write(
+                "INSERT OR REPLACE INTO section_fetches (symbol, section, fetched_at) VALUES (?, ?, ?)",
+                [(symbol, section, fetched_at) for section in sections], many=True,
+            )
+
+    def record_profile(self, symbol, asset_type=None, is_delisted=None, last_report_at=None, next_report_at=None):
+        """
+        Records what a stored record says about the symbol: its asset type, delisting flag
+        and earnings calendar. Values that are None leave the stored ones untouched.
+        """
+        self._write(
+            """
+            UPDATE fetches SET
+                asset_type = COALESCE(?, asset_type),
+                is_delisted = COALESCE(?, is_delisted),
+                last_report_at = COALESCE(?, last_report_at),
+                next_report_at = COALESCE(?, next_report_at)
+            WHERE symbol = ?
+            """,
+            (asset_type, None if is_delisted is None else int(bool(is_delisted)), last_report_at, next_report_at,
+             symbol),
+        )
+
+    def record_failure(self, symbol, exchange, status="error", attempted_at=None):
+        """
+        Records a failed fetch. The last successful fetch time is left untouched,
+        so the symbol does not become fresh.
+
+        Symbol failures (see backoff.SYMBOL_FAILURES) add to the symbol's failure count.
+        From DEAD_LETTER_THRESHOLD consecutive ones on, the symbol is quarantined: due
+        symbols and fetch plans leave it out until its next re-probe. Other failures are
+        the API's (rate limits, server and network errors) or our own (internal errors) and
+        leave both untouched.
+        """
+        attempted_at = attempted_at or time.time()
+        self._write(
+            """
+            INSERT INTO fetches (symbol, exchange, attempted_at, status, failure_count)
+            VALUES (:symbol, :exchange, :attempted_at, :status, :failures)
+            ON CONFLICT(symbol) DO UPDATE SET
+                exchange = excluded.exchange,
+                attempted_at = excluded.attempted_at,
+                status = excluded.status,
+                failure_count = fetches.failure_count + excluded.failure_count,
+                quarantined_until = CASE
+                    WHEN excluded.failure_count > 0 AND fetches.failure_count + 1 >= :threshold
+                    THEN excluded.attempted_at + 86400 * MIN(:max_days,
+                        :base_days * (1 << MIN(fetches.failure_count + 1 - :threshold, 16)))
+                    ELSE fetches.quarantined_until
+                END
+            """,
+            {"symbol": symbol, "exchange": exchange, "attempted_at": attempted_at, "status": status,
+             "failures": int(status in SYMBOL_FAILURES), "threshold": DEAD_LETTER_THRESHOLD,
+             "base_days": QUARANTINE_BASE_DAYS, "max_days": QUARANTINE_MAX_DAYS},
+        )
+
+    def _fill_work(self, symbols, cutoffs=None):
+        self.conn.execute("CREATE TEMP TABLE IF NOT EXISTS work (position INTEGER PRIMARY KEY, symbol TEXT, cutoff REAL)")
+        self.conn.execute("DELETE FROM work")
+        self.conn.executemany("INSERT INTO work (position, symbol, cutoff) VALUES (?, ?, ?)",
+                              ((i, symbol, cutoffs and cutoffs[i]) for i, symbol in enumerate(symbols)))
+
+    def due_symbols(self, symbols, days, sections=None, windows=None):
+        """
+        Returns the symbols from `symbols` that are not fresh for the requested profile,
+        preserving the input order.
+
+        A symbol is fresh if its complete payload was fetched within its window, or, for a
+        section profile, if every requested section was fetched within its window.
+        Quarantined symbols are never due before their re-probe time.
+
+        Args:
+            symbols (list): Symbols in priority order.
+            days (float): Staleness window in days.
+            sections (list): Requested top-level sections, or None for the complete payload.
+            windows (dict): Per-symbol windows in days (see refresh_policy), overriding `days`.
+
+        Returns:
+            list: The due symbols.
+        """
+        now = time.time()
+        windows = windows or {}
+        self._fill_work(symbols, [now - windows.get(symbol, days) * 86400 for symbol in symbols])
+        if sections is None:
+            rows = self.conn.execute(
+                """
+                SELECT w.symbol FROM work w
+                LEFT JOIN fetches f ON f.symbol = w.symbol
+                WHERE (f.full_fetched_at IS NULL OR f.full_fetched_at < w.cutoff)
+                  AND (f.quarantined_until IS NULL OR f.quarantined_until <= ?)
+                ORDER BY w.position
+                """,
+                (now,),
+            ).fetchall()
+        else:
+            placeholders = ",".join("?" for _ in sections)
+            rows = self.conn.execute(
+                f"""
+                SELECT w.symbol FROM work w
+                LEFT JOIN fetches f ON f.symbol = w.symbol
+                WHERE (f.full_fetched_at IS NULL OR f.full_fetched_at < w.cutoff)
+                  AND (SELECT COUNT(*) FROM section_fetches s
+                       WHERE s.symbol = w.symbol AND s.fetched_at >= w.cutoff AND s.section IN ({placeholders})) < ?
+                  AND (f.quarantined_until IS NULL OR f.quarantined_until <= ?)
+                ORDER BY w.position
+                """,
+                (*sections, len(sections), now),
+            ).fetchall()
+        self.conn.execute("DELETE FROM work")
+        self.conn.commit()
+        return [row[0] for row in rows]
+
+    def freshness(self, symbols, sections=None):
+        """
+        Returns a Freshness entry for every symbol in `symbols`, in input order, where
+        `refreshed_at` is the last time the requested profile was fetched in full: the
+        complete payload, or for a section profile, whichever is later of the last complete
+        fetch and the oldest fetch of the requested sections. It is None if never fetched,
+        as is everything else known about symbols never stored.
+        """
+        self._fill_work(symbols)
+        if sections is None:
+            rows = self.conn.execute(
+                """
+                SELECT w.symbol, f.full_fetched_at, f.asset_type, f.is_delisted, f.last_report_at, f.next_report_at,
+                       f.quarantined_until
+                FROM work w
+                LEFT JOIN fetches f ON f.symbol = w.symbol
+                ORDER BY w.position
+                """
+            ).fetchall()
+        else:
+            placeholders = ",".join("?" for _ in sections)
+            rows = self.conn.execute(
+                f"""
+                SELECT w.symbol, MAX(COALESCE(f.full_fetched_at, 0), COALESCE(
+                    (SELECT CASE WHEN COUNT(*) = ? THEN MIN(s.fetched_at) END FROM section_fetches s
+                     WHERE s.symbol = w.symbol AND s.section IN ({placeholders})), 0)),
+                    f.asset_type, f.is_delisted, f.last_report_at, f.next_report_at, f.quarantined_until
+                FROM work w
+                LEFT JOIN fetches f ON f.symbol = w.symbol
+                ORDER BY w.position
+                """,
+                (len(sections), *sections),
+            ).fetchall()
+            rows = [(symbol, refreshed_at or None, *profile) for symbol, refreshed_at, *profile in rows]
+        self.conn.execute("DELETE FROM work")
+        self.conn.commit()
+        return [Freshness(*row) for row in rows]
+
+    def fetched_since(self, since):
+        """
+        Returns the symbols successfully fetched at or after the given datetime.
+        """
+        rows = self.conn.execute(
+            "SELECT symbol FROM fetches WHERE fetched_at >= ? ORDER BY symbol",
+            (since.timestamp(),),
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    def changed_since(self, since):
+        """
+        Returns the symbols whose stored content changed at or after the given datetime.
+        """
+        rows = self.conn.execute(
+            "SELECT symbol FROM fetches WHERE changed_at >= ? ORDER BY symbol",
+            (since.timestamp(),),
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    def find_run(self, run_key, max_age=RUN_MAX_AGE):
+        """
+        Returns the ID of the newest unfinished run for `run_key` started within `max_age`
+        seconds, or None. Older unfinished runs for the key are marked finished.
+        """
+        cutoff = time.time() - max_age
+        self._write(
+            "UPDATE runs SET finished_at = ? WHERE run_key = ? AND finished_at IS NULL AND started_at < ?",
+            (time.time(), run_key, cutoff),
+        )
+        row = self.conn.execute(
+            """
+            SELECT run_id FROM runs WHERE run_key = ? AND finished_at IS NULL AND started_at >= ?
+            ORDER BY started_at DESC LIMIT 1
+            """,
+            (run_key, cutoff),
+        ).fetchone()
+        return None if row is None else row[0]
+
+    def start_run(self, run_key, work):
+        """
+        Persists the ordered work list of a new run.
+
+        Args:
+            work (list): (symbol, exchange) pairs in the order they will be fetched.
+
+        Returns:
+            str: The run ID.
+        """
+        run_id = time.strftime("%Y%m%dT%H%M%S") + "-" + uuid.uuid4().hex[:6]
+        self._write(
+            "INSERT INTO runs (run_id, run_key, started_at, total) VALUES (?, ?, ?, ?)",
+            (run_id, run_key, time.time(), len(work)),
+        )
+        self._write(
+            "INSERT OR IGNORE INTO run_items (run_id, symbol, position, exchange) VALUES (?, ?, ?, ?)",
+            [(run_id, symbol, position, exchange) for position, (symbol, exchange) in enumerate(work)], many=True,
+        )
+        return run_id
+
+    def pending_run_items(self, run_id):
+        """
+        Returns the (symbol, exchange) pairs of a run that have no recorded outcome yet,
+        in run order.
+        """
+        return self.conn.execute(
+            "SELECT symbol, exchange FROM run_items WHERE run_id = ? AND status IS NULL ORDER BY position",
+            (run_id,),
+        ).fetchall()
+
+    def record_run_outcome(self, run_id, symbol, status):
+        self._write("UPDATE run_items SET status = ? WHERE run_id = ? AND symbol = ?", (status, run_id, symbol))
+
+    def finish_run(self, run_id):
+        self._write("UPDATE runs SET finished_at = ? WHERE run_id = ?", (time.time(), run_id))
+
+    def recent_runs(self, limit=10):
+        """
+        Returns (run_id, run_key, started_at, finished_at, total, done) for the newest runs.
+        """
+        return self.conn.execute(
+            """
+            SELECT r.run_id, r.run_key, r.started_at, r.finished_at, r.total,
+                   (SELECT COUNT(*) FROM run_items i WHERE i.run_id = r.run_id AND i.status IS NOT NULL)
+            FROM runs r ORDER BY r.started_at DESC LIMIT ?
+            """,
+            (limit,),
+        ).fetchall()
+
+    def status_counts(self):
+        """
+        Returns a dict mapping fetch status to the number of symbols in that status.
+        """
+        return dict(self.conn.execute("SELECT status, COUNT(*) FROM fetches GROUP BY status").fetchall())
+
+    def dead_letters(self):
+        """
+        Returns (symbol, exchange, status, failure_count, attempted_at, quarantined_until)
+        for every quarantined symbol, most failures first.
+        """
+        return self.conn.execute(
+            """
+            SELECT symbol, exchange, status, failure_count, attempted_at, quarantined_until FROM fetches
+            WHERE quarantined_until IS NOT NULL
+            ORDER BY failure_count DESC, symbol
+            """
+        ).fetchall()
+
+    def release_dead_letters(self, symbols=None):
+        """
+        Clears the quarantine and failure count of the given symbols (default: all), so they
+        are fetched on the next pass.
+
+        Returns:
+            int: The number of symbols released.
+        """
+        if symbols:
+            count = self.conn.executemany(
+                "UPDATE fetches SET failure_count = 0, quarantined_until = NULL WHERE symbol = ?",
+                [(symbol,) for symbol in symbols],
+            ).rowcount
+        else:
+            count = self.conn.execute(
+                "UPDATE fetches SET failure_count = 0, quarantined_until = NULL WHERE quarantined_until IS NOT NULL"
+            ).rowcount
+        self.conn.commit()
+        return count
+
+    def qualify_symbols(self, exchange):
+        """
+        Appends `exchange` to every entry keyed by a bare code, as written before symbols
+        were exchange-qualified. Entries whose qualified key already exists are dropped.
+
+        Returns:
+            int: The number of entries renamed.
+        """
+        count = 0
+        for table in ("fetches", "section_fetches"):
+            count += self.conn.execute(
+                f"UPDATE OR IGNORE {table} SET symbol = symbol || '.' || ? WHERE instr(symbol, '.') = 0",
+                (exchange.upper(),),
+            ).rowcount
+            self.conn.execute(f"DELETE FROM {table} WHERE instr(symbol, '.') = 0")
+        self.conn.commit()
+        return count
+
+    def backfill_from_directory(self, data_dir):
+        """
+        Seeds the manifest from records already present in `data_dir` (loose files and the
+        pack store), using each record's write time as its fetch time. Existing entries are
+        left untouched.
+
+        Returns:
+            int: The number of records imported.
+        """
+        count = 0
+        if has_pack(data_dir):
+            store = PackStore(data_dir, readonly=True)
+            for symbol, stored_at, length in store.entries():
+                self.conn.execute(
+                    """
+                    INSERT OR IGNORE INTO fetches (symbol, fetched_at, attempted_at, status, payload_size,
+                                                   full_fetched_at, sections, changed_at)
+                    VALUES (?, ?, ?, 'ok', ?, ?, ?, ?)
+                    """,
+                    (qualify_symbol(symbol), stored_at, stored_at, length, stored_at, FULL_PROFILE, stored_at),
+                )
+                count += 1
+            store.close()
+        for record_file in list_record_files(data_dir):
+            stat = record_file.stat()
+            self.conn.execute(
+                """
+                INSERT OR IGNORE INTO fetches (symbol, fetched_at, attempted_at, status, payload_size,
+                                               full_fetched_at, sections, changed_at)
+                VALUES (?, ?, ?, 'ok', ?, ?, ?, ?)
+                """,
+                (symbol_from_path(record_file), stat.st_mtime, stat.st_mtime, stat.st_size, stat.st_mtime, FULL_PROFILE,
+                 stat.st_mtime),
+            )
+            count += 1
+        self.conn.commit()
+        return count
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    parser = argparse.ArgumentParser(description="Inspect the fundamentals fetch manifest.")
+    parser.add_argument("--data_dir", default="./data/fundamental_data", help="Directory containing the manifest.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("status", help="Show the number of symbols per fetch status.")
+    fetched_parser = subparsers.add_parser("fetched", help="List symbols fetched within the last N days.")
+    fetched_parser.add_argument("--days", type=float, default=1, help="Look-back window in days.")
+    changed_parser = subparsers.add_parser("changed", help="List symbols whose stored content changed since a time.")
+    changed_parser.add_argument("--since", type=datetime.fromisoformat,
+                                help="ISO date or datetime, e.g. 2024-05-01 or 2024-05-01T06:00 (default: --days ago).")
+    changed_parser.add_argument("--days", type=float, default=1, help="Look-back window in days when --since is not given.")
+    runs_parser = subparsers.add_parser("runs", help="Show the progress of recent fetch runs.")
+    runs_parser.add_argument("--limit", type=int, default=10, help="Number of runs to show.")
+    subparsers.add_parser("dead-letters", help="List quarantined symbols that keep failing, most failures first.")
+    release_parser = subparsers.add_parser("release", help="Take symbols out of quarantine.")
+    release_parser.add_argument("symbols", nargs="*", help="Exchange-qualified symbols to release (default: all).")
+    args = parser.parse_args()
+
+    manifest = FetchManifest(manifest_path(args.data_dir))
+    if args.command == "status":
+        for status, count in sorted(manifest.status_counts().items(), key=lambda x: str(x[0])):
+            print(f"{status}: {count}")
+    elif args.command == "fetched":
+        for symbol in manifest.fetched_since(datetime.now() - timedelta(days=args.days)):
+            print(symbol)
+    elif args.command == "runs":
+        for run_id, run_key, started_at, finished_at, total, done in manifest.recent_runs(args.limit):
+            state = "finished" if finished_at else "unfinished"
+            print(f"{run_id}  {run_key}  started {datetime.fromtimestamp(started_at):%Y-%m-%d %H:%M}  "
+                  f"{done}/{total} done  {state}")
+    elif args.command == "dead-letters":
+        dead_letters = manifest.dead_letters()
+        for symbol, exchange, status, failures, attempted_at, quarantined_until in dead_letters:
+            print(f"{symbol}  {exchange or '-'}  {status}  {failures} failures  "
+                  f"last tried {datetime.fromtimestamp(attempted_at):%Y-%m-%d}  "
+                  f"next probe {datetime.fromtimestamp(quarantined_until):%Y-%m-%d}")
+        print(f"Quarantined symbols: {len(dead_letters)}")
+    elif args.command == "release":
+        print(f"Released {manifest.release_dead_letters([qualify_symbol(s) for s in args.symbols])} symbols.")
+    elif args.command == "changed":
+        for symbol in manifest.changed_since(args.since or datetime.now() - timedelta(days=args.days)):
+            print(symbol)
+    manifest.close()
@@ -0,0 +1,74 @@
+import os
+import logging
+import argparse
+from dotenv import load_dotenv
+from fundamental_io import find_record, list_record_files, record_name
+from fetch_manifest import FULL_PROFILE
+from fetch_scheduler import PriorityWeights, default_weights
+from get_fundamental_data import (setup_logging, add_fetch_arguments, open_fetch_context, run_fetch_loop,
+                                  load_symbols_from_country_file, country_work_items)
+
+load_dotenv()
+
+EXCHANGES_DIR = "./data/exchanges"
+
+def available_countries(exchanges_dir=EXCHANGES_DIR):
+    """
+    Returns the codes of every exchange symbol list downloaded by get_symbols_from_exchange.py.
+    """
+    return sorted(record_name(path).upper() for path in list_record_files(exchanges_dir))
+
+def load_work_items(countries, weights, exchanges_dir=EXCHANGES_DIR):
+    """
+    Loads the symbols of every country's exchange list as WorkItems weighted by `weights`.
+    """
+    items = []
+    seen = set()
+    for country in countries:
+        path = find_record(exchanges_dir, country)
+        if path is None:
+            logging.warning(f"No symbol list for '{country}' in {exchanges_dir}; skipping it.")
+            continue
+        for item in country_work_items(load_symbols_from_country_file(path, with_types=True), country, weights):
+            if item.symbol not in seen:
+                seen.add(item.symbol)
+                items.append(item)
+    return items
+
+def main():
+    setup_logging()
+
+    api_key = os.getenv("EODHD_API_KEY")
+    if not api_key:
+        logging.error("EODHD API key not found. Please set it in the .env file.")
+        exit(1)
+
+    parser = argparse.ArgumentParser(
+        description="Fetch fundamental data for many countries from one global plan, sharing one rate limiter, "
+                    "circuit breaker and API budget.")
+    parser.add_argument("--countries", required=True,
+                        help="Comma-separated exchange list codes (e.g. 'US,LSE,TO'), or 'all' for every list in "
+                             "--exchanges_dir.")
+    parser.add_argument("--exchanges_dir", default=EXCHANGES_DIR, help="Directory of exchange symbol lists.")
+    parser.add_argument("--weights",
+                        help="JSON file of priority weights by country and exchange (default: the prioritized US "
+                             "exchanges first).")
+    add_fetch_arguments(parser)
+    args = parser.parse_args()
+
+    if args.countries.lower() == "all":
+        countries = available_countries(args.exchanges_dir)
+    else:
+        countries = [country.strip().upper() for country in args.countries.split(",") if country.strip()]
+    if not countries:
+        logging.error("No countries to fetch; download symbol lists with get_symbols_from_exchange.py first.")
+        exit(1)
+    weights = PriorityWeights.load(args.weights) if args.weights else default_weights()
+    context = open_fetch_context(args, api_key, parser)
+
+    run_key = "|".join(["GLOBAL", ",".join(countries), ",".join(args.sections or [FULL_PROFILE]), str(args.days),
+                        "%d/%d" % args.shard if args.shard else "*"])
+    run_fetch_loop(context, args, lambda: load_work_items(countries, weights, args.exchanges_dir), run_key)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+import json
+import time
+from collections import namedtuple
+
+# Exchanges refreshed first by default, most valuable first
+PRIORITIZED_EXCHANGES = ["NYSE ARCA", "NASDAQ", "NYSE", "AMEX", "ARCA"]
+
+# Staleness of a symbol that was never fetched, as a multiple of its refresh window. Also
+# caps the staleness of fetched symbols, so new listings always rank first.
+NEVER_FETCHED_STALENESS = 10.0
+
+# Days after an earnings report until the API's data reliably includes it
+REPORT_SETTLE_DAYS = 2
+
+# Days after that during which a symbol whose stored data predates the report is due
+# regardless of its refresh window, and ranks like a new listing
+REPORT_BOOST_DAYS = 10
+
+# Staleness multiplier for symbols with an earnings calendar between reports
+BETWEEN_REPORTS = 0.5
+
+# Sections that change with an earnings report
+REPORT_SECTIONS = ("Earnings", "Financials", "Highlights")
+
+# A unit of fetch work: exchange-qualified symbol, listing exchange, exchange list
+# (country) code, priority weight, asset type from the symbol list, and the refresh window
+# in days that `schedule()` applied to it
+WorkItem = namedtuple("WorkItem", ["symbol", "exchange", "country", "weight", "asset_type", "days"],
+                      defaults=(None, None))
+
+class PriorityWeights:
+    """
+    Relative value of refreshing a symbol. A symbol's weight is the weight of its country
+    (exchange list code) times the weight of its listing exchange; anything not listed
+    weighs `default`.
+
+    Weights files are JSON, e.g.:
+        {"default": 1, "countries": {"US": 3, "LSE": 1.5}, "exchanges": {"NASDAQ": 2, "NYSE": 2}}
+    """
+
+    def __init__(self, countries=None, exchanges=None, default=1.0):
+        self.countries = {key.upper(): float(value) for key, value in (countries or {}).items()}
+        self.exchanges = {key.upper(): float(value) for key, value in (exchanges or {}).items()}
+        self.default = float(default)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "r") as file:
+            config = json.load(file)
+        return cls(config.get("countries"), config.get("exchanges"), config.get("default", 1.0))
+
+    def weight(self, country, exchange):
+        country_weight = self.countries.get((country or "").upper(), self.default)
+        exchange_weight = self.exchanges.get((exchange or "").upper(), self.default)
+        return country_weight * exchange_weight
+
+def default_weights():
+    """
+    Returns weights that rank the prioritized exchanges first, in list order, and give
+    everything else the default weight of 1.
+    """
+    count = len(PRIORITIZED_EXCHANGES)
+    return PriorityWeights(exchanges={exch: 1.0 + (count - i) / count for i, exch in enumerate(PRIORITIZED_EXCHANGES)})
+
+def staleness(refreshed_at, window, now):
+    """
+    Returns how overdue a symbol is, as a multiple of its refresh window in seconds.
+    """
+    if refreshed_at is None:
+        return NEVER_FETCHED_STALENESS
+    return min((now - refreshed_at) / max(window, 1.0), NEVER_FETCHED_STALENESS)
+
+def just_reported(entry, now):
+    """
+    Returns whether a symbol (a manifest Freshness entry) had an earnings report that its
+    stored data predates, within the boost period. A next report date that has passed
+    counts as the latest report.
+    """
+    reported_at = entry.last_report_at
+    if entry.next_report_at is not None and entry.next_report_at <= now:
+        reported_at = entry.next_report_at
+    if reported_at is None:
+        return False
+    settled = reported_at + REPORT_SETTLE_DAYS * 86400
+    if not settled <= now <= settled + REPORT_BOOST_DAYS * 86400:
+        return False
+    return entry.refreshed_at is None or entry.refreshed_at < settled
+
+def schedule(items, manifest, days, sections=None, now=None, policy=None):
+    """
+    Builds a fetch plan: the items that are due for a refresh, most valuable first. An
+    item's score is its priority weight times its staleness; ties keep the input order.
+
+    For symbols with an earnings calendar (see earnings_calendar), and profiles that include
+    the sections a report changes, the score follows the calendar: a symbol whose stored
+    data predates a report in the last few days is due and goes first, while between
+    reports its staleness counts for less.
+
+    Args:
+        items (list): WorkItems, from any number of countries.
+        manifest (FetchManifest): Source of each symbol's last refresh time, asset type
+            and delisting flag.
+        days (float): Refresh window in days.
+        sections (list): Requested top-level sections, or None for the complete payload.
+        policy (RefreshPolicy): Per-type and per-exchange refresh windows overriding `days`.
+            The stored record's type takes precedence over the symbol list's.
+
+    Quarantined symbols (see FetchManifest.record_failure) are left out until their re-probe.
+
+    Returns:
+        list: (score, WorkItem) pairs in fetch order, each item carrying its window (0 for
+        symbols due because of a report).
+    """
+    now = now or time.time()
+    follow_reports = sections is None or any(section in REPORT_SECTIONS for section in sections)
+    plan = []
+    for item, entry in zip(items, manifest.freshness([item.symbol for item in items], sections)):
+        item_days = days
+        if policy is not None:
+            item_days = policy.days(entry.asset_type or item.asset_type, item.exchange, item.country,
+                                    bool(entry.is_delisted))
+        window = item_days * 86400
+        item = item._replace(days=item_days)
+        if entry.quarantined_until is not None and entry.quarantined_until > now:
+            continue
+        if follow_reports and just_reported(entry, now):
+            # A window of 0 keeps the fetch pass from skipping it as fresh
+            plan.append((item.weight * NEVER_FETCHED_STALENESS, item._replace(days=0)))
+            continue
+        if entry.refreshed_at is not None and entry.refreshed_at >= now - window:
+            continue
+        score = staleness(entry.refreshed_at, window, now)
+        if follow_reports and (entry.last_report_at is not None or entry.next_report_at is not None):
+            score *= BETWEEN_REPORTS
+        plan.append((item.weight * score, item))
+    plan.sort(key=lambda entry: -entry[0])
+    return plan
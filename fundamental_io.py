@@ -0,0 +1,495 @@
+import os
+import json
+import random
+import hashlib
+import logging
+import argparse
+import threading
+import time
+from pathlib import Path
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Storage codecs:
+#   json    - pretty-printed JSON (indent=4), the original format
+#   compact - minified JSON
+#   zstd      - minified JSON compressed with zstandard
+#   zstd-dict - minified JSON compressed with zstandard and a dictionary trained on the corpus
+CODECS = ("json", "compact", "zstd", "zstd-dict")
+
+CODEC_SUFFIXES = {"json": ".json", "compact": ".json", "zstd": ".json.zst", "zstd-dict": ".json.zst"}
+RECORD_SUFFIXES = (".json", ".json.zst")
+
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+ZSTD_LEVEL = 3
+
+# Trained dictionaries live next to the records: <data_dir>/_zstd_dicts/dict-<id>.zdict,
+# with CURRENT naming the dictionary used for new writes. Every zstd frame records the ID
+# of the dictionary it was compressed with, so old records stay readable after retraining.
+DICT_DIRNAME = "_zstd_dicts"
+DICT_SIZE = 112640
+DICT_SAMPLE_SIZE = 2000
+
+# Fundamentals records are keyed by exchange-qualified symbol (CODE.EXCHANGE, e.g. AAPL.US)
+# and stored under a shard directory named after the first hex digits of the key's SHA-1:
+# <data_dir>/<shard>/aapl.us.json. Records written before sharding sit directly in
+# <data_dir>, named by bare code for US symbols; the resolver still finds them there.
+SHARD_WIDTH = 2
+DEFAULT_EXCHANGE = "US"
+
+# Records are written to a temp file next to their final path and renamed into place,
+# so a crash never leaves a truncated record. Temp files left by a killed writer are
+# swept once they are older than TEMP_MAX_AGE seconds.
+TEMP_SUFFIX = ".tmp"
+TEMP_MAX_AGE = 3600
+
+_dictionaries = {}
+_codec_cache = threading.local()
+
+def require_codec(codec):
+    """
+    Validates a codec name and checks that its optional dependency is installed.
+    """
+    if codec not in CODECS:
+        raise ValueError(f"Unknown codec '{codec}'. Choose one of: {', '.join(CODECS)}.")
+    if codec.startswith("zstd") and zstandard is None:
+        raise ImportError(f"The {codec} codec requires zstandard. Install it with 'pip install zstandard'.")
+
+def dictionary_dir(data_dir):
+    return os.path.join(data_dir, DICT_DIRNAME)
+
+def load_dictionaries(dict_dir):
+    """
+    Registers every trained dictionary found in `dict_dir` so records compressed with
+    any of them can be decoded.
+    """
+    if not os.path.isdir(dict_dir):
+        return
+    for filename in os.listdir(dict_dir):
+        if filename.startswith("dict-") and filename.endswith(".zdict"):
+            dict_id = int(filename[len("dict-"):-len(".zdict")])
+            if dict_id not in _dictionaries:
+                with open(os.path.join(dict_dir, filename), "rb") as file:
+                    _dictionaries[dict_id] = zstandard.ZstdCompressionDict(file.read())
+
+def current_dictionary_id(data_dir):
+    """
+    Returns the ID of the dictionary used for new writes in `data_dir`, or None if no
+    dictionary has been trained.
+    """
+    current_file = os.path.join(dictionary_dir(data_dir), "CURRENT")
+    if not os.path.exists(current_file):
+        return None
+    with open(current_file, "r") as file:
+        return int(file.read().strip())
+
+def get_dictionary(dict_id, data_dir=None):
+    if dict_id not in _dictionaries and data_dir is not None:
+        load_dictionaries(dictionary_dir(data_dir))
+    if dict_id not in _dictionaries:
+        raise LookupError(f"zstd dictionary {dict_id} not found.")
+    return _dictionaries[dict_id]
+
+def _compressor(dict_id=None):
+    # zstandard compressors are not thread-safe, so each thread keeps its own
+    cache = _codec_cache.__dict__.setdefault("compressors", {})
+    if dict_id not in cache:
+        dictionary = _dictionaries[dict_id] if dict_id else None
+        cache[dict_id] = zstandard.ZstdCompressor(level=ZSTD_LEVEL, dict_data=dictionary)
+    return cache[dict_id]
+
+def _decompressor(dict_id=None):
+    cache = _codec_cache.__dict__.setdefault("decompressors", {})
+    if dict_id not in cache:
+        dictionary = _dictionaries[dict_id] if dict_id else None
+        cache[dict_id] = zstandard.ZstdDecompressor(dict_data=dictionary)
+    return cache[dict_id]
+
+def payload_dictionary_id(payload):
+    """
+    Returns the dictionary ID recorded in a zstd payload, or None for uncompressed
+    payloads and frames compressed without a dictionary.
+    """
+    if payload[:4] != ZSTD_MAGIC:
+        return None
+    return zstandard.get_frame_parameters(payload).dict_id or None
+
+def train_dictionary(data_dir, sample_size=DICT_SAMPLE_SIZE, dict_size=DICT_SIZE, seed=None):
+    """
+    Trains a zstd dictionary from a random sample of the records in `data_dir`, stores it
+    in the dictionary directory and makes it the current dictionary for new writes.
+
+    Returns:
+        int: The ID of the new dictionary.
+    """
+    require_codec("zstd-dict")
+    files = list_record_files(data_dir)
+    if not files:
+        raise ValueError(f"No records found in {data_dir} to train a dictionary from.")
+    sample = random.Random(seed).sample(files, min(sample_size, len(files)))
+    samples = [dumps_compact(read_record(path, data_dir)) for path in sample]
+    dictionary = zstandard.train_dictionary(dict_size, samples)
+    dict_id = dictionary.dict_id()
+
+    dict_dir = dictionary_dir(data_dir)
+    os.makedirs(dict_dir, exist_ok=True)
+    with open(os.path.join(dict_dir, f"dict-{dict_id}.zdict"), "wb") as file:
+        file.write(dictionary.as_bytes())
+    with open(os.path.join(dict_dir, "CURRENT"), "w") as file:
+        file.write(str(dict_id))
+    _dictionaries[dict_id] = dictionary
+    logging.info(f"Trained zstd dictionary {dict_id} ({len(dictionary.as_bytes())} bytes) from {len(samples)} records.")
+    return dict_id
+
+def dumps_compact(data):
+    """
+    Serializes data to minified JSON bytes, using orjson when available.
+    """
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+def content_hash(data):
+    """
+    Returns the SHA-256 hex digest of a record's canonical JSON form (sorted keys, no
+    whitespace), which is independent of the codec and dictionary it is stored with.
+    The standard library encoder is used so the hash does not depend on orjson being installed.
+    """
+    canonical = json.dumps(data, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+def loads(payload):
+    """
+    Parses JSON bytes, using orjson when available.
+    """
+    if orjson is not None:
+        return orjson.loads(payload)
+    return json.loads(payload)
+
+def encode_record(data, codec="json", data_dir=None):
+    """
+    Encodes a record with the given codec and returns the bytes to store. The
+    zstd-dict codec uses the current dictionary of `data_dir`.
+    """
+    require_codec(codec)
+    if codec == "json":
+        return json.dumps(data, indent=4).encode("utf-8")
+    payload = dumps_compact(data)
+    if codec == "zstd":
+        payload = _compressor().compress(payload)
+    elif codec == "zstd-dict":
+        dict_id = current_dictionary_id(data_dir) if data_dir else None
+        if dict_id is None:
+            raise LookupError(f"No trained zstd dictionary in {data_dir}. Run 'python fundamental_io.py train' first.")
+        get_dictionary(dict_id, data_dir)
+        payload = _compressor(dict_id).compress(payload)
+    return payload
+
+def decode_record(payload, data_dir=None):
+    """
+    Decodes stored bytes, detecting zstd-compressed records by their magic number and
+    loading the dictionary named in the frame from `data_dir` when needed.
+    """
+    if payload[:4] == ZSTD_MAGIC:
+        if zstandard is None:
+            raise ImportError("Reading zstd records requires zstandard. Install it with 'pip install zstandard'.")
+        dict_id = payload_dictionary_id(payload)
+        if dict_id:
+            get_dictionary(dict_id, data_dir)
+        payload = _decompressor(dict_id).decompress(payload)
+    return loads(payload)
+
+def read_record(path, data_dir=None):
+    """
+    Reads and decodes a stored record in any supported format. `data_dir` locates trained
+    dictionaries and defaults to the record's directory.
+    """
+    with open(path, "rb") as file:
+        return decode_record(file.read(), data_dir or record_root(path))
+
+def fsync_dir(directory):
+    """
+    Makes renames within `directory` durable. A no-op on Windows, which cannot open directories.
+    """
+    if os.name == "nt":
+        return
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+def fsync_file(path):
+    with open(path, "rb") as file:
+        os.fsync(file.fileno())
+
+def write_temp(payload, path, sync=False):
+    """
+    Writes `payload` to a temp file next to `path`, to be renamed into place with
+    `os.replace`. With `sync` the data is flushed to disk first.
+
+    Returns:
+        str: The temp file path.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}-{threading.get_ident()}{TEMP_SUFFIX}"
+    with open(temp_path, "wb") as file:
+        file.write(payload)
+        if sync:
+            file.flush()
+            os.fsync(file.fileno())
+    return temp_path
+
+def write_record(data, path, codec="json", data_dir=None, sync=False):
+    """
+    Encodes and atomically writes a record: readers see either the previous file or the
+    complete new one. `data_dir` locates the trained dictionary for the zstd-dict codec and
+    defaults to the record's data directory. With `sync` the file and the rename are
+    flushed to disk before returning.
+
+    Returns:
+        bytes: The stored payload.
+    """
+    payload = encode_record(data, codec, data_dir or record_root(path))
+    os.replace(write_temp(payload, path, sync), path)
+    if sync:
+        fsync_dir(os.path.dirname(os.path.abspath(path)))
+    return payload
+
+def record_path(data_dir, name, codec="json"):
+    """
+    Returns the path a record named `name` is stored at with the given codec.
+    """
+    return os.path.join(data_dir, f"{name}{CODEC_SUFFIXES[codec]}")
+
+def find_record(data_dir, name):
+    """
+    Returns the path of an existing record named `name` in any supported format,
+    or None if there is none.
+    """
+    for suffix in RECORD_SUFFIXES:
+        path = os.path.join(data_dir, f"{name}{suffix}")
+        if os.path.exists(path):
+            return path
+    return None
+
+def remove_other_formats(data_dir, name, codec):
+    """
+    Deletes copies of a record stored with a different codec suffix, so switching
+    codecs never leaves a stale duplicate behind. With `codec=None` every copy is deleted.
+    """
+    for suffix in RECORD_SUFFIXES:
+        if suffix != CODEC_SUFFIXES.get(codec):
+            path = os.path.join(data_dir, f"{name}{suffix}")
+            if os.path.exists(path):
+                os.remove(path)
+
+def symbol_key(code, exchange):
+    """
+    Returns the exchange-qualified storage key for a ticker, e.g. ('aapl', 'us') -> 'AAPL.US'.
+    """
+    return f"{code}.{exchange}".upper()
+
+def qualify_symbol(symbol, default_exchange=DEFAULT_EXCHANGE):
+    """
+    Returns `symbol` as an exchange-qualified key, appending `default_exchange` to a bare
+    code, e.g. 'aapl' -> 'AAPL.US'.
+    """
+    symbol = symbol.upper()
+    return symbol if "." in symbol else symbol_key(symbol, default_exchange)
+
+def shard_of(key):
+    return hashlib.sha1(key.upper().encode("utf-8")).hexdigest()[:SHARD_WIDTH]
+
+def is_shard_dir(name):
+    return len(name) == SHARD_WIDTH and all(c in "0123456789abcdef" for c in name)
+
+def record_root(path):
+    """
+    Returns the data directory a record file belongs to, stepping out of its shard directory.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    return os.path.dirname(directory) if is_shard_dir(os.path.basename(directory)) else directory
+
+def fundamentals_path(data_dir, symbol, codec="json"):
+    """
+    Returns the sharded path the fundamentals record for `symbol` is written to with the
+    given codec.
+    """
+    key = qualify_symbol(symbol)
+    return os.path.join(data_dir, shard_of(key), f"{key.lower()}{CODEC_SUFFIXES[codec]}")
+
+def fundamentals_candidates(data_dir, symbol):
+    """
+    Yields every path the fundamentals record for `symbol` may be stored at: the sharded
+    location first, then the flat pre-sharding locations.
+    """
+    key = qualify_symbol(symbol)
+    names = [key.lower()]
+    code, exchange = key.rsplit(".", 1)
+    if exchange == DEFAULT_EXCHANGE:
+        names.append(code.lower())
+    for suffix in RECORD_SUFFIXES:
+        yield os.path.join(data_dir, shard_of(key), f"{key.lower()}{suffix}")
+    for name in names:
+        for suffix in RECORD_SUFFIXES:
+            yield os.path.join(data_dir, f"{name}{suffix}")
+
+def resolve_record(data_dir, symbol):
+    """
+    Returns the path of the stored fundamentals record for `symbol` (qualified or a bare
+    US code), or None if there is none.
+    """
+    for path in fundamentals_candidates(data_dir, symbol):
+        if os.path.exists(path):
+            return path
+    return None
+
+def remove_stale_copies(data_dir, symbol, keep=None):
+    """
+    Deletes every stored copy of the record for `symbol` other than `keep`, including
+    copies in another format and copies left in the flat pre-sharding layout.
+    """
+    for path in fundamentals_candidates(data_dir, symbol):
+        if path != keep and os.path.exists(path):
+            os.remove(path)
+
+def remove_temp_files(data_dir, max_age=TEMP_MAX_AGE):
+    """
+    Deletes temp files older than `max_age` seconds left in `data_dir` and its shard
+    directories by writers that were killed mid-write.
+
+    Returns:
+        int: The number of files removed.
+    """
+    root = Path(data_dir)
+    if not root.is_dir():
+        return 0
+    directories = [root] + [path for path in root.iterdir() if path.is_dir() and is_shard_dir(path.name)]
+    cutoff = time.time() - max_age
+    removed = 0
+    for directory in directories:
+        for path in directory.glob(f"*{TEMP_SUFFIX}"):
+            try:
+                if path.stat().st_mtime < cutoff:
+                    path.unlink()
+                    removed += 1
+            except FileNotFoundError:
+                pass
+    return removed
+
+def is_record_file(path):
+    return str(path).endswith(RECORD_SUFFIXES)
+
+def list_record_files(data_dir):
+    """
+    Returns all record files in `data_dir` and its shard directories, in any supported
+    format, sorted by path.
+    """
+    root = Path(data_dir)
+    if not root.is_dir():
+        return []
+    files = []
+    for path in root.iterdir():
+        if path.is_file() and is_record_file(path.name):
+            files.append(path)
+        elif path.is_dir() and is_shard_dir(path.name):
+            files.extend(child for child in path.iterdir() if child.is_file() and is_record_file(child.name))
+    return sorted(files)
+
+def record_name(path):
+    """
+    Returns the record name for a path, e.g. 'aapl.json.zst' -> 'aapl'.
+    """
+    name = Path(path).name
+    for suffix in sorted(RECORD_SUFFIXES, key=len, reverse=True):
+        if name.endswith(suffix):
+            return name[:-len(suffix)]
+    return Path(path).stem
+
+def symbol_from_path(path):
+    """
+    Returns the exchange-qualified symbol for a fundamentals record path. Bare names from
+    the flat pre-sharding layout are US codes.
+    """
+    return qualify_symbol(record_name(path))
+
+def migrate_layout(data_dir, exchange=DEFAULT_EXCHANGE):
+    """
+    Moves records from the flat pre-sharding layout into shard directories, qualifying
+    bare names with `exchange`.
+
+    Returns:
+        int: The number of records moved.
+    """
+    moved = 0
+    for path in list_record_files(data_dir):
+        if path.parent != Path(data_dir):
+            continue
+        key = qualify_symbol(record_name(path), exchange)
+        target = os.path.join(data_dir, shard_of(key), key.lower() + path.name[len(record_name(path)):])
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(path, target)
+        moved += 1
+    return moved
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    parser = argparse.ArgumentParser(description="Manage the storage format of fundamentals records.")
+    parser.add_argument("--data_dir", default="./data/fundamental_data", help="Directory containing the records.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    train_parser = subparsers.add_parser("train", help="Train a zstd dictionary from a sample of the records.")
+    train_parser.add_argument("--sample_size", type=int, default=DICT_SAMPLE_SIZE, help="Number of records to sample.")
+    train_parser.add_argument("--dict_size", type=int, default=DICT_SIZE, help="Dictionary size in bytes.")
+    recompress_parser = subparsers.add_parser("recompress", help="Rewrite every record with the given codec.")
+    recompress_parser.add_argument("--codec", choices=CODECS, default="zstd-dict", help="Target codec.")
+    migrate_parser = subparsers.add_parser("migrate", help="Move flat records into the sharded, exchange-qualified layout.")
+    migrate_parser.add_argument("--exchange", default=DEFAULT_EXCHANGE,
+                                help="Exchange code for records named by bare code (default: US).")
+    args = parser.parse_args()
+
+    if args.command == "train":
+        dict_id = train_dictionary(args.data_dir, args.sample_size, args.dict_size)
+        print(f"Current dictionary: {dict_id}")
+    elif args.command == "recompress":
+        from fetch_manifest import FetchManifest, manifest_path
+
+        # Keep the manifest's payload size and dictionary of every rewritten record in step
+        manifest = FetchManifest(manifest_path(args.data_dir)) if os.path.exists(manifest_path(args.data_dir)) else None
+        before = after = 0
+        for count, path in enumerate(list_record_files(args.data_dir), 1):
+            before += path.stat().st_size
+            name = record_name(path)
+            payload = write_record(read_record(path, args.data_dir), record_path(path.parent, name, args.codec),
+                                   args.codec, args.data_dir)
+            remove_other_formats(path.parent, name, args.codec)
+            after += len(payload)
+            if manifest is not None:
+                manifest.record_storage(symbol_from_path(path), len(payload), payload_dictionary_id(payload))
+                if count % 1000 == 0:
+                    manifest.commit()
+        if manifest is not None:
+            manifest.close()
+        print(f"Recompressed {args.data_dir}: {before:,} -> {after:,} bytes.")
+    elif args.command == "migrate":
+        from fetch_manifest import FetchManifest, manifest_path
+        from pack_store import PackStore, has_pack
+
+        print(f"Moved {migrate_layout(args.data_dir, args.exchange)} records into shard directories.")
+        if has_pack(args.data_dir):
+            store = PackStore(args.data_dir)
+            print(f"Qualified {store.qualify_symbols(args.exchange)} pack store keys.")
+            store.close()
+        if os.path.exists(manifest_path(args.data_dir)):
+            manifest = FetchManifest(manifest_path(args.data_dir))
+            print(f"Qualified {manifest.qualify_symbols(args.exchange)} manifest entries.")
+            manifest.close()
@@ -0,0 +1,312 @@
+import logging
+import argparse
+from collections import OrderedDict
+from functools import partial
+from fundamental_io import (decode_record, list_record_files, read_record, resolve_record, symbol_from_path,
+                            qualify_symbol)
+from summary_index import SummaryIndex, INDEXED_FIELDS, summary_path, summarize
+from parallel_scan import scan_records, DEFAULT_CHUNK_SIZE, DEFAULT_WORKERS
+
+# Decoded records kept in memory. Records can be several MB each, so keep this modest.
+DEFAULT_CACHE_SIZE = 256
+
+def get_field(record, path, default=None):
+    """
+    Returns the value at a dotted path in a record, e.g. 'Highlights.MarketCapitalization',
+    or `default` when any part of the path is missing.
+    """
+    value = record
+    for key in path.split("."):
+        if not isinstance(value, dict) or key not in value:
+            return default
+        value = value[key]
+    return value
+
+def project_paths(paths, symbol, record):
+    """
+    Scan extractor returning the values at `paths` as a dict (see FundamentalStore.map).
+    """
+    return {path: get_field(record, path) for path in paths}
+
+def summarize_record(symbol, record):
+    """
+    Scan extractor returning a record's Summary; the caller fills in its mtime.
+    """
+    return summarize(symbol, record, None)
+
+def get_indexed_field(summary, path):
+    return getattr(summary, INDEXED_FIELDS[path])
+
+def project(record, fields):
+    """
+    Reduces a record to a dict of the values at the dotted paths in `fields`; returns the
+    whole record when `fields` is None.
+    """
+    return record if fields is None else {path: get_field(record, path) for path in fields}
+
+def matches(record, where, get=get_field):
+    """
+    Checks a record against a filter mapping dotted paths to either a required value or a
+    predicate called with the value, e.g. {"General.Type": "ETF"} or
+    {"General.Type": lambda asset_type: asset_type != "FUND"}. `get` reads a path's value.
+    """
+    for path, condition in (where or {}).items():
+        value = get(record, path)
+        if callable(condition):
+            if not condition(value):
+                return False
+        elif value != condition:
+            return False
+    return True
+
+class FundamentalStore:
+    """
+    Read access to the fundamentals records of a data directory, whether they sit in the
+    pack store or in loose files, with an LRU cache of decoded records.
+
+    Tools share one store so a job that scans the corpus and then renders or re-reads some
+    of the records only decodes each of them once, as long as they are still cached.
+
+    Scans whose fields and filters are all in the summary index (see summary_index) are
+    answered from the index, decoding only the records whose entries are missing or stale.
+    With `workers` above 1, records that must be decoded for a scan or for the index are
+    decoded by that many processes (see parallel_scan).
+    """
+
+    def __init__(self, data_dir, cache_size=DEFAULT_CACHE_SIZE, use_index=True, workers=1,
+                 chunk_size=DEFAULT_CHUNK_SIZE):
+        self.data_dir = str(data_dir)
+        self.cache_size = cache_size
+        self.use_index = use_index
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self._cache = OrderedDict()
+        self._pack = None
+        self._summaries = None
+
+    def close(self):
+        if self._pack is not None:
+            self._pack.close()
+            self._pack = None
+        self._cache.clear()
+        self._summaries = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def pack(self):
+        """
+        Returns the read-only pack store of the data directory, or None if it has none.
+        """
+        from pack_store import PackStore, has_pack
+
+        if self._pack is None and has_pack(self.data_dir):
+            self._pack = PackStore(self.data_dir, readonly=True)
+        return self._pack
+
+    def _remember(self, symbol, record):
+        if self.cache_size <= 0:
+            return
+        self._cache[symbol] = record
+        self._cache.move_to_end(symbol)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def get(self, symbol):
+        """
+        Returns the record for `symbol` (qualified, or a bare US code), or None if there is none.
+        """
+        key = qualify_symbol(symbol)
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            return self._cache[key]
+        pack = self.pack()
+        record = pack.get(key) if pack is not None else None
+        if record is None:
+            path = resolve_record(self.data_dir, key)
+            if path is None:
+                return None
+            record = read_record(path, self.data_dir)
+        self._remember(key, record)
+        return record
+
+    def records(self):
+        """
+        Yields (symbol, record) for every record: first the pack store's, then loose files
+        for symbols not in the pack. Cached records are not decoded again. Unreadable
+        records are logged and skipped.
+        """
+        packed = set()
+        pack = self.pack()
+        if pack is not None:
+            for symbol, payload in pack.scan_payloads():
+                symbol = qualify_symbol(symbol)
+                packed.add(symbol)
+                record = self._cache.get(symbol)
+                if record is None:
+                    try:
+                        record = decode_record(payload, self.data_dir)
+                    except Exception as e:
+                        logging.error(f"Error decoding packed record {symbol}: {e}")
+                        continue
+                    self._remember(symbol, record)
+                yield symbol, record
+        for path in list_record_files(self.data_dir):
+            symbol = symbol_from_path(path)
+            if symbol in packed:
+                continue
+            record = self._cache.get(symbol)
+            if record is None:
+                try:
+                    record = read_record(path, self.data_dir)
+                except Exception as e:
+                    logging.error(f"Error reading record {path}: {e}")
+                    continue
+                self._remember(symbol, record)
+            yield symbol, record
+
+    def versions(self):
+        """
+        Returns {symbol: (version, path)} for every stored record: the pack store's stored_at
+        (path None) for packed records, the file's modification time for loose files.
+        """
+        versions = {}
+        pack = self.pack()
+        if pack is not None:
+            versions = {qualify_symbol(symbol): (stored_at, None) for symbol, stored_at, _ in pack.entries()}
+        for path in list_record_files(self.data_dir):
+            symbol = symbol_from_path(path)
+            if symbol not in versions:
+                try:
+                    versions[symbol] = (path.stat().st_mtime, path)
+                except FileNotFoundError:
+                    pass
+        return versions
+
+    def map(self, extract, symbols=None, versions=None):
+        """
+        Applies `extract(symbol, record)` to the records of `symbols` (default: every
+        record), decoding them in parallel with the store's workers. `extract` must be a
+        module-level function (or a functools.partial of one) so it can be sent to the
+        worker processes. Symbols without a record are skipped.
+
+        Yields:
+            tuple: (symbol, result) for every result that is not None, in the order of
+            `symbols` (or of `versions()`).
+        """
+        versions = versions or self.versions()
+        symbols = versions if symbols is None else [qualify_symbol(symbol) for symbol in symbols]
+        sources = [(symbol, versions[symbol][1]) for symbol in symbols if symbol in versions]
+        yield from scan_records(self.data_dir, extract, sources, self.workers, self.chunk_size)
+
+    def summaries(self):
+        """
+        Returns the Summary of every record, sorted by symbol, from the summary index.
+        Records without an index entry, or whose stored copy changed since it was indexed,
+        are decoded and re-indexed; entries of records that are gone are dropped.
+        """
+        if self._summaries is not None:
+            return self._summaries
+        index = SummaryIndex(summary_path(self.data_dir))
+        try:
+            entries = index.entries()
+            versions = self.versions()
+            stale = [symbol for symbol, (version, _) in versions.items()
+                     if symbol not in entries or entries[symbol].mtime != version]
+            if stale:
+                logging.info(f"Indexing {len(stale)} of {len(versions)} records.")
+            for symbol, summary in self.map(summarize_record, stale, versions):
+                entries[symbol] = summary._replace(mtime=versions[symbol][0])
+                index.put(entries[symbol])
+            gone = [symbol for symbol in entries if symbol not in versions]
+            index.remove(gone)
+            for symbol in gone:
+                del entries[symbol]
+        finally:
+            index.close()
+        self._summaries = [entries[symbol] for symbol in sorted(entries)]
+        return self._summaries
+
+    def scan(self, fields=None, where=None):
+        """
+        Yields the records matching `where` (see `matches`).
+
+        When every path in `fields` and `where` is indexed, the results come from the
+        summary index alone. When only the `where` paths are, the index selects the records
+        and only those are decoded. With `fields`, records are decoded and reduced to those
+        fields by the store's workers (see `map`), in the same order whatever their number.
+
+        Args:
+            fields (iterable): Dotted paths to extract. When given, each record is reduced to
+                a dict of those paths' values (None where missing); otherwise the whole
+                record is yielded.
+            where (dict): Filter on dotted paths.
+
+        Yields:
+            tuple: (symbol, record or dict of field values).
+        """
+        fields = tuple(fields) if fields is not None else None
+        where = where or {}
+        if self.use_index and all(path in INDEXED_FIELDS for path in where):
+            from_index = fields is not None and all(path in INDEXED_FIELDS for path in fields)
+            selected = []
+            if from_index or where:
+                for summary in self.summaries():
+                    if not matches(summary, where, get_indexed_field):
+                        continue
+                    if from_index:
+                        yield summary.symbol, {path: get_indexed_field(summary, path) for path in fields}
+                        continue
+                    if fields is not None:
+                        selected.append(summary.symbol)
+                        continue
+                    record = self.get(summary.symbol)
+                    if record is not None:
+                        yield summary.symbol, record
+                if selected:
+                    yield from self.map(partial(project_paths, fields), selected)
+                return
+        if fields is not None:
+            # `where` may hold lambdas, which can't be sent to the workers: extract its
+            # paths along with the fields and filter here
+            paths = tuple(dict.fromkeys(fields + tuple(where)))
+            for symbol, values in self.map(partial(project_paths, paths)):
+                if matches(values, where, dict.get):
+                    yield symbol, {path: values[path] for path in fields}
+            return
+        for symbol, record in self.records():
+            if matches(record, where):
+                yield symbol, project(record, fields)
+
+def open_store(source, cache_size=DEFAULT_CACHE_SIZE):
+    """
+    Returns `source` if it already is a FundamentalStore, otherwise a store for the data
+    directory it names. Lets tool functions take either.
+    """
+    return source if isinstance(source, FundamentalStore) else FundamentalStore(source, cache_size)
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    parser = argparse.ArgumentParser(description="Print fields of the stored fundamentals records.")
+    parser.add_argument("--data_dir", default="./data/fundamental_data", help="Directory containing fundamentals data.")
+    parser.add_argument("--fields", nargs="+", default=["General.Type", "Highlights.MarketCapitalization"],
+                        help="Dotted paths to print, e.g. General.Type Highlights.MarketCapitalization.")
+    parser.add_argument("--type", help="Only records of this General.Type, e.g. ETF.")
+    parser.add_argument("--symbol", help="Print the fields of a single symbol.")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help="Processes decoding records (default: one per CPU).")
+    args = parser.parse_args()
+
+    with FundamentalStore(args.data_dir, workers=args.workers) as store:
+        if args.symbol:
+            record = store.get(args.symbol)
+            rows = [] if record is None else [(qualify_symbol(args.symbol),
+                                               {path: get_field(record, path) for path in args.fields})]
+        else:
+            rows = store.scan(fields=args.fields, where={"General.Type": args.type} if args.type else None)
+        for symbol, values in rows:
+            print("\t".join([symbol] + [str(values[path]) for path in args.fields]))
@@ -1,9 +1,9 @@
 import os
-import json
 import argparse
 import logging
 import plotly.graph_objs as go
 from datetime import datetime
+from fundamental_io import read_record
 
 # Configure logging to display DEBUG messages
 logging.basicConfig(level=logging.DEBUG, format='%(levelname)s:%(message)s')
@@ -724,8 +724,7 @@ if __name__ == "__main__":
     output_filepath = f"./html/{symbol}.html"  # Save as 'aapl.html' in './html/'
 
     try:
-        with open(args.rss, "r") as file:
-            data = json.load(file)
+        data = read_record(args.rss)
     except Exception as e:
         logging.error(f"Error reading JSON file: {e}")
         exit(1)
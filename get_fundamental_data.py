@@ -1,108 +1,704 @@
 import os
-import json
+import hashlib
 import logging
 from datetime import datetime, timedelta
 from pathlib import Path
-from eodhd import APIClient
 import argparse
 from dotenv import load_dotenv
 from tqdm import tqdm
 import time
 import requests
+from collections import Counter, namedtuple
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from rate_limiter import TokenBucket
+from eodhd_http import EODHDClient, create_session, CONNECT_TIMEOUT, READ_TIMEOUT
+from fetch_manifest import FetchManifest, manifest_path, FULL_PROFILE
+from parquet_store import ParquetFundamentalsWriter
+from pack_store import PackStore
+from record_writer import RecordWriter, DURABILITY_LEVELS
+from summary_index import SummaryIndex, summary_path
+from work_queue import WorkQueue, LEASE_SECONDS, QUEUE_WAIT
+from fetch_scheduler import WorkItem, default_weights, schedule
+from refresh_policy import RefreshPolicy
+from earnings_calendar import report_dates
+from symbol_changes import read_changes, log_end
+from symbol_master import SymbolMaster
+from api_budget import (ApiUsage, DailyBudget, DEFAULT_COSTS, DEFAULT_COST, load_costs, usage_path,
+                        plan_within_budget, print_plan)
+from fundamental_io import (CODECS, record_name, find_record, require_codec, current_dictionary_id,
+                            payload_dictionary_id, symbol_key, content_hash)
+from backoff import (FetchResult, BackoffPolicy, CircuitBreaker, OK, NOT_FOUND, RATE_LIMITED, QUOTA_EXHAUSTED,
+                     SERVER_ERROR, NETWORK_ERROR, CLIENT_ERROR, UNAUTHORIZED, INTERNAL_ERROR, RETRYABLE,
+                     UNHEALTHY)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 load_dotenv()
 
+# Default cost of a fundamentals request in API calls (see api_budget; --costs overrides it)
+FUNDAMENTALS_CALL_COST = DEFAULT_COSTS["fundamentals"]
+
+# Top-level sections of the fundamentals payload that can be requested on their own
+FUNDAMENTAL_SECTIONS = [
+    "General", "Highlights", "Valuation", "SharesStats", "Technicals", "SplitsDividends",
+    "AnalystRatings", "Holders", "InsiderTransactions", "ESGScores", "outstandingShares",
+    "Earnings", "Financials", "ETF_Data", "MutualFund_Data",
+]
+
+# Named --sections profiles for the downstream tools
+SECTION_PROFILES = {
+    "full": None,
+    "market_cap": ["General", "Highlights"],
+    "etf": ["General", "ETF_Data"],
+}
+
+# Storage backends selectable with --storage
+STORAGE_BACKENDS = ["json", "pack", "parquet"]
+
+# Number of manifest updates grouped into one SQLite transaction
+MANIFEST_COMMIT_INTERVAL = 100
+
+# Seconds to wait before resuming a run interrupted by an unexpected error
+RESUME_DELAY = 60
+
+# Seconds between checks of the exchange change log while waiting for the next pass
+CHANGE_POLL_INTERVAL = 300
+
 def setup_logging():
     """
     Configures logging for the script.
     """
     logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-def sleep_for(seconds):
+def next_5am():
     """
-    Sleeps for the given number of seconds.
+    Returns 5 AM the next day.
     """
-    logging.info(f"Sleeping for {seconds} seconds...")
-    time.sleep(seconds)
+    return datetime.combine(datetime.now() + timedelta(days=1), datetime.min.time()) + timedelta(hours=5)
 
 def sleep_until_next_5am():
     """
     Sleeps until 5 AM the next day.
     """
     now = datetime.now()
-    next_5am = datetime.combine(now + timedelta(days=1), datetime.min.time()) + timedelta(hours=5)
-    sleep_seconds = (next_5am - now).total_seconds()
-    logging.info(f"Processing complete. Sleeping until {next_5am.strftime('%Y-%m-%d %H:%M:%S')} ({int(sleep_seconds)} seconds).")
+    next_5am_time = next_5am()
+    sleep_seconds = (next_5am_time - now).total_seconds()
+    logging.info(f"Processing complete. Sleeping until {next_5am_time.strftime('%Y-%m-%d %H:%M:%S')} ({int(sleep_seconds)} seconds).")
     time.sleep(sleep_seconds)
 
-def fetch_fundamental_data(api_client, ticker):
+def fetch_fundamental_data(api_client, ticker, sections=None):
     """
-    Fetches fundamental data for the given ticker using the EODHD API client.
+    Fetches fundamental data for the given ticker using the shared EODHD API client,
+    optionally restricted to the given top-level sections.
 
     Returns:
-        dict: The fundamental data if successful; otherwise, None.
+        FetchResult: The classified outcome, with the data when the status is OK.
     """
     try:
-        data = api_client.get_fundamentals_data(ticker)
+        data = api_client.get_fundamentals_data(ticker, sections=sections)
 
         if not data:
-            logging.error(f"No data returned for {ticker}. Skipping to next symbol.")
-            return None
+            if sections:
+                # The symbol exists but has none of the requested sections (e.g. ETF_Data of
+                # a common stock): an empty result, not a missing symbol to quarantine
+                logging.debug(f"No {', '.join(sections)} data for {ticker}.")
+                return FetchResult(OK, {})
+            logging.info(f"No data returned for {ticker}. Skipping to next symbol.")
+            return FetchResult(NOT_FOUND)
 
         if isinstance(data, dict):
-            return data
+            return FetchResult(OK, data)
         else:
-            logging.error(f"Invalid data format returned for {ticker}. Skipping to next symbol.")
-            return None
+            logging.info(f"Invalid data format returned for {ticker}. Skipping to next symbol.")
+            return FetchResult(NOT_FOUND)
 
+    except requests.HTTPError as e:
+        status_code = e.response.status_code if e.response is not None else None
+        if status_code == 404:
+            logging.info(f"No data available for {ticker} (HTTP 404).")
+            return FetchResult(NOT_FOUND)
+        if status_code == 402:
+            # The daily quota is used up: retrying today can't succeed
+            logging.warning(f"Daily API quota exhausted while fetching {ticker} (HTTP 402).")
+            return FetchResult(QUOTA_EXHAUSTED)
+        if status_code == 429:
+            logging.warning(f"Rate limited while fetching {ticker} (HTTP 429).")
+            return FetchResult(RATE_LIMITED, retry_after=e.response.headers.get("Retry-After"))
+        if status_code is not None and status_code >= 500:
+            logging.warning(f"Server error for {ticker}: {e}")
+            return FetchResult(SERVER_ERROR)
+        if status_code == 401:
+            logging.error(f"API key rejected while fetching {ticker}: {e}")
+            return FetchResult(UNAUTHORIZED)
+        logging.error(f"Request rejected for {ticker}: {e}")
+        return FetchResult(CLIENT_ERROR)
+    except (requests.ConnectionError, requests.Timeout) as e:
+        logging.warning(f"Network error for {ticker}: {e}")
+        return FetchResult(NETWORK_ERROR)
+    except ValueError as e:
+        logging.warning(f"Undecodable response for {ticker}: {e}")
+        return FetchResult(SERVER_ERROR)
     except Exception as e:
         logging.error(f"Unexpected error for {ticker}: {e}")
-        return None
+        return FetchResult(INTERNAL_ERROR)
 
-def save_json(data, filepath):
+def parse_storage(value):
     """
-    Saves JSON data to a file.
+    Parses a --storage value: a comma-separated list of backends ('json', 'pack', 'parquet').
+    'both' is accepted as shorthand for 'json,parquet'.
     """
-    os.makedirs(os.path.dirname(filepath), exist_ok=True)
-    with open(filepath, "w") as file:
-        json.dump(data, file, indent=4)
-    logging.debug(f"Saved JSON to {filepath}")
+    backends = {"json", "parquet"} if value == "both" else {b.strip() for b in value.split(",") if b.strip()}
+    unknown = backends - set(STORAGE_BACKENDS)
+    if unknown or not backends:
+        raise argparse.ArgumentTypeError(f"Unknown storage backends {sorted(unknown)}. "
+                                         f"Use any of: {', '.join(STORAGE_BACKENDS)}.")
+    return backends
+
+def parse_sections(value):
+    """
+    Parses a --sections value: a profile name from SECTION_PROFILES or a comma-separated
+    list of top-level sections. Returns None for the complete payload.
+    """
+    if value in SECTION_PROFILES:
+        return SECTION_PROFILES[value]
+    sections = list(dict.fromkeys(section.strip() for section in value.split(",") if section.strip()))
+    unknown = [section for section in sections if section not in FUNDAMENTAL_SECTIONS]
+    if unknown or not sections:
+        raise argparse.ArgumentTypeError(
+            f"Unknown sections {unknown}. Use a profile ({', '.join(SECTION_PROFILES)}) "
+            f"or any of: {', '.join(FUNDAMENTAL_SECTIONS)}."
+        )
+    return sections
+
+def parse_shard(value):
+    """
+    Parses a --shard value 'i/N' into (i, N), where 0 <= i < N.
+    """
+    try:
+        index, count = (int(part) for part in value.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid shard '{value}'. Use i/N, e.g. 0/4.")
+    if count < 1 or not 0 <= index < count:
+        raise argparse.ArgumentTypeError(f"Invalid shard '{value}'. The index must be between 0 and N-1.")
+    return index, count
 
-def file_modified_within_days(filepath, days):
+def symbol_shard(symbol, count):
     """
-    Checks if a file was modified within the last 'days' days.
+    Returns the shard (0 to count-1) an exchange-qualified symbol belongs to. The hash is
+    stable across processes, hosts and Python versions.
     """
-    if not os.path.exists(filepath):
-        return False
-    file_mod_time = datetime.fromtimestamp(os.path.getmtime(filepath))
-    return datetime.now() - file_mod_time < timedelta(days=days)
+    return int(hashlib.sha1(symbol.upper().encode("utf-8")).hexdigest()[:8], 16) % count
 
-def load_symbols_from_country_file(filepath, exchange=None):
+def load_symbols_from_country_file(filepath, exchange=None, with_types=False):
     """
     Loads symbols from the specified country JSON file and filters by exchange if specified.
+    With `with_types`, each symbol is a (code, type) pair carrying the list's Type field
+    (e.g. 'Common Stock', 'ETF', 'FUND').
+
+    The symbols come from the symbol master index next to the file, which is reindexed
+    first if the file changed.
     """
     if not Path(filepath).exists():
         logging.error(f"File {filepath} not found.")
         return {}
 
-    with open(filepath, "r") as file:
-        data = json.load(file)
+    country = record_name(filepath)
+    master = SymbolMaster(Path(filepath).parent)
+    try:
+        master.sync([country])
+        listings = master.listings(country, exchange)
+    finally:
+        master.close()
 
     symbols_by_exchange = {}
-    for entry in data:
-        exchange_code = entry.get("Exchange")
-        symbol = entry.get("Code")
-        if exchange_code and symbol:
-            symbols_by_exchange.setdefault(exchange_code, []).append(symbol)
+    for listing in listings:
+        if listing.exchange:
+            symbols_by_exchange.setdefault(listing.exchange, []).append(
+                (listing.code, listing.type) if with_types else listing.code)
 
     if exchange:
         return symbols_by_exchange.get(exchange, [])
     return symbols_by_exchange
 
-if __name__ == "__main__":
+def parse_daily_budget(value):
+    """
+    Parses --daily_budget: a number of API calls, or 'auto' for the plan's daily limit.
+    """
+    if value.lower() == "auto":
+        return "auto"
+    try:
+        budget = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError("Daily budget must be a number of API calls or 'auto'.")
+    if budget < 0:
+        raise argparse.ArgumentTypeError("Daily budget must not be negative.")
+    return budget
+
+def country_work_items(symbols_by_exchange, country, weights=None):
+    """
+    Turns the (code, type) pairs of one country's exchange list, grouped by exchange (see
+    `load_symbols_from_country_file()`), into WorkItems with the exchanges in order of
+    decreasing priority weight (see fetch_scheduler).
+
+    Symbols are keyed by CODE.EXCHANGE (the exchange list's code, e.g. AAPL.US), which is
+    also the ticker form the API expects, so equal codes on different exchanges never collide.
+    """
+    weights = weights or default_weights()
+    exchanges = sorted(symbols_by_exchange, key=lambda exch: -weights.weight(country, exch))
+    return [WorkItem(symbol_key(code, country), exch, country, weights.weight(country, exch), asset_type)
+            for exch in exchanges for code, asset_type in symbols_by_exchange[exch]]
+
+def fetch_with_retries(api_client, limiter, breaker, policy, ticker, sections=None, cost=FUNDAMENTALS_CALL_COST,
+                       budget=None):
+    """
+    Fetches fundamental data for the ticker, waiting for the circuit breaker and the rate
+    limiter before every attempt and retrying retryable outcomes with backoff. With a
+    `budget`, a retry it can't pay for is not made and QUOTA_EXHAUSTED is returned.
+
+    Returns:
+        FetchResult: The outcome of the last attempt.
+    """
+    for attempt in range(policy.max_retries + 1):
+        if attempt > 0 and budget is not None and not budget.can_afford(cost):
+            logging.debug(f"Not retrying {ticker}: today's API budget is spent.")
+            return FetchResult(QUOTA_EXHAUSTED)
+        breaker.wait_until_closed()
+        limiter.acquire(cost)
+        result = fetch_fundamental_data(api_client, ticker, sections)
+
+        if result.status in UNHEALTHY:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+
+        if result.status not in RETRYABLE or attempt == policy.max_retries:
+            return result
+
+        delay = policy.delay(attempt, result.retry_after)
+        logging.debug(f"Retrying {ticker} in {delay:.1f} seconds after {result.status}.")
+        time.sleep(delay)
+    return result
+
+def fetch_symbols(api_client, symbols, writer, days, limiter, manifest, concurrency=1,
+                  breaker=None, policy=None, sections=None, run_key=None, queue=None, budget=None,
+                  call_cost=FUNDAMENTALS_CALL_COST, windows=None):
+    """
+    Fetches and saves fundamental data for every symbol that the manifest reports as due,
+    using up to `concurrency` worker threads that share one rate limiter and circuit breaker.
+
+    Only the fetch runs in the worker threads; saving and manifest updates stay on the
+    calling thread.
+
+    Args:
+        symbols (list): (qualified symbol, listing exchange) pairs in priority order.
+        writer (RecordWriter): Storage backends to write fetched records to. The manifest is
+            only committed after the writer has flushed, so no symbol is marked fresh before
+            its data is on disk. With a Parquet backend that happens once per Parquet batch.
+        sections (list): Top-level sections to fetch, or None for the complete payload.
+            Partial payloads are merged into the stored record.
+        run_key (str): Identifies the job (country, exchange, sections, ...). When given, the
+            ordered list of due symbols and each symbol's outcome are persisted in the
+            manifest as a run, and a call that finds an unfinished run for the same key
+            resumes it with the symbols that have no outcome yet. A run the daily quota or
+            budget stops stays unfinished.
+        queue (WorkQueue): Shared work queue. When given, the due symbols are enqueued and
+            the work actually fetched is leased from the queue in batches, so several
+            processes split it between them; the queue then takes the place of the run.
+        budget (DailyBudget): When given, no request or retry is started once the calls left
+            today (less those in flight) would not cover it; the rest waits for the next pass,
+            as it does when the API answers that the daily quota is used up (HTTP 402).
+        call_cost (int): API calls charged per fundamentals request.
+        windows (dict): Per-symbol refresh windows in days (see refresh_policy), overriding `days`.
+
+    Returns:
+        Counter: The number of symbols per fetch outcome, plus the number of successful
+        fetches whose content was unchanged ('unchanged'), which were not rewritten.
+    """
+    breaker = breaker or CircuitBreaker()
+    policy = policy or BackoffPolicy()
+    exchange_by_symbol = dict(symbols)
+    run_id = manifest.find_run(run_key) if run_key and queue is None else None
+    if run_id is not None:
+        work = manifest.pending_run_items(run_id)
+        exchange_by_symbol.update(work)
+        due_symbols = [symbol for symbol, _ in work]
+        logging.info(f"Resuming run {run_id}: {len(due_symbols)} symbols left.")
+    else:
+        due_symbols = manifest.due_symbols([symbol for symbol, _ in symbols], days, sections, windows)
+        logging.info(f"{len(due_symbols)} of {len(symbols)} symbols are due for a refresh.")
+        if queue is not None:
+            added = queue.enqueue([(symbol, exchange_by_symbol[symbol]) for symbol in due_symbols])
+            logging.info(f"Queued {added} symbols; {queue.counts().get('pending', 0)} pending in the shared queue.")
+        elif run_key:
+            run_id = manifest.start_run(run_key, [(symbol, exchange_by_symbol[symbol]) for symbol in due_symbols])
+            manifest.commit()
+
+    def claimed_symbols():
+        # Lease batches from the shared queue until it runs dry. While other workers still
+        # hold live leases, their items may come back, so yield QUEUE_WAIT instead of stopping.
+        while True:
+            batch = queue.claim()
+            if batch:
+                exchange_by_symbol.update(batch)
+                yield from (symbol for symbol, _ in batch)
+            elif queue.leased_by_others():
+                yield QUEUE_WAIT
+            else:
+                return
+
+    def commit_batch():
+        writer.flush()
+        manifest.commit()
+        # Only hand items back as done once their results are committed
+        if queue is not None:
+            queue.complete(completed)
+        completed.clear()
+
+    outcomes = Counter()
+    recorded = 0
+    pending = {}
+    completed = []
+    symbol_iter = claimed_symbols() if queue is not None else iter(due_symbols)
+    exhausted = False
+    out_of_budget = False
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor, \
+            tqdm(total=None if queue is not None else len(due_symbols), desc="Fetching data") as progress:
+        while pending or not exhausted:
+            # Keep a bounded number of requests in flight
+            while not exhausted and len(pending) < concurrency * 2:
+                symbol = next(symbol_iter, None)
+                if symbol is None:
+                    exhausted = True
+                    break
+                if symbol is QUEUE_WAIT:
+                    break
+                if budget is not None and not budget.can_afford(call_cost * (len(pending) + 1)):
+                    logging.warning("Today's API budget is spent; leaving the remaining symbols for the next pass.")
+                    exhausted = out_of_budget = True
+                    break
+                logging.debug(f"Fetching data for {symbol}...")
+                future = executor.submit(fetch_with_retries, api_client, limiter, breaker, policy, symbol,
+                                         sections, call_cost, budget)
+                pending[future] = symbol
+
+            if not pending:
+                if not exhausted:
+                    # Idle until other workers finish or their leases expire
+                    commit_batch()
+                    queue.heartbeat()
+                    time.sleep(queue.poll_interval)
+                continue
+
+            if queue is not None:
+                queue.heartbeat()
+                # Wake up regularly to keep leases alive while workers wait on the API
+                done, _ = wait(pending, timeout=queue.lease_seconds / 3, return_when=FIRST_COMPLETED)
+            else:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                symbol = pending.pop(future)
+                exchange = exchange_by_symbol[symbol]
+                progress.update(1)
+
+                flushed = False
+                try:
+                    result = future.result()
+                    status = result.status
+                    if status == QUOTA_EXHAUSTED:
+                        # Nothing more can be fetched today. The symbol is not to blame, so it is
+                        # left without an outcome (and its queue item leased) for the next pass.
+                        if not out_of_budget:
+                            logging.warning("The daily API quota is used up; leaving the remaining symbols for the "
+                                            "next pass.")
+                        exhausted = out_of_budget = True
+                        outcomes[status] += 1
+                        continue
+                    if status == OK:
+                        record = writer.prepare(symbol, result.data, sections)
+                        digest = content_hash(record)
+                        general = record.get("General") or {}
+                        if digest == manifest.content_hash(symbol) and writer.exists(symbol):
+                            # Same content as stored: only the freshness changes
+                            manifest.record_unchanged(symbol, exchange, sections)
+                            outcomes["unchanged"] += 1
+                            logging.debug(f"Data for {symbol} is unchanged.")
+                        else:
+                            payload, flushed = writer.write(symbol, exchange, result.data, sections, record, digest)
+                            manifest.record_success(symbol, exchange, len(payload), digest,
+                                                    sections, dict_id=payload_dictionary_id(payload))
+                            # Log successful saves as DEBUG
+                            logging.debug(f"Data for {symbol} saved successfully.")
+                        manifest.record_profile(symbol, general.get("Type"), general.get("IsDelisted"),
+                                                *report_dates(record))
+                    else:
+                        manifest.record_failure(symbol, exchange, status)
+                        logging.debug(f"Failed to fetch data for {symbol}: {status}")
+                except Exception as e:
+                    # One bad symbol must not end the run
+                    logging.error(f"Unexpected error processing {symbol}: {e}")
+                    status = INTERNAL_ERROR
+                    manifest.record_failure(symbol, exchange, status)
+                outcomes[status] += 1
+                if run_id is not None:
+                    manifest.record_run_outcome(run_id, symbol, status)
+                completed.append((symbol, status))
+
+                recorded += 1
+                if flushed or (writer.parquet_writer is None and recorded % MANIFEST_COMMIT_INTERVAL == 0):
+                    commit_batch()
+
+    if run_id is not None:
+        if out_of_budget:
+            # The symbols not reached yet are left for the next pass, which resumes the run
+            logging.info(f"Leaving run {run_id} open: today's API quota or budget ended it early.")
+        else:
+            manifest.finish_run(run_id)
+    commit_batch()
+    if out_of_budget and queue is not None:
+        # Hand the claimed but unstarted items to workers with budget left
+        queue.release()
+    logging.info(f"Fetch pass complete: {dict(outcomes)}")
+    return outcomes
+
+def add_fetch_arguments(parser):
+    """
+    Adds the storage, throttling and worker options shared by this script and the
+    multi-country orchestrator.
+    """
+    parser.add_argument("--output_dir", default="./data/fundamental_data", help="Directory to save JSON files.")
+    parser.add_argument("--days", type=int, default=10, help="Number of days to check for file modification.")
+    parser.add_argument("--errors_before_sleep", type=int, default=50,
+                        help="Consecutive rate-limit, server or network errors before the circuit breaker pauses fetching.")
+    parser.add_argument("--sleep_time", type=int, default=3600, help="Maximum circuit breaker pause in seconds.")
+    parser.add_argument("--max_retries", type=int, default=5, help="Retries per symbol for rate-limit, server and network errors.")
+    parser.add_argument("--concurrency", type=int, default=8, help="Number of concurrent fetch workers.")
+    parser.add_argument("--calls_per_minute", type=int, default=1000,
+                        help="API calls per minute allowed by the EODHD plan. Each fundamentals request costs "
+                             f"{FUNDAMENTALS_CALL_COST} calls.")
+    parser.add_argument("--timeout", type=float, default=READ_TIMEOUT, help="Read timeout in seconds for API requests.")
+    parser.add_argument("--sections", type=parse_sections, default=None,
+                        help="Fetch only these top-level sections: a profile "
+                             f"({', '.join(SECTION_PROFILES)}) or a comma-separated list, e.g. 'General,Highlights'.")
+    parser.add_argument("--storage", type=parse_storage, default={"json"},
+                        help="Comma-separated storage backends: 'json' (per-symbol files), 'pack' (indexed pack "
+                             "store) and/or 'parquet' (batched Parquet tables). 'both' means 'json,parquet'.")
+    parser.add_argument("--durability", choices=DURABILITY_LEVELS, default="batch",
+                        help="When written records are synced to disk: 'none', once per 'batch' (default), or 'always' "
+                             "per record. Writes are atomic at every level.")
+    parser.add_argument("--codec", choices=CODECS, default="json",
+                        help="Record format for per-symbol files and the pack store: pretty-printed JSON, minified "
+                             "JSON, zstd-compressed JSON, or zstd-compressed JSON using the trained dictionary.")
+    parser.add_argument("--parquet_dir", default="./data/fundamental_parquet", help="Directory for Parquet tables.")
+    parser.add_argument("--parquet_batch_size", type=int, default=5000,
+                        help="Symbols buffered per Parquet write (one row group per table partition).")
+    parser.add_argument("--manifest", help="Path to the fetch manifest database (default: <output_dir>/_manifest.sqlite).")
+    parser.add_argument("--shard", type=parse_shard,
+                        help="Only fetch shard i of N (0-based, e.g. 0/4), assigned by a stable hash of the "
+                             "exchange-qualified symbol. Run one process per shard.")
+    parser.add_argument("--queue",
+                        help="Path of a shared work queue (SQLite). Workers using the same queue split the due "
+                             "symbols between them and take over the work of workers that die.")
+    parser.add_argument("--lease_seconds", type=int, default=LEASE_SECONDS,
+                        help="Seconds a claimed batch stays leased to a worker without a heartbeat.")
+    parser.add_argument("--refresh_policy",
+                        help="JSON file of refresh windows in days by asset type and exchange, e.g. "
+                             "'{\"types\": {\"ETF\": 14, \"FUND\": 30}, \"delisted\": 180}'. --days applies to "
+                             "everything it does not cover.")
+    parser.add_argument("--daily_budget", type=parse_daily_budget,
+                        help="API calls to spend per day, or 'auto' for the plan's daily limit. Each pass refreshes "
+                             "the most valuable and most overdue symbols that today's remaining budget pays for.")
+    parser.add_argument("--budget_reserve", type=int, default=0,
+                        help="API calls of the daily budget to leave for other jobs using the same key.")
+    parser.add_argument("--costs",
+                        help="JSON file of API calls charged per request by endpoint, e.g. '{\"fundamentals\": 10}'.")
+    parser.add_argument("--usage_db",
+                        help="Path to the API usage ledger (default: <output_dir>/_api_usage.sqlite). Share it "
+                             "between all processes using the same API key.")
+    parser.add_argument("--change_log",
+                        help="Exchange change log written by get_symbols_from_exchange.py (e.g. "
+                             "./data/exchanges/_changes.jsonl). Between passes, new listings in it are fetched at once "
+                             "and delisted symbols are retired.")
+    parser.add_argument("--dry_run", action="store_true",
+                        help="Print the plan for the next pass, with its cost, and exit without fetching.")
+
+FetchContext = namedtuple("FetchContext", ["api_client", "limiter", "writer", "manifest", "breaker", "policy", "queue",
+                                           "usage", "budget", "refresh_policy"])
+
+def open_fetch_context(args, api_key, parser):
+    """
+    Validates the options added by `add_fetch_arguments()` and opens the API client,
+    storage backends, manifest and worker coordination they describe. Exits on invalid
+    combinations, through `parser.error()` for option values that can never work.
+
+    Returns:
+        FetchContext: Everything `fetch_symbols()` needs besides the symbols.
+    """
+    require_codec(args.codec)
+    costs = load_costs(args.costs)
+    fundamentals_cost = costs.get("fundamentals", DEFAULT_COST)
+    if args.calls_per_minute < fundamentals_cost:
+        # The rate limiter could never hand out enough tokens for a single request
+        parser.error(f"--calls_per_minute ({args.calls_per_minute}) must be at least the cost of one "
+                     f"fundamentals request ({fundamentals_cost} calls).")
+    if (args.shard or args.queue) and "pack" in args.storage:
+        logging.error("The pack store supports a single writer; use --storage json with --shard or --queue, "
+                      "or give every worker its own --output_dir.")
+        exit(1)
+    if args.codec == "zstd-dict" and current_dictionary_id(args.output_dir) is None:
+        logging.error(f"No trained zstd dictionary in {args.output_dir}. "
+                      f"Run 'python fundamental_io.py --data_dir {args.output_dir} train' first.")
+        exit(1)
+
+    # Shards and queue workers may run on other hosts, where the manifest's WAL doesn't work
+    manifest = FetchManifest(args.manifest or manifest_path(args.output_dir), shared=bool(args.shard or args.queue))
+    if manifest.is_empty():
+        imported = manifest.backfill_from_directory(args.output_dir)
+        logging.info(f"Seeded fetch manifest from {imported} existing files.")
+
+    refresh_policy = RefreshPolicy.load(args.refresh_policy, args.days) if args.refresh_policy else None
+    usage = ApiUsage(args.usage_db or usage_path(args.output_dir), costs)
+    budget = None
+    if args.daily_budget is not None:
+        budget = DailyBudget(usage, None if args.daily_budget == "auto" else args.daily_budget, args.budget_reserve)
+
+    # One keep-alive connection per worker thread
+    session = create_session(pool_maxsize=args.concurrency)
+    api_client = EODHDClient(api_key, session=session, timeout=(CONNECT_TIMEOUT, args.timeout), usage=usage)
+    limiter = TokenBucket(args.calls_per_minute)
+    parquet_writer = None
+    if "parquet" in args.storage:
+        parquet_writer = ParquetFundamentalsWriter(args.parquet_dir, batch_size=args.parquet_batch_size)
+    pack_store = PackStore(args.output_dir, codec=args.codec) if "pack" in args.storage else None
+    summary_index = SummaryIndex(summary_path(args.output_dir)) if args.storage & {"json", "pack"} else None
+    writer = RecordWriter(args.output_dir, codec=args.codec, write_files="json" in args.storage,
+                          pack_store=pack_store, parquet_writer=parquet_writer, durability=args.durability,
+                          summary_index=summary_index)
+    breaker = CircuitBreaker(failure_threshold=args.errors_before_sleep, cooldown=min(60, args.sleep_time),
+                             max_cooldown=args.sleep_time)
+    policy = BackoffPolicy(max_retries=args.max_retries)
+    queue = WorkQueue(args.queue, lease_seconds=args.lease_seconds) if args.queue else None
+    return FetchContext(api_client, limiter, writer, manifest, breaker, policy, queue, usage, budget, refresh_policy)
+
+def filter_shard(entries, shard):
+    """
+    Keeps the entries (tuples starting with the symbol, such as WorkItems) that belong to
+    `shard` ((i, N), or None for all).
+    """
+    if not shard:
+        return entries
+    index, count = shard
+    return [entry for entry in entries if symbol_shard(entry[0], count) == index]
+
+def plan_fetch(context, args, items):
+    """
+    Plans one pass: the due items of this worker's shard, most valuable and most overdue
+    first (see fetch_scheduler.schedule), cut to what today's API budget pays for.
+
+    Returns:
+        tuple: The selected (score, WorkItem) entries in fetch order, and the due entries
+        left for a later pass.
+    """
+    plan = schedule(filter_shard(items, args.shard), context.manifest, args.days, args.sections,
+                    policy=context.refresh_policy)
+    remaining = None
+    if context.budget is not None:
+        context.budget.refresh(context.api_client)
+        remaining = context.budget.remaining()
+        if remaining is None:
+            logging.warning("The plan's daily limit is unknown; fetching without a budget.")
+    selected, skipped = plan_within_budget(plan, remaining, context.usage.cost("fundamentals"))
+    by_country = Counter(item.country for _, item in selected)
+    logging.info(f"Planned {len(selected)} of {len(plan)} due symbols"
+                 + ("" if remaining is None else f" with {remaining} API calls left today") + ": "
+                 + ", ".join(f"{country} {count}" for country, count in by_country.most_common()))
+    return selected, skipped
+
+def run_pass(context, args, selected, run_key=None):
+    """
+    Fetches a plan made by `plan_fetch()`.
+    """
+    return fetch_symbols(context.api_client, [(item.symbol, item.exchange) for _, item in selected], context.writer,
+                         args.days, context.limiter, context.manifest, concurrency=args.concurrency,
+                         breaker=context.breaker, policy=context.policy, sections=args.sections, run_key=run_key,
+                         queue=context.queue, budget=context.budget, call_cost=context.usage.cost("fundamentals"),
+                         windows={item.symbol: item.days for _, item in selected})
+
+def retire_symbols(context, symbols):
+    """
+    Flags delisted symbols in the manifest (so the delisted refresh window applies if they
+    come back) and removes them from the shared work queue.
+    """
+    for symbol in symbols:
+        context.manifest.record_profile(symbol, is_delisted=True)
+    context.manifest.commit()
+    if context.queue is not None:
+        context.queue.retire(symbols)
+    logging.info(f"Retired {len(symbols)} delisted symbols.")
+
+def follow_changes(context, args, load_items, offset):
+    """
+    Waits until the next 5 AM while following the exchange change log from byte `offset`:
+    symbols listed (or renamed to) on the loaded exchange lists are fetched as soon as
+    they appear, and symbols delisted (or renamed away) are retired.
+
+    Returns:
+        int: The change log offset read up to.
+    """
+    wake_at = next_5am()
+    logging.info(f"Processing complete. Following {args.change_log} until {wake_at.strftime('%Y-%m-%d %H:%M:%S')}.")
+    while True:
+        remaining = (wake_at - datetime.now()).total_seconds()
+        if remaining <= 0:
+            return offset
+        time.sleep(min(CHANGE_POLL_INTERVAL, remaining))
+        entries, offset = read_changes(args.change_log, offset)
+        listed, delisted = set(), set()
+        for entry in entries:
+            listed.update(symbol_key(code, entry["exchange"]) for code in entry["listed"])
+            listed.update(symbol_key(rename["to"], entry["exchange"]) for rename in entry["renamed"])
+            delisted.update(symbol_key(code, entry["exchange"]) for code in entry["delisted"])
+            delisted.update(symbol_key(rename["from"], entry["exchange"]) for rename in entry["renamed"])
+        if delisted:
+            retire_symbols(context, sorted(delisted))
+        if listed:
+            items = [item for item in load_items() if item.symbol in listed]
+            if items:
+                logging.info(f"Fetching {len(items)} new listings.")
+                run_pass(context, args, plan_fetch(context, args, items)[0])
+
+def run_fetch_loop(context, args, load_items, run_key):
+    """
+    Runs fetch passes forever. Each pass plans the WorkItems returned by `load_items()`
+    (see `plan_fetch()`), fetches the plan, then waits until the next 5 AM, following the
+    exchange change log meanwhile if --change_log is given. With --dry_run, prints the
+    first plan instead and returns.
+    """
+    offset = log_end(args.change_log) if args.change_log else 0
+    while True:  # Loop to ensure continuous execution
+        try:
+            selected, skipped = plan_fetch(context, args, load_items())
+            if args.dry_run:
+                print_plan(selected, skipped, context.usage.cost("fundamentals"),
+                           context.budget and context.budget.remaining())
+                return
+            run_pass(context, args, selected, run_key)
+
+            # Once all symbols are processed, wait until the next 5 AM
+            if args.change_log:
+                offset = follow_changes(context, args, load_items, offset)
+            else:
+                sleep_until_next_5am()
+
+        except Exception as e:
+            # The run state is in the manifest, so the next pass resumes where this one stopped
+            logging.error(f"Unexpected error occurred: {e}. Resuming in {RESUME_DELAY} seconds.")
+            if context.queue is not None:
+                context.queue.release()
+            time.sleep(RESUME_DELAY)
+
+def main():
     setup_logging()
 
     api_key = os.getenv("EODHD_API_KEY")
@@ -114,65 +710,31 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Fetch and save fundamental data for stock tickers.")
     parser.add_argument("--country", type=str, required=True, help="Country code (e.g., 'US').")
     parser.add_argument("--exchange", type=str, help="Exchange code to fetch symbols from (optional).")
-    parser.add_argument("--output_dir", default="./data/fundamental_data", help="Directory to save JSON files.")
-    parser.add_argument("--days", type=int, default=10, help="Number of days to check for file modification.")
-    parser.add_argument("--errors_before_sleep", type=int, default=50, help="Number of errors to process before sleeping.")
-    parser.add_argument("--sleep_time", type=int, default=3600, help="Time to sleep in seconds after processing a batch of errors.")
+    add_fetch_arguments(parser)
     args = parser.parse_args()
+    context = open_fetch_context(args, api_key, parser)
+
+    country_file = find_record("./data/exchanges", args.country.upper()) or Path(f"./data/exchanges/{args.country.upper()}.json")
 
-    country_file = Path(f"./data/exchanges/{args.country.upper()}.json")
+    def load_items():
+        # Reloaded every pass, so refreshed symbol lists are picked up
+        symbols = load_symbols_from_country_file(country_file, args.exchange, with_types=True)
+        if args.exchange:
+            symbols = {args.exchange: symbols}
+        return country_work_items(symbols, args.country.upper())
 
-    symbols = load_symbols_from_country_file(country_file, args.exchange)
-    if not symbols:
+    items = load_items()
+    if not items:
         logging.error(f"No symbols found for country '{args.country}' or exchange '{args.exchange}'.")
         sleep_until_next_5am()
         exit(1)
 
-    if not args.exchange:
-        prioritized_exchanges = ["NYSE ARCA", "NASDAQ", "NYSE", "AMEX", "ARCA"]
-        prioritized_symbols = []
-        for exch in prioritized_exchanges:
-            if exch in symbols:
-                prioritized_symbols.extend(symbols.pop(exch))
-        for remaining_symbols in symbols.values():
-            prioritized_symbols.extend(remaining_symbols)
-        symbols = prioritized_symbols
+    if args.shard:
+        logging.info(f"Shard {args.shard[0]}/{args.shard[1]}: {len(filter_shard(items, args.shard))} symbols.")
 
-    api_client = APIClient(api_key)
+    run_key = "|".join([args.country.upper(), args.exchange or "*", ",".join(args.sections or [FULL_PROFILE]),
+                        str(args.days), "%d/%d" % args.shard if args.shard else "*"])
+    run_fetch_loop(context, args, load_items, run_key)
 
-    error_count = 0  # Tracks errors
-
-    while True:  # Loop to ensure continuous execution
-        try:
-            for symbol in tqdm(symbols, desc="Fetching data"):
-                output_filepath = os.path.join(args.output_dir, f"{symbol.lower()}.json")
-
-                if file_modified_within_days(output_filepath, args.days):
-                    # Skip recent files and log as DEBUG
-                    logging.debug(f"Data for {symbol} is recent; skipping re-download.")
-                    continue
-
-                logging.debug(f"Fetching data for {symbol}...")
-                data = fetch_fundamental_data(api_client, symbol)
-
-                if data:
-                    save_json(data, output_filepath)
-                    # Log successful saves as DEBUG
-                    logging.debug(f"Data for {symbol} saved successfully.")
-                else:
-                    # Increment error count only on actual errors
-                    error_count += 1
-                    logging.warning(f"Failed to fetch data for {symbol}. Error count: {error_count}")
-
-                # Sleep after reaching the error threshold
-                if error_count >= args.errors_before_sleep:
-                    logging.warning(f"Reached {error_count} errors. Sleeping for {args.sleep_time} seconds.")
-                    sleep_for(args.sleep_time)
-                    error_count = 0  # Reset error count after sleep
-
-            # Once all symbols are processed, sleep until the next 5 AM
-            sleep_until_next_5am()
-
-        except Exception as e:
-            logging.error(f"Unexpected error occurred: {e}")
-            sleep_until_next_5am()
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,13 @@
 import os
-import requests
-import json
+import time
 import logging
+import argparse
 from pathlib import Path
-from datetime import datetime
-import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from eodhd_http import EODHDClient, create_session
+from fundamental_io import write_record, read_record, record_path, find_record, remove_other_formats, require_codec
+from symbol_changes import diff_listings, is_empty, append_change, change_log_path
+from symbol_master import SymbolMaster
 
 # Configure logging
 logging.basicConfig(
@@ -18,67 +21,126 @@ logging.basicConfig(
 
 # Constants
 API_KEY = os.getenv("EODHD_API_KEY")
-BASE_URL = "https://eodhd.com/api"
 DATA_DIR = Path("./data/exchanges")
 DATA_DIR.mkdir(parents=True, exist_ok=True)
+# Storage codec for the symbol lists: json, compact or zstd (see fundamental_io.CODECS).
+# zstd-dict is left out: dictionaries are trained on fundamentals records, not on the lists.
+LIST_CODECS = ("json", "compact", "zstd")
+CODEC = os.getenv("EODHD_STORAGE_CODEC", "json")
+
+# Hours after which a downloaded symbol list is refreshed
+MAX_AGE_HOURS = 24
 
-def get_exchanges(api_key):
+# Number of exchange lists downloaded at once
+WORKERS = 4
+
+def get_exchanges(api_client):
     """Fetches the list of exchanges from the EODHD API."""
-    url = f"{BASE_URL}/exchanges-list/?api_token={api_key}&fmt=json"
-    response = requests.get(url)
-    response.raise_for_status()
-    return response.json()
+    return api_client.get_exchanges()
 
-def get_symbols_for_exchange(api_key, exchange_code):
+def get_symbols_for_exchange(api_client, exchange_code):
     """Fetches the list of symbols for a given exchange."""
-    url = f"{BASE_URL}/exchange-symbol-list/{exchange_code}?api_token={api_key}&fmt=json"
-    response = requests.get(url)
-    response.raise_for_status()
-    return response.json()
-
-def save_to_json(data, filename):
-    """Saves the data to a JSON file."""
-    file_path = DATA_DIR / filename
-    with open(file_path, 'w') as json_file:
-        json.dump(data, json_file, indent=4)
+    return api_client.get_exchange_symbols(exchange_code)
+
+def save_to_json(data, exchange_code, codec=CODEC, data_dir=DATA_DIR):
+    """Saves the data to a JSON file using the configured storage codec."""
+    file_path = Path(record_path(data_dir, exchange_code, codec))
+    write_record(data, file_path, codec)
+    remove_other_formats(data_dir, exchange_code, codec)
     return file_path
 
-def was_modified_today(file_path):
-    """Checks if the file was modified today."""
-    if not file_path.exists():
+def is_fresh(file_path, max_age_hours=MAX_AGE_HOURS):
+    """Checks if the file was written less than `max_age_hours` hours ago."""
+    if file_path is None or not file_path.exists():
         return False
-    file_mod_time = datetime.fromtimestamp(file_path.stat().st_mtime)
-    return file_mod_time.date() == datetime.today().date()
+    return time.time() - file_path.stat().st_mtime < max_age_hours * 3600
 
-def main():
-    try:
-        # Fetch list of exchanges
-        exchanges = get_exchanges(API_KEY)
-        logging.info(f"Retrieved {len(exchanges)} exchanges.")
+def refresh_exchange(api_client, exchange_code, data_dir=DATA_DIR):
+    """
+    Downloads one exchange's symbol list and diffs it against the stored list. The stored
+    list is left untouched; see `store_exchange`.
 
-        for exchange in exchanges:
-            exchange_code = exchange['Code']
-            file_path = DATA_DIR / f"{exchange_code}.json"
+    Returns:
+        tuple: The downloaded symbols and the diff (see symbol_changes.diff_listings),
+        which is None when there was no previous list to compare with.
+    """
+    symbols = get_symbols_for_exchange(api_client, exchange_code)
+    existing = find_record(data_dir, exchange_code)
+    previous = read_record(existing) if existing else None
 
-            if was_modified_today(file_path):
-                logging.info(f"File for exchange {exchange_code} was modified today; skipping download.")
-                continue
+    # Log head and tail of the data
+    logging.debug(f"Head of {exchange_code} data:\n{symbols[:5]}")
+    logging.debug(f"Tail of {exchange_code} data:\n{symbols[-5:]}")
+    return symbols, None if previous is None else diff_listings(previous, symbols)
 
-            logging.info(f"Processing exchange: {exchange_code}")
+def store_exchange(exchange_code, symbols, diff, log_path, data_dir=DATA_DIR, codec=CODEC):
+    """
+    Appends the diff of a refreshed list to the change log, then atomically replaces the
+    stored list. In this order a crash or a failed append leaves the old list in place, so
+    the next refresh computes the diff again rather than losing it; at worst a diff is
+    logged twice, which its readers tolerate.
 
-            # Fetch symbols for the exchange
-            symbols = get_symbols_for_exchange(API_KEY, exchange_code)
-            logging.info(f"Retrieved {len(symbols)} symbols for exchange {exchange_code}.")
+    Returns:
+        Path: The path the list was saved to.
+    """
+    if diff is not None and not is_empty(diff):
+        append_change(log_path, exchange_code, diff)
+        logging.info(f"{exchange_code}: {len(diff['listed'])} listed, {len(diff['delisted'])} delisted, "
+                     f"{len(diff['renamed'])} renamed, {len(diff['changed'])} changed.")
+    return save_to_json(symbols, exchange_code, codec, data_dir)
 
-            # Save symbols to JSON file
-            save_to_json(symbols, f"{exchange_code}.json")
-
-            # Log head and tail of the data
-            logging.debug(f"Head of {exchange_code} data:\n{symbols[:5]}")
-            logging.debug(f"Tail of {exchange_code} data:\n{symbols[-5:]}")
+def main():
+    parser = argparse.ArgumentParser(description="Download the symbol list of every exchange and log what changed.")
+    parser.add_argument("--data_dir", default=str(DATA_DIR), help="Directory to save the exchange symbol lists.")
+    parser.add_argument("--exchanges", help="Comma-separated exchange codes to refresh (default: all).")
+    parser.add_argument("--max_age", type=float, default=MAX_AGE_HOURS,
+                        help="Hours after which a downloaded list is refreshed; 0 refreshes every list.")
+    parser.add_argument("--workers", type=int, default=WORKERS, help="Number of exchange lists downloaded at once.")
+    parser.add_argument("--codec", default=CODEC, choices=LIST_CODECS,
+                        help="Storage codec for the symbol lists (json, compact or zstd).")
+    args = parser.parse_args()
+    if args.codec not in LIST_CODECS:
+        # Only reachable through EODHD_STORAGE_CODEC, which argparse doesn't check
+        parser.error(f"Unsupported codec for the symbol lists: {args.codec}. Choose one of: {', '.join(LIST_CODECS)}.")
 
+    require_codec(args.codec)
+    data_dir = Path(args.data_dir)
+    data_dir.mkdir(parents=True, exist_ok=True)
+    log_path = change_log_path(data_dir)
+    master = SymbolMaster(data_dir)
+    api_client = EODHDClient(API_KEY, session=create_session(pool_maxsize=args.workers))
+    try:
+        # Fetch list of exchanges
+        exchanges = [exchange['Code'] for exchange in get_exchanges(api_client)]
+        logging.info(f"Retrieved {len(exchanges)} exchanges.")
     except Exception as e:
         logging.error(f"An error occurred: {e}")
+        return
+    if args.exchanges:
+        wanted = {code.strip().upper() for code in args.exchanges.split(",")}
+        exchanges = [code for code in exchanges if code.upper() in wanted]
+
+    due = []
+    for exchange_code in exchanges:
+        existing = find_record(data_dir, exchange_code)
+        if args.max_age > 0 and is_fresh(Path(existing) if existing else None, args.max_age):
+            logging.info(f"File for exchange {exchange_code} is less than {args.max_age:g} hours old; skipping download.")
+        else:
+            due.append(exchange_code)
+
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        futures = {executor.submit(refresh_exchange, api_client, code, data_dir): code for code in due}
+        for future in as_completed(futures):
+            exchange_code = futures[future]
+            try:
+                symbols, diff = future.result()
+                logging.info(f"Retrieved {len(symbols)} symbols for exchange {exchange_code}.")
+                # The lists, the change log and the symbol master are only written from this thread
+                file_path = store_exchange(exchange_code, symbols, diff, log_path, data_dir, args.codec)
+                master.update_list(exchange_code, symbols, file_path)
+            except Exception as e:
+                logging.error(f"An error occurred for exchange {exchange_code}: {e}")
+    master.close()
 
 if __name__ == "__main__":
     main()
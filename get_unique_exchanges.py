@@ -1,34 +1,38 @@
 import json
+import time
 import argparse
+from collections import defaultdict
+from datetime import datetime
 from pathlib import Path
+from fundamental_io import find_record, record_name
+from symbol_master import SymbolMaster, UNKNOWN
+from symbol_changes import read_changes, change_log_path
 
 def list_unique_exchanges_by_country(data_dir, country_code):
     """
-    Reads a JSON file for the specified country and prints a list of all unique exchanges.
+    Prints a list of all unique exchanges in the symbol list of the specified country,
+    using the symbol master index (reindexed first if the list changed).
 
     Args:
         data_dir (str): Path to the directory containing JSON files for different countries.
         country_code (str): The country code (e.g., 'US', 'us') to specify the JSON file to read.
     """
-    # Construct possible file paths
-    upper_case_file = Path(data_dir) / f"{country_code.upper()}.json"
-    lower_case_file = Path(data_dir) / f"{country_code.lower()}.json"
-
-    # Determine which file exists
-    if upper_case_file.exists():
-        json_file_path = upper_case_file
-    elif lower_case_file.exists():
-        json_file_path = lower_case_file
-    else:
+    # Determine which file exists, in any storage format
+    json_file_path = find_record(data_dir, country_code.upper()) or find_record(data_dir, country_code.lower())
+    if json_file_path is None:
+        upper_case_file = Path(data_dir) / f"{country_code.upper()}.json"
+        lower_case_file = Path(data_dir) / f"{country_code.lower()}.json"
         print(f"File for country code '{country_code}' not found. Tried: {upper_case_file}, {lower_case_file}")
         return
 
     try:
-        with open(json_file_path, 'r') as file:
-            data = json.load(file)
-
-        # Extract the 'Exchange' field and get unique values
-        exchanges = {entry.get("Exchange") for entry in data if "Exchange" in entry}
+        master = SymbolMaster(data_dir)
+        try:
+            country = record_name(json_file_path)
+            master.sync([country])
+            exchanges = master.exchanges(country)
+        finally:
+            master.close()
 
         print(f"Unique Exchanges in {country_code.upper()}:")
         for exchange in sorted(exchanges):  # Sort for easier readability
@@ -39,10 +43,73 @@ def list_unique_exchanges_by_country(data_dir, country_code):
     except Exception as e:
         print(f"An error occurred: {e}")
 
+def print_symbol_counts(data_dir, country_code=None, by_type=False):
+    """
+    Prints the number of symbols per exchange (and per asset type with `by_type`) of one
+    country or of all countries, with each list's last refresh time. The counts come from
+    the summary the symbol master keeps as the lists are written.
+
+    Args:
+        data_dir (str): Path to the directory containing JSON files for different countries.
+        country_code (str): The country code, or None for all countries.
+        by_type (bool): Break the counts down by asset type.
+    """
+    master = SymbolMaster(data_dir)
+    try:
+        master.sync([country_code.upper()] if country_code else None)
+        rows = master.summary(country_code.upper() if country_code else None)
+        refreshed = master.refresh_times()
+    finally:
+        master.close()
+    if not rows:
+        print(f"No symbol lists found in {data_dir}.")
+        return
+
+    counts = defaultdict(lambda: defaultdict(dict))
+    for country, exchange, asset_type, count in rows:
+        counts[country][exchange or UNKNOWN][asset_type or "unknown"] = count
+    for country, exchanges in counts.items():
+        total = sum(sum(types.values()) for types in exchanges.values())
+        print(f"{country}: {total} symbols, refreshed {datetime.fromtimestamp(refreshed[country]):%Y-%m-%d %H:%M}")
+        for exchange, types in exchanges.items():
+            print(f"  {exchange or 'unknown'}: {sum(types.values())}")
+            if by_type:
+                for asset_type, count in sorted(types.items(), key=lambda item: -item[1]):
+                    print(f"    {asset_type}: {count}")
+
+def print_recent_changes(data_dir, country_code=None, days=7):
+    """
+    Prints, per country, how many symbols were listed, delisted, renamed or changed in the
+    last `days` days, from the change log written by get_symbols_from_exchange.py.
+    """
+    entries, _ = read_changes(change_log_path(data_dir), since=time.time() - days * 86400)
+    totals = defaultdict(lambda: defaultdict(int))
+    for entry in entries:
+        if country_code and entry["exchange"] != country_code.upper():
+            continue
+        for kind in ("listed", "delisted", "renamed", "changed"):
+            totals[entry["exchange"]][kind] += len(entry[kind])
+    if not totals:
+        print(f"No changes in the last {days:g} days.")
+    for country, kinds in sorted(totals.items()):
+        print(f"{country}: {kinds['listed']} listed, {kinds['delisted']} delisted, {kinds['renamed']} renamed, "
+              f"{kinds['changed']} changed")
+
 if __name__ == "__main__":
-    parser = argparse.ArgumentParser(description="List unique exchanges for a specific country.")
-    parser.add_argument("--country", type=str, required=True, help="Country code to specify the JSON file (e.g., 'US', 'us').")
+    parser = argparse.ArgumentParser(description="List unique exchanges, symbol counts and recent changes of the "
+                                                 "exchange symbol lists.")
+    parser.add_argument("--country", type=str,
+                        help="Country code to specify the JSON file (e.g., 'US', 'us'). Default: all countries.")
     parser.add_argument("--data_dir", type=str, default="./data/exchanges", help="Path to the directory containing JSON files.")
+    parser.add_argument("--counts", action="store_true", help="Show symbol counts per exchange and last refresh times.")
+    parser.add_argument("--by_type", action="store_true", help="Show symbol counts per exchange and asset type.")
+    parser.add_argument("--changes", action="store_true", help="Show what changed in the last --days days.")
+    parser.add_argument("--days", type=float, default=7, help="Look-back window in days for --changes.")
     args = parser.parse_args()
 
-    list_unique_exchanges_by_country(args.data_dir, args.country)
+    if args.changes:
+        print_recent_changes(args.data_dir, args.country, args.days)
+    elif args.counts or args.by_type or not args.country:
+        print_symbol_counts(args.data_dir, args.country, args.by_type)
+    else:
+        list_unique_exchanges_by_country(args.data_dir, args.country)
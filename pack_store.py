@@ -0,0 +1,389 @@
+import os
+import zlib
+import struct
+import sqlite3
+import logging
+import argparse
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows: the single-writer rule is not enforced
+    fcntl = None
+
+from fundamental_io import (CODECS, encode_record, decode_record, write_record, fundamentals_path, remove_stale_copies,
+                            list_record_files, read_record, symbol_from_path, require_codec, fsync_dir)
+
+PACK_DIRNAME = "_pack"
+# Held (flock) by the writer for as long as the store is open for writing
+LOCK_FILENAME = "LOCK"
+SEGMENT_SIZE = 256 * 1024 * 1024
+
+# Every record in a segment is: header, UTF-8 symbol, encoded payload
+RECORD_MAGIC = b"EPK1"
+HEADER = struct.Struct("<4sHII")  # magic, symbol length, payload length, CRC32 of the payload
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS records (
+    symbol TEXT PRIMARY KEY,
+    segment INTEGER NOT NULL,
+    offset INTEGER NOT NULL,
+    length INTEGER NOT NULL,
+    crc INTEGER NOT NULL,
+    stored_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_records_segment ON records(segment, offset);
+"""
+
+def pack_dir(data_dir):
+    return os.path.join(data_dir, PACK_DIRNAME)
+
+def has_pack(data_dir):
+    return os.path.exists(os.path.join(pack_dir(data_dir), "index.sqlite"))
+
+class PackStore:
+    """
+    Append-only pack store for fundamentals records.
+
+    Records are appended to a small number of large segment files and located through a
+    SQLite offset index keyed by symbol. Replacing a record appends a new copy and repoints
+    the index; `compact()` rewrites segments to reclaim the space held by replaced records.
+    The index is the source of truth: bytes appended after the last index commit (e.g. by
+    a crashed writer) are truncated when the store is next opened for writing.
+
+    The store supports a single writer, enforced with an exclusive lock on `_pack/LOCK`:
+    opening a second writer raises instead of truncating the tail the first one is still
+    writing. Open it with `readonly=True` to read while a writer may be active.
+    """
+
+    def __init__(self, data_dir, codec="zstd", segment_size=SEGMENT_SIZE, readonly=False):
+        require_codec(codec)
+        self.data_dir = data_dir
+        self.root = pack_dir(data_dir)
+        self.codec = codec
+        self.segment_size = segment_size
+        self.readonly = readonly
+        self.writer = None
+        self.writer_segment = None
+        self._readers = {}
+        self._lock = None
+        if readonly:
+            self.conn = sqlite3.connect(f"file:{os.path.join(self.root, 'index.sqlite')}?mode=ro", uri=True)
+            return
+        os.makedirs(self.root, exist_ok=True)
+        self._acquire_lock()
+        self.conn = sqlite3.connect(os.path.join(self.root, "index.sqlite"))
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+        self._recover()
+
+    def _acquire_lock(self):
+        if fcntl is None:
+            return
+        self._lock = open(os.path.join(self.root, LOCK_FILENAME), "a")
+        try:
+            fcntl.flock(self._lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            self._lock.close()
+            self._lock = None
+            raise RuntimeError(f"The pack store in {self.root} is already open for writing by another process. "
+                               f"It supports a single writer; wait for it to finish, or use --storage json.")
+
+    def segment_path(self, segment):
+        return os.path.join(self.root, f"seg-{segment:06d}.pack")
+
+    def segments(self):
+        """
+        Returns the segment numbers present on disk, in order.
+        """
+        return sorted(int(name[4:10]) for name in os.listdir(self.root)
+                      if name.startswith("seg-") and name.endswith(".pack"))
+
+    def _recover(self):
+        # Drop bytes appended after the last committed index entry of the newest segment
+        segments = self.segments()
+        if not segments:
+            return
+        last = segments[-1]
+        row = self.conn.execute(
+            "SELECT MAX(offset + ? + length(CAST(symbol AS BLOB)) + length) FROM records WHERE segment = ?",
+            (HEADER.size, last),
+        ).fetchone()
+        end = row[0] or 0
+        path = self.segment_path(last)
+        if os.path.getsize(path) > end:
+            logging.warning(f"Truncating uncommitted tail of {path} at byte {end}.")
+            with open(path, "r+b") as file:
+                file.truncate(end)
+
+    def _open_writer(self, size):
+        if self.writer is not None and self.writer.tell() + size <= self.segment_size:
+            return
+        if self.writer is not None:
+            self.writer.close()
+        segments = self.segments()
+        segment = segments[-1] if segments else 1
+        if segments and os.path.getsize(self.segment_path(segment)) + size > self.segment_size:
+            segment += 1
+        self.writer = open(self.segment_path(segment), "ab")
+        self.writer_segment = segment
+
+    def put(self, symbol, data):
+        """
+        Appends a record and points the index at it. Call `flush()` to make it durable.
+
+        Returns:
+            bytes: The stored payload.
+        """
+        return self.put_payload(symbol, encode_record(data, self.codec, self.data_dir))
+
+    def put_payload(self, symbol, payload, stored_at=None):
+        """
+        Appends an encoded record. `stored_at` defaults to now; moving a record keeps its
+        original time, which identifies the copy to readers such as the summary index.
+        """
+        key = symbol.encode("utf-8")
+        crc = zlib.crc32(payload)
+        record = HEADER.pack(RECORD_MAGIC, len(key), len(payload), crc) + key + payload
+        self._open_writer(len(record))
+        offset = self.writer.tell()
+        self.writer.write(record)
+        self.conn.execute(
+            "INSERT OR REPLACE INTO records (symbol, segment, offset, length, crc, stored_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (symbol, self.writer_segment, offset, len(payload), crc, stored_at or time.time()),
+        )
+        return payload
+
+    def flush(self, sync=False):
+        """
+        Flushes appended records and commits the index. With `sync` the segment data is
+        synced to disk before the index commit that references it.
+        """
+        if self.writer is not None:
+            self.writer.flush()
+            if sync:
+                os.fsync(self.writer.fileno())
+        self.conn.commit()
+
+    def close(self):
+        if not self.readonly:
+            self.flush()
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+        for reader in self._readers.values():
+            reader.close()
+        self._readers.clear()
+        self.conn.close()
+        if self._lock is not None:
+            # Closing the file releases the lock
+            self._lock.close()
+            self._lock = None
+
+    def __contains__(self, symbol):
+        return self.conn.execute("SELECT 1 FROM records WHERE symbol = ?", (symbol,)).fetchone() is not None
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM records").fetchone()[0]
+
+    def stored_at(self, symbol):
+        """
+        Returns when the current copy of `symbol` was stored, or None if it is not in the store.
+        """
+        row = self.conn.execute("SELECT stored_at FROM records WHERE symbol = ?", (symbol,)).fetchone()
+        return None if row is None else row[0]
+
+    def entries(self):
+        """
+        Returns (symbol, stored_at, payload_length) for every record.
+        """
+        return self.conn.execute("SELECT symbol, stored_at, length FROM records ORDER BY symbol").fetchall()
+
+    def _reader(self, segment):
+        if segment not in self._readers:
+            self._readers[segment] = open(self.segment_path(segment), "rb")
+        return self._readers[segment]
+
+    def get_payload(self, symbol):
+        """
+        Returns the stored payload for `symbol`, or None if it is not in the store.
+        """
+        row = self.conn.execute(
+            "SELECT segment, offset, length, crc FROM records WHERE symbol = ?", (symbol,)
+        ).fetchone()
+        if row is None:
+            return None
+        segment, offset, length, crc = row
+        if self.writer is not None and segment == self.writer_segment:
+            self.writer.flush()
+        reader = self._reader(segment)
+        reader.seek(offset + HEADER.size + len(symbol.encode("utf-8")))
+        payload = reader.read(length)
+        if zlib.crc32(payload) != crc:
+            raise ValueError(f"Checksum mismatch for {symbol} in segment {segment}.")
+        return payload
+
+    def get(self, symbol):
+        """
+        Returns the decoded record for `symbol`, or None if it is not in the store.
+        """
+        payload = self.get_payload(symbol)
+        return None if payload is None else decode_record(payload, self.data_dir)
+
+    def delete(self, symbol):
+        self.conn.execute("DELETE FROM records WHERE symbol = ?", (symbol,))
+
+    def qualify_symbols(self, exchange):
+        """
+        Re-keys every record stored under a bare code, as written before symbols were
+        exchange-qualified, by appending it again as CODE.EXCHANGE. Records whose qualified
+        key already exists are dropped. Run `compact()` afterwards to reclaim the old copies.
+
+        Returns:
+            int: The number of records re-keyed.
+        """
+        count = 0
+        for symbol in [row[0] for row in self.conn.execute("SELECT symbol FROM records WHERE instr(symbol, '.') = 0")]:
+            key = f"{symbol}.{exchange}".upper()
+            if key not in self:
+                self.put_payload(key, self.get_payload(symbol))
+                count += 1
+            self.delete(symbol)
+        self.flush()
+        return count
+
+    def scan_payloads(self):
+        """
+        Yields (symbol, payload) for every live record, reading each segment sequentially.
+        """
+        if self.writer is not None:
+            self.writer.flush()
+        for segment in self.segments():
+            live = dict(self.conn.execute("SELECT offset, symbol FROM records WHERE segment = ?", (segment,)))
+            if not live:
+                continue
+            with open(self.segment_path(segment), "rb", buffering=8 * 1024 * 1024) as file:
+                offset = 0
+                while True:
+                    header = file.read(HEADER.size)
+                    if len(header) < HEADER.size:
+                        break
+                    magic, key_length, length, crc = HEADER.unpack(header)
+                    if magic != RECORD_MAGIC:
+                        raise ValueError(f"Corrupt record header in segment {segment} at byte {offset}.")
+                    key = file.read(key_length)
+                    payload = file.read(length)
+                    if live.get(offset) == key.decode("utf-8"):
+                        if zlib.crc32(payload) != crc:
+                            raise ValueError(f"Checksum mismatch in segment {segment} at byte {offset}.")
+                        yield key.decode("utf-8"), payload
+                    offset += HEADER.size + key_length + length
+
+    def scan(self):
+        """
+        Yields (symbol, record) for every live record in storage order.
+        """
+        for symbol, payload in self.scan_payloads():
+            yield symbol, decode_record(payload, self.data_dir)
+
+    def segment_usage(self):
+        """
+        Returns {segment: (live_bytes, total_bytes)}.
+        """
+        live = dict(self.conn.execute(
+            "SELECT segment, SUM(? + length(CAST(symbol AS BLOB)) + length) FROM records GROUP BY segment",
+            (HEADER.size,),
+        ))
+        return {segment: (live.get(segment, 0), os.path.getsize(self.segment_path(segment)))
+                for segment in self.segments()}
+
+    def compact(self, min_garbage_ratio=0.3):
+        """
+        Rewrites every sealed segment whose share of replaced or deleted records is at least
+        `min_garbage_ratio`, moving its live records to the end of the store.
+
+        Returns:
+            int: The number of bytes reclaimed.
+        """
+        self.flush()
+        reclaimed = 0
+        active = self.segments()[-1] if self.segments() else None
+        for segment, (live_bytes, total_bytes) in self.segment_usage().items():
+            if segment == active or total_bytes == 0 or 1 - live_bytes / total_bytes < min_garbage_ratio:
+                continue
+            symbols = self.conn.execute(
+                "SELECT symbol, stored_at FROM records WHERE segment = ? ORDER BY offset", (segment,)).fetchall()
+            for symbol, stored_at in symbols:
+                self.put_payload(symbol, self.get_payload(symbol), stored_at)
+            # The moved copies, and the directory entry of a new segment, must be on disk
+            # before the old segment, until now their only durable copy, is deleted
+            self.flush(sync=True)
+            fsync_dir(self.root)
+            reader = self._readers.pop(segment, None)
+            if reader is not None:
+                reader.close()
+            os.remove(self.segment_path(segment))
+            reclaimed += total_bytes - live_bytes
+            logging.info(f"Compacted segment {segment}: moved {len(symbols)} records, reclaimed {total_bytes - live_bytes:,} bytes.")
+        return reclaimed
+
+    def import_directory(self, source_dir):
+        """
+        Copies loose record files from `source_dir` into the store.
+
+        Returns:
+            int: The number of records imported.
+        """
+        count = 0
+        for path in list_record_files(source_dir):
+            self.put(symbol_from_path(path), read_record(path, source_dir))
+            count += 1
+        self.flush()
+        return count
+
+    def export(self, output_dir, codec="json"):
+        """
+        Writes every live record back out as a loose file in the sharded layout.
+
+        Returns:
+            int: The number of records exported.
+        """
+        count = 0
+        for symbol, data in self.scan():
+            path = fundamentals_path(output_dir, symbol, codec)
+            write_record(data, path, codec, output_dir)
+            remove_stale_copies(output_dir, symbol, path)
+            count += 1
+        return count
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    parser = argparse.ArgumentParser(description="Manage the fundamentals pack store.")
+    parser.add_argument("--data_dir", default="./data/fundamental_data", help="Directory holding the pack store.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("stats", help="Show record count and segment usage.")
+    import_parser = subparsers.add_parser("import", help="Import loose record files into the pack store.")
+    import_parser.add_argument("--source_dir", help="Directory of loose files (default: --data_dir).")
+    compact_parser = subparsers.add_parser("compact", help="Reclaim space held by replaced records.")
+    compact_parser.add_argument("--min_garbage_ratio", type=float, default=0.3,
+                                help="Only rewrite segments with at least this share of dead records.")
+    export_parser = subparsers.add_parser("export", help="Export every record to loose files.")
+    export_parser.add_argument("--output_dir", required=True, help="Directory to write loose files to.")
+    export_parser.add_argument("--codec", choices=CODECS, default="json", help="Format of the exported files.")
+    args = parser.parse_args()
+
+    store = PackStore(args.data_dir, readonly=args.command in ("stats", "export"))
+    if args.command == "stats":
+        print(f"Records: {len(store)}")
+        for segment, (live_bytes, total_bytes) in store.segment_usage().items():
+            print(f"Segment {segment}: {live_bytes:,} live of {total_bytes:,} bytes")
+    elif args.command == "import":
+        print(f"Imported {store.import_directory(args.source_dir or args.data_dir)} records.")
+    elif args.command == "compact":
+        print(f"Reclaimed {store.compact(args.min_garbage_ratio):,} bytes.")
+    elif args.command == "export":
+        print(f"Exported {store.export(args.output_dir, args.codec)} records to {args.output_dir}.")
+    store.close()
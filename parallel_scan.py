@@ -0,0 +1,83 @@
+import os
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from fundamental_io import read_record
+
+# Records per task. Large enough to amortize shipping tasks and results between
+# processes, small enough to keep every worker busy until the end of the scan.
+DEFAULT_CHUNK_SIZE = 64
+
+DEFAULT_WORKERS = os.cpu_count() or 1
+
+def chunked(items, size):
+    return [items[start:start + size] for start in range(0, len(items), size)]
+
+def extract_chunk(data_dir, extract, chunk):
+    """
+    Decodes the records of one chunk and applies `extract` to each, in a worker process.
+
+    Args:
+        data_dir (str): Data directory of the records (locates the pack store and zstd dictionaries).
+        extract (callable): Called as extract(symbol, record); results that are None are dropped.
+        chunk (list): (symbol, path) pairs, with path None for records in the pack store.
+
+    Returns:
+        list: (symbol, result) pairs in chunk order.
+    """
+    from pack_store import PackStore
+
+    pack = None
+    results = []
+    try:
+        for symbol, path in chunk:
+            try:
+                if path is None:
+                    pack = pack or PackStore(data_dir, readonly=True)
+                    record = pack.get(symbol)
+                else:
+                    record = read_record(path, data_dir)
+                if record is None:
+                    continue
+                result = extract(symbol, record)
+            except Exception as e:
+                logging.error(f"Error processing record {symbol}: {e}")
+                continue
+            if result is not None:
+                results.append((symbol, result))
+    finally:
+        if pack is not None:
+            pack.close()
+    return results
+
+def scan_records(data_dir, extract, sources, workers=DEFAULT_WORKERS, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Applies `extract` to every record in `sources` using a pool of worker processes.
+
+    JSON decoding is CPU bound, so the records are split into chunks that are decoded and
+    reduced in parallel; only the (small) extracted results travel back. Results are
+    yielded in the order of `sources`, whatever the number of workers, so the output of
+    a tool doesn't depend on how it was run.
+
+    Args:
+        data_dir (str): Data directory of the records.
+        extract (callable): A picklable (module-level) function called as
+            extract(symbol, record). Records for which it returns None are skipped, and
+            records it raises on are logged and skipped.
+        sources (list): (symbol, path) pairs, with path None for records in the pack store.
+        workers (int): Worker processes. With 1, or a single chunk, the scan runs in this process.
+        chunk_size (int): Records per task.
+
+    Yields:
+        tuple: (symbol, result).
+    """
+    sources = list(sources)
+    chunks = chunked(sources, chunk_size)
+    task = partial(extract_chunk, str(data_dir), extract)
+    if workers <= 1 or len(chunks) <= 1:
+        for chunk in chunks:
+            yield from task(chunk)
+        return
+    with ProcessPoolExecutor(max_workers=min(workers, len(chunks))) as executor:
+        for results in executor.map(task, chunks):
+            yield from results
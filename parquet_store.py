@@ -0,0 +1,244 @@
+import os
+import json
+import logging
+import time
+import uuid
+from collections import defaultdict
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+# Sections of flat key/value pairs, stored as one wide row per symbol
+SCALAR_SECTIONS = ["General", "Highlights", "Valuation", "SharesStats", "Technicals"]
+
+# Sections holding time series, stored in long format (one row per symbol/date/field)
+SERIES_SECTIONS = ["Financials", "Earnings", "outstandingShares", "SplitsDividends"]
+
+def require_pyarrow():
+    if pa is None:
+        raise ImportError("The Parquet backend requires pyarrow. Install it with 'pip install pyarrow'.")
+
+def table_name(section):
+    """
+    Returns the on-disk table name for a section, e.g. 'SharesStats' -> 'shares_stats'.
+    """
+    name = "".join(f"_{c.lower()}" if c.isupper() else c for c in section).lstrip("_")
+    return name.replace("__", "_")
+
+def to_float(value):
+    """
+    Converts numbers and numeric strings to float; returns None for anything else.
+    """
+    if isinstance(value, bool) or value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return float(str(value).replace(",", ""))
+    except ValueError:
+        return None
+
+def scalar_row(section_data):
+    """
+    Flattens a scalar section into a column -> value mapping. Nested structures
+    (e.g. General.Officers) are kept as JSON strings.
+    """
+    row = {}
+    for key, value in section_data.items():
+        if isinstance(value, (dict, list)):
+            row[key] = json.dumps(value)
+        else:
+            row[key] = value
+    return row
+
+def series_rows(section, section_data):
+    """
+    Converts a time-series section into long-format rows of (group, period, date, field, value).
+
+    - Financials:        group = statement (e.g. Balance_Sheet), period = yearly/quarterly
+    - Earnings:          group = History/Trend/Annual
+    - outstandingShares: group = annual/quarterly
+    - SplitsDividends:   group = NumberDividendsByYear for the per-year counts, summary for the scalars
+    """
+    rows = []
+
+    def add(group, period, date, field, value):
+        rows.append({
+            "group": group,
+            "period": period,
+            "date": None if date is None else str(date),
+            "field": field,
+            "value": to_float(value),
+            "value_str": None if value is None else str(value),
+        })
+
+    if section == "Financials":
+        for statement, statement_data in section_data.items():
+            if not isinstance(statement_data, dict):
+                continue
+            for period in ("yearly", "quarterly"):
+                for date, values in (statement_data.get(period) or {}).items():
+                    for field, value in (values or {}).items():
+                        if field != "date":
+                            add(statement, period, date, field, value)
+    elif section == "Earnings":
+        for group, entries in section_data.items():
+            for date, values in (entries or {}).items():
+                for field, value in (values or {}).items():
+                    if field != "date":
+                        add(group, None, date, field, value)
+    elif section == "outstandingShares":
+        for period, entries in section_data.items():
+            for entry in (entries or {}).values():
+                date = entry.get("dateFormatted") or entry.get("date")
+                for field in ("shares", "sharesMln"):
+                    if field in entry:
+                        add(period, None, date, field, entry[field])
+    elif section == "SplitsDividends":
+        for field, value in section_data.items():
+            if field == "NumberDividendsByYear" and isinstance(value, dict):
+                for entry in value.values():
+                    add(field, None, entry.get("Year"), "Count", entry.get("Count"))
+            elif not isinstance(value, (dict, list)):
+                add("summary", None, None, field, value)
+    return rows
+
+def build_table(rows):
+    """
+    Builds a pyarrow table from a list of row dicts. Columns whose values are all numeric
+    become float64; any other column is stored as strings.
+    """
+    columns = {}
+    for row in rows:
+        for key in row:
+            columns.setdefault(key, None)
+    arrays = {}
+    for column in columns:
+        values = [row.get(column) for row in rows]
+        present = [v for v in values if v is not None]
+        if column == "fetched_at":
+            arrays[column] = pa.array(values, type=pa.timestamp("s", tz="UTC"))
+        elif present and all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in present):
+            arrays[column] = pa.array([None if v is None else float(v) for v in values], type=pa.float64())
+        else:
+            arrays[column] = pa.array([None if v is None else str(v) for v in values], type=pa.string())
+    return pa.table(arrays)
+
+def partition_value(value):
+    """
+    Makes a value safe for use in a hive-style partition directory name.
+    """
+    return str(value or "unknown").replace("/", "_").replace("=", "_")
+
+class ParquetFundamentalsWriter:
+    """
+    Buffers fundamentals payloads and writes them as Parquet tables.
+
+    Scalar sections become wide tables and time-series sections become long tables, each
+    partitioned as `<table>/exchange=<exchange>/type=<type>/part-<run>-<n>.parquet`. Rows are
+    buffered and written once `batch_size` symbols have been added, so a run produces a
+    handful of files per partition. Every row carries `fetched_at`; when a symbol is fetched
+    again, readers should keep the rows with the latest `fetched_at` (see `read_table`).
+    """
+
+    def __init__(self, root_dir, batch_size=5000, compression="zstd"):
+        require_pyarrow()
+        self.root_dir = root_dir
+        self.batch_size = batch_size
+        self.compression = compression
+        self.run_id = time.strftime("%Y%m%dT%H%M%S") + "-" + uuid.uuid4().hex[:6]
+        self.part = 0
+        self.pending = 0
+        self.buffers = defaultdict(list)
+
+    def add(self, symbol, exchange, data, asset_type=None):
+        """
+        Buffers one payload. Only the sections present in `data` are written, so a
+        section-filtered fetch leaves the other tables untouched. `asset_type` partitions
+        the rows and defaults to the payload's General.Type; pass the stored record's for
+        payloads fetched without General, so they land in the symbol's usual partition.
+
+        Returns:
+            bool: True if this call flushed the buffers to disk.
+        """
+        asset_type = asset_type or (data.get("General") or {}).get("Type")
+        fetched_at = int(time.time())
+        keys = {"symbol": symbol, "exchange": exchange, "type": asset_type, "fetched_at": fetched_at}
+
+        for section in SCALAR_SECTIONS:
+            if isinstance(data.get(section), dict):
+                self.buffers[(table_name(section), exchange, asset_type)].append({**keys, **scalar_row(data[section])})
+        for section in SERIES_SECTIONS:
+            if isinstance(data.get(section), dict):
+                rows = series_rows(section, data[section])
+                self.buffers[(table_name(section), exchange, asset_type)].extend({**keys, **row} for row in rows)
+
+        self.pending += 1
+        if self.pending >= self.batch_size:
+            self.flush()
+            return True
+        return False
+
+    def flush(self):
+        """
+        Writes all buffered rows, one file per table partition.
+        """
+        if not self.buffers:
+            return
+        for (name, exchange, asset_type), rows in self.buffers.items():
+            if not rows:
+                continue
+            directory = os.path.join(self.root_dir, name, f"exchange={partition_value(exchange)}",
+                                     f"type={partition_value(asset_type)}")
+            os.makedirs(directory, exist_ok=True)
+            # Partition values live in the directory names
+            table = build_table([{k: v for k, v in row.items() if k not in ("exchange", "type")} for row in rows])
+            path = os.path.join(directory, f"part-{self.run_id}-{self.part:05d}.parquet")
+            # Write under a temp name so readers never pick up a partially written file
+            pq.write_table(table, path + ".tmp", compression=self.compression)
+            os.replace(path + ".tmp", path)
+        logging.info(f"Wrote Parquet batch {self.part} ({self.pending} symbols) to {self.root_dir}")
+        self.part += 1
+        self.pending = 0
+        self.buffers.clear()
+
+    def close(self):
+        self.flush()
+
+def read_table(root_dir, section, latest_only=True):
+    """
+    Reads one section table as a pyarrow table, including the exchange and type partition
+    columns. Columns whose type differs between files are read as strings. With
+    `latest_only`, only the rows from each symbol's most recent fetch are kept.
+    """
+    require_pyarrow()
+    tables = []
+    for directory, _, filenames in os.walk(os.path.join(root_dir, table_name(section))):
+        partitions = dict(part.split("=", 1) for part in os.path.relpath(directory, root_dir).split(os.sep) if "=" in part)
+        for filename in sorted(filenames):
+            if filename.endswith(".parquet"):
+                table = pq.read_table(os.path.join(directory, filename))
+                for column in ("exchange", "type"):
+                    table = table.append_column(column, pa.array([partitions.get(column)] * table.num_rows, pa.string()))
+                tables.append(table)
+    if not tables:
+        return None
+
+    types = defaultdict(set)
+    for table in tables:
+        for field in table.schema:
+            types[field.name].add(field.type)
+    schema = pa.schema([(name, next(iter(t)) if len(t) == 1 else pa.string()) for name, t in types.items()])
+    table = pa.concat_tables([
+        pa.table({field.name: (t.column(field.name).cast(field.type) if field.name in t.column_names
+                               else pa.nulls(t.num_rows, field.type)) for field in schema})
+        for t in tables
+    ])
+    if not latest_only or table.num_rows == 0:
+        return table
+    latest = table.group_by("symbol").aggregate([("fetched_at", "max")]).rename_columns(["symbol", "fetched_at"])
+    return table.join(latest, keys=["symbol", "fetched_at"], join_type="inner")
@@ -0,0 +1,41 @@
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket used to keep API usage under the plan's calls-per-minute limit.
+
+    Tokens refill continuously at `calls_per_minute / 60` per second up to `burst`.
+    Callers block in `acquire()` until enough tokens are available, so any number of
+    worker threads can share a single bucket.
+    """
+
+    def __init__(self, calls_per_minute, burst=None):
+        if calls_per_minute <= 0:
+            raise ValueError("calls_per_minute must be positive.")
+        self.rate = calls_per_minute / 60.0
+        self.capacity = float(burst if burst is not None else calls_per_minute)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, tokens=1):
+        """
+        Blocks until `tokens` tokens have been taken from the bucket.
+        """
+        if tokens > self.capacity:
+            raise ValueError(f"Cannot acquire {tokens} tokens from a bucket of capacity {self.capacity}.")
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                wait = (tokens - self.tokens) / self.rate
+            time.sleep(wait)
@@ -0,0 +1,164 @@
+import os
+import logging
+
+from fundamental_io import (encode_record, write_record, write_temp, read_record, fundamentals_path, resolve_record,
+                            remove_stale_copies, remove_temp_files, fsync_file, fsync_dir)
+from summary_index import summarize
+
+# Durability levels for fetched records (every level writes atomically via temp file + rename):
+#   none   - no fsync; a power loss may lose recent writes but never leaves a partial file
+#   batch  - files are renamed into place and fsynced once per batch, on flush()
+#   always - every file and its directory are fsynced as it is written
+DURABILITY_LEVELS = ("none", "batch", "always")
+
+class RecordWriter:
+    """
+    Writes fetched fundamentals records to the configured storage backends: loose
+    per-symbol files, the pack store and/or Parquet tables.
+
+    With the `batch` durability level, loose files are staged as temp files and only
+    renamed into place by `flush()`, after their data has been synced, so a batch becomes
+    visible and durable together.
+
+    With a `summary_index`, every record written to the pack store or loose files is also
+    summarized into the index, which is committed on `flush()`.
+    """
+
+    def __init__(self, output_dir, codec="json", write_files=True, pack_store=None, parquet_writer=None,
+                 durability="batch", summary_index=None):
+        if durability not in DURABILITY_LEVELS:
+            raise ValueError(f"Unknown durability level '{durability}'. Choose one of: {', '.join(DURABILITY_LEVELS)}.")
+        self.output_dir = output_dir
+        self.codec = codec
+        self.write_files = write_files
+        self.pack_store = pack_store
+        self.parquet_writer = parquet_writer
+        self.durability = durability
+        self.summary_index = summary_index
+        self.staged = []  # (symbol, temp path, final path) awaiting the next flush
+        if write_files:
+            removed = remove_temp_files(output_dir)
+            if removed:
+                logging.info(f"Removed {removed} temp files left by an interrupted run.")
+
+    def load(self, symbol):
+        """
+        Returns the currently stored record for `symbol`, or None.
+        """
+        if self.pack_store is not None:
+            data = self.pack_store.get(symbol)
+            if data is not None:
+                return data
+        filepath = resolve_record(self.output_dir, symbol)
+        return None if filepath is None else read_record(filepath, self.output_dir)
+
+    def merge_sections(self, symbol, data):
+        """
+        Merges a partial (section-filtered) payload into the stored record, so a section
+        refresh never drops the sections it did not request.
+        """
+        try:
+            existing = self.load(symbol)
+        except (OSError, ValueError) as e:
+            logging.warning(f"Could not read the stored record for {symbol} to merge sections; "
+                            f"storing partial record only: {e}")
+            return data
+        if existing is None:
+            return data
+        existing.update(data)
+        return existing
+
+    def prepare(self, symbol, data, sections=None):
+        """
+        Returns the record that writing a fetched payload would store: the payload itself,
+        or for a section-filtered fetch, the payload merged into the stored record.
+        """
+        return data if sections is None else self.merge_sections(symbol, data)
+
+    def exists(self, symbol):
+        """
+        Returns whether a stored copy of `symbol` is present in the record backends.
+        """
+        if self.pack_store is not None and symbol in self.pack_store:
+            return True
+        if self.write_files:
+            return resolve_record(self.output_dir, symbol) is not None
+        return self.pack_store is None
+
+    def write(self, symbol, exchange, data, sections=None, record=None, digest=None):
+        """
+        Writes one fetched record to every backend. `record` is the result of `prepare()`,
+        and `digest` its content hash, if the caller already has them.
+
+        Returns:
+            tuple: The encoded payload, and whether a Parquet batch was flushed (after which
+            everything written so far is on disk).
+        """
+        record = record if record is not None else self.prepare(symbol, data, sections)
+        version = None
+        if self.pack_store is not None:
+            payload = self.pack_store.put(symbol, record)
+            if self.durability == "always":
+                self.pack_store.flush(sync=True)
+            # The pack now holds the current copy; drop any loose file so readers never see a stale one
+            if not self.write_files:
+                remove_stale_copies(self.output_dir, symbol)
+            # Readers take packed records over loose files, so the pack copy is the one indexed
+            version = self.pack_store.stored_at(symbol)
+        if self.write_files:
+            filepath = fundamentals_path(self.output_dir, symbol, self.codec)
+            if self.durability == "batch":
+                payload = encode_record(record, self.codec, self.output_dir)
+                temp_path = write_temp(payload, filepath)
+                self.staged.append((symbol, temp_path, filepath))
+                stored_path = temp_path  # The rename keeps the temp file's modification time
+            else:
+                payload = write_record(record, filepath, self.codec, self.output_dir, sync=self.durability == "always")
+                remove_stale_copies(self.output_dir, symbol, filepath)
+                stored_path = filepath
+            if version is None:
+                version = os.stat(stored_path).st_mtime
+            logging.debug(f"Saved {self.codec} record to {filepath}")
+        if self.pack_store is None and not self.write_files:
+            payload = encode_record(record, self.codec, self.output_dir)
+        if self.summary_index is not None and version is not None:
+            self.summary_index.put(summarize(symbol, record, version, digest))
+
+        flushed = False
+        if self.parquet_writer is not None:
+            # The merged record carries General.Type even when the fetch didn't
+            asset_type = (record.get("General") or {}).get("Type")
+            flushed = self.parquet_writer.add(symbol, exchange, data, asset_type)
+            if flushed and self.pack_store is not None:
+                self.pack_store.flush()
+        return payload, flushed
+
+    def commit_staged(self):
+        """
+        Syncs the staged temp files, renames them into place and syncs their directories.
+        """
+        if not self.staged:
+            return
+        for _, temp_path, _ in self.staged:
+            fsync_file(temp_path)
+        directories = set()
+        for symbol, temp_path, filepath in self.staged:
+            os.replace(temp_path, filepath)
+            remove_stale_copies(self.output_dir, symbol, filepath)
+            directories.add(os.path.dirname(filepath))
+        for directory in directories:
+            fsync_dir(directory)
+        self.staged.clear()
+
+    def flush(self):
+        """
+        Makes everything written so far visible and, unless the durability level is
+        `none`, durable in every backend.
+        """
+        self.commit_staged()
+        if self.pack_store is not None:
+            self.pack_store.flush(sync=self.durability != "none")
+        if self.summary_index is not None:
+            self.summary_index.commit()
+        if self.parquet_writer is not None:
+            self.parquet_writer.flush()
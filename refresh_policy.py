@@ -0,0 +1,53 @@
+import json
+
+class RefreshPolicy:
+    """
+    Refresh windows (TTLs, in days) by asset type and exchange, so slow-moving assets such
+    as funds or delisted tickers are refetched less often than active equities.
+
+    A symbol's window is, from most to least specific: the delisted window for delisted
+    symbols; the window for its type on its exchange; the window for its exchange; the
+    window for its type; the default. Exchanges match the listing exchange (e.g. NASDAQ)
+    first, then the exchange list code (e.g. US). Types match General.Type of the stored
+    record, or the symbol list's Type before the first fetch, ignoring case.
+
+    Policy files are JSON, e.g.:
+        {"default": 7, "types": {"ETF": 14, "FUND": 30}, "delisted": 180,
+         "exchanges": {"OTC": 30, "LSE": {"*": 10, "ETF": 21}}}
+    """
+
+    def __init__(self, default_days, types=None, exchanges=None, delisted_days=None):
+        self.default_days = float(default_days)
+        self.types = {key.upper(): float(value) for key, value in (types or {}).items()}
+        self.exchanges = {}
+        for exchange, value in (exchanges or {}).items():
+            rules = value if isinstance(value, dict) else {"*": value}
+            self.exchanges[exchange.upper()] = {key.upper(): float(days) for key, days in rules.items()}
+        self.delisted_days = None if delisted_days is None else float(delisted_days)
+
+    @classmethod
+    def load(cls, path, default_days):
+        """
+        Loads a policy file. `default_days` (the --days option) applies when the file has
+        no "default".
+        """
+        with open(path, "r") as file:
+            config = json.load(file)
+        return cls(config.get("default", default_days), config.get("types"), config.get("exchanges"),
+                   config.get("delisted"))
+
+    def days(self, asset_type=None, exchange=None, country=None, is_delisted=False):
+        """
+        Returns the refresh window in days for a symbol.
+        """
+        if is_delisted and self.delisted_days is not None:
+            return self.delisted_days
+        asset_type = (asset_type or "").upper()
+        for code in (exchange, country):
+            rules = self.exchanges.get((code or "").upper())
+            if rules is not None:
+                if asset_type in rules:
+                    return rules[asset_type]
+                if "*" in rules:
+                    return rules["*"]
+        return self.types.get(asset_type, self.default_days)
@@ -0,0 +1,134 @@
+import os
+import sqlite3
+import logging
+import argparse
+from collections import namedtuple, Counter
+from fundamental_io import content_hash
+
+SUMMARY_FILENAME = "_summary.sqlite"
+
+# The few fields of a fundamentals record that listing and selection tools need.
+# `mtime` identifies the stored copy the entry was taken from (the file's modification
+# time, or the pack store's stored_at), so a rewritten record shows up as stale.
+Summary = namedtuple("Summary", ["symbol", "exchange", "type", "market_cap", "currency", "sector", "holdings_count",
+                                 "mtime", "content_hash"])
+
+# Record paths that can be answered from the index, and the Summary field holding each
+INDEXED_FIELDS = {
+    "General.Exchange": "exchange",
+    "General.Type": "type",
+    "Highlights.MarketCapitalization": "market_cap",
+    "General.CurrencyCode": "currency",
+    "General.Sector": "sector",
+}
+
+# Columns without a declared type keep values as stored, so a market cap reported as a
+# string (e.g. '1,000,000') reads back as that string, exactly as in the record.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS summaries (
+    symbol TEXT PRIMARY KEY,
+    exchange,
+    type,
+    market_cap,
+    currency,
+    sector,
+    holdings_count INTEGER,
+    mtime REAL NOT NULL,
+    content_hash TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_summaries_type ON summaries(type);
+"""
+
+def summary_path(data_dir):
+    """
+    Returns the location of the summary index for a data directory.
+    """
+    return os.path.join(data_dir, SUMMARY_FILENAME)
+
+def scalar(value):
+    """
+    Returns `value` if SQLite can store it unchanged, otherwise None.
+    """
+    if isinstance(value, int) and not isinstance(value, bool) and abs(value) >= 2 ** 63:
+        return float(value)
+    return value if value is None or isinstance(value, (str, int, float)) else None
+
+def summarize(symbol, record, mtime, digest=None):
+    """
+    Builds the Summary of a fundamentals record. `digest` is the record's content hash,
+    computed when not given.
+    """
+    general = record.get("General") or {}
+    highlights = record.get("Highlights") or {}
+    holdings = (record.get("ETF_Data") or {}).get("Holdings")
+    return Summary(
+        symbol,
+        scalar(general.get("Exchange")),
+        scalar(general.get("Type")),
+        scalar(highlights.get("MarketCapitalization") if isinstance(highlights, dict) else None),
+        scalar(general.get("CurrencyCode")),
+        scalar(general.get("Sector")),
+        len(holdings) if isinstance(holdings, dict) else None,
+        mtime,
+        digest or content_hash(record),
+    )
+
+class SummaryIndex:
+    """
+    SQLite sidecar next to the fundamentals records holding one Summary per symbol. It is
+    written as records are fetched, so tools that only need a few fields per symbol (type,
+    market cap, ...) read it instead of decoding every multi-MB record.
+
+    Writes are buffered until `commit()`.
+    """
+
+    def __init__(self, db_path):
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.conn = sqlite3.connect(db_path, timeout=60)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+
+    def commit(self):
+        self.conn.commit()
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+    def put(self, summary):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO summaries (symbol, exchange, type, market_cap, currency, sector, holdings_count, "
+            "mtime, content_hash) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            summary,
+        )
+
+    def remove(self, symbols):
+        self.conn.executemany("DELETE FROM summaries WHERE symbol = ?", [(symbol,) for symbol in symbols])
+
+    def entries(self):
+        """
+        Returns a dict mapping every indexed symbol to its Summary.
+        """
+        rows = self.conn.execute("SELECT symbol, exchange, type, market_cap, currency, sector, holdings_count, mtime, "
+                                 "content_hash FROM summaries")
+        return {row[0]: Summary(*row) for row in rows}
+
+if __name__ == "__main__":
+    from fundamental_store import FundamentalStore
+    from parallel_scan import DEFAULT_WORKERS
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    parser = argparse.ArgumentParser(description="Bring the summary index of the fundamentals records up to date "
+                                                 "and show the number of records per type.")
+    parser.add_argument("--data_dir", default="./data/fundamental_data", help="Directory containing fundamentals data.")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help="Processes decoding records (default: one per CPU).")
+    args = parser.parse_args()
+
+    with FundamentalStore(args.data_dir, workers=args.workers) as store:
+        summaries = store.summaries()
+    print(f"{len(summaries)} records indexed.")
+    for asset_type, count in Counter(summary.type or "unknown" for summary in summaries).most_common():
+        print(f"  {asset_type}: {count}")
@@ -0,0 +1,124 @@
+import os
+import json
+import argparse
+import time
+from datetime import datetime
+
+CHANGE_LOG_FILENAME = "_changes.jsonl"
+
+# Symbol list fields compared between refreshes
+TRACKED_FIELDS = ("Name", "Type", "Exchange", "Currency", "Isin")
+
+def change_log_path(exchanges_dir):
+    """
+    Returns the default location of the change log for a directory of exchange symbol lists.
+    """
+    return os.path.join(exchanges_dir, CHANGE_LOG_FILENAME)
+
+def diff_listings(old, new):
+    """
+    Compares two downloads of one exchange symbol list.
+
+    Codes that disappeared while a new code with the same ISIN appeared are reported as
+    renamed rather than as a delisting and a listing.
+
+    Args:
+        old (list): The previous list entries, or None if there was none.
+        new (list): The downloaded list entries.
+
+    Returns:
+        dict: 'listed' and 'delisted' (lists of codes), 'renamed' (list of {'from', 'to',
+        'isin'}) and 'changed' (list of {'code', 'fields': {field: [old, new]}}).
+    """
+    old_entries = {entry["Code"]: entry for entry in old or [] if entry.get("Code")}
+    new_entries = {entry["Code"]: entry for entry in new if entry.get("Code")}
+    listed = [code for code in new_entries if code not in old_entries]
+    delisted = [code for code in old_entries if code not in new_entries]
+
+    renamed = []
+    listed_by_isin = {new_entries[code].get("Isin"): code for code in listed if new_entries[code].get("Isin")}
+    for code in list(delisted):
+        new_code = listed_by_isin.pop(old_entries[code].get("Isin") or None, None)
+        if new_code is not None:
+            renamed.append({"from": code, "to": new_code, "isin": old_entries[code]["Isin"]})
+            delisted.remove(code)
+            listed.remove(new_code)
+
+    changed = []
+    for code, entry in new_entries.items():
+        previous = old_entries.get(code)
+        if previous is None:
+            continue
+        fields = {field: [previous.get(field), entry.get(field)] for field in TRACKED_FIELDS
+                  if previous.get(field) != entry.get(field)}
+        if fields:
+            changed.append({"code": code, "fields": fields})
+    return {"listed": listed, "delisted": delisted, "renamed": renamed, "changed": changed}
+
+def is_empty(diff):
+    return not any(diff[key] for key in ("listed", "delisted", "renamed", "changed"))
+
+def append_change(log_path, exchange_code, diff, refreshed_at=None):
+    """
+    Appends one exchange's diff to the change log, a JSON Lines file with one entry per
+    refresh that changed something. The entry is on disk when this returns.
+    """
+    entry = {"exchange": exchange_code, "refreshed_at": refreshed_at or time.time(), **diff}
+    with open(log_path, "a", encoding="utf-8") as file:
+        file.write(json.dumps(entry, separators=(",", ":")) + "\n")
+        file.flush()
+        os.fsync(file.fileno())
+
+def read_changes(log_path, offset=0, since=None):
+    """
+    Reads the change log from byte `offset` on, skipping entries older than `since`
+    (a timestamp). A partially written last line is left for the next read.
+
+    Returns:
+        tuple: The entries and the offset to continue reading from.
+    """
+    if not os.path.exists(log_path):
+        return [], offset
+    entries = []
+    with open(log_path, "rb") as file:
+        file.seek(offset)
+        for line in file:
+            if not line.endswith(b"\n"):
+                break
+            offset += len(line)
+            entry = json.loads(line)
+            if since is None or entry["refreshed_at"] >= since:
+                entries.append(entry)
+    return entries, offset
+
+def log_end(log_path):
+    """
+    Returns the current end of the change log, where a reader that only wants new entries starts.
+    """
+    return os.path.getsize(log_path) if os.path.exists(log_path) else 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Show the changes recorded in exchange symbol list refreshes.")
+    parser.add_argument("--data_dir", default="./data/exchanges", help="Directory of exchange symbol lists.")
+    parser.add_argument("--days", type=float, default=7, help="Look-back window in days.")
+    parser.add_argument("--exchange", help="Only show this exchange list code (e.g. 'US').")
+    parser.add_argument("--details", action="store_true", help="List every code, not just the counts.")
+    args = parser.parse_args()
+
+    entries, _ = read_changes(change_log_path(args.data_dir), since=time.time() - args.days * 86400)
+    for entry in entries:
+        if args.exchange and entry["exchange"] != args.exchange.upper():
+            continue
+        print(f"{datetime.fromtimestamp(entry['refreshed_at']):%Y-%m-%d %H:%M}  {entry['exchange']}: "
+              f"{len(entry['listed'])} listed, {len(entry['delisted'])} delisted, "
+              f"{len(entry['renamed'])} renamed, {len(entry['changed'])} changed")
+        if args.details:
+            for code in entry["listed"]:
+                print(f"  + {code}")
+            for code in entry["delisted"]:
+                print(f"  - {code}")
+            for rename in entry["renamed"]:
+                print(f"  {rename['from']} -> {rename['to']} ({rename['isin']})")
+            for change in entry["changed"]:
+                print(f"  ~ {change['code']}: " + ", ".join(f"{field} {old!r} -> {new!r}"
+                                                           for field, (old, new) in change["fields"].items()))
@@ -0,0 +1,232 @@
+import os
+import sqlite3
+import argparse
+import logging
+import time
+from collections import namedtuple
+from fundamental_io import list_record_files, record_name, read_record, find_record
+
+MASTER_FILENAME = "_symbol_master.sqlite"
+
+# One entry of an exchange symbol list; `country` is the list's code (e.g. US)
+Listing = namedtuple("Listing", ["country", "code", "name", "exchange", "type", "currency", "isin"])
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS symbols (
+    country TEXT NOT NULL,
+    code TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    name TEXT,
+    exchange TEXT,
+    type TEXT,
+    currency TEXT,
+    isin TEXT,
+    PRIMARY KEY (country, code)
+);
+CREATE INDEX IF NOT EXISTS idx_symbols_code ON symbols(code);
+CREATE INDEX IF NOT EXISTS idx_symbols_exchange ON symbols(exchange, country);
+CREATE INDEX IF NOT EXISTS idx_symbols_type ON symbols(type, country);
+CREATE INDEX IF NOT EXISTS idx_symbols_currency ON symbols(currency, country);
+CREATE INDEX IF NOT EXISTS idx_symbols_isin ON symbols(isin);
+CREATE TABLE IF NOT EXISTS lists (
+    country TEXT PRIMARY KEY,
+    mtime REAL NOT NULL,
+    size INTEGER NOT NULL,
+    refreshed_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS summary (
+    country TEXT NOT NULL,
+    exchange TEXT NOT NULL,
+    type TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (country, exchange, type)
+);
+"""
+
+# Summary rows of list entries without an exchange or type
+UNKNOWN = ""
+
+def master_path(exchanges_dir):
+    """
+    Returns the location of the symbol master for a directory of exchange symbol lists.
+    """
+    return os.path.join(exchanges_dir, MASTER_FILENAME)
+
+class SymbolMaster:
+    """
+    SQLite index of every exchange symbol list in a directory, so lookups by code,
+    exchange, country, type or currency don't parse the (multi-MB) list files.
+
+    The index tracks each list file's size and modification time. `sync()` reloads only
+    the lists that changed on disk, and `update_list()` lets the downloader index a list
+    as it writes it. Both keep a summary of symbol counts per list, exchange and type up
+    to date, so overall counts never need a scan.
+    """
+
+    def __init__(self, exchanges_dir, db_path=None):
+        self.exchanges_dir = str(exchanges_dir)
+        db_path = db_path or master_path(self.exchanges_dir)
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.conn = sqlite3.connect(db_path, timeout=60)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        if self.conn.execute("SELECT 1 FROM summary LIMIT 1").fetchone() is None:
+            # Index built before the summary existed
+            with self.conn:
+                for country in self.countries():
+                    self._summarize(country)
+
+    def close(self):
+        self.conn.close()
+
+    def update_list(self, country, entries, path):
+        """
+        Replaces the indexed entries of one list with `entries`, which were just written
+        to (or read from) `path`.
+        """
+        stat = os.stat(path)
+        rows = [(country, entry["Code"], position, entry.get("Name"), entry.get("Exchange"), entry.get("Type"),
+                 entry.get("Currency"), entry.get("Isin"))
+                for position, entry in enumerate(entries) if entry.get("Code")]
+        with self.conn:
+            self.conn.execute("DELETE FROM symbols WHERE country = ?", (country,))
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO symbols (country, code, position, name, exchange, type, currency, isin) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            self.conn.execute("INSERT OR REPLACE INTO lists (country, mtime, size, refreshed_at) VALUES (?, ?, ?, ?)",
+                              (country, stat.st_mtime, stat.st_size, time.time()))
+            self._summarize(country)
+
+    def _summarize(self, country):
+        self.conn.execute("DELETE FROM summary WHERE country = ?", (country,))
+        self.conn.execute(
+            """
+            INSERT INTO summary (country, exchange, type, count)
+            SELECT country, COALESCE(exchange, ?), COALESCE(type, ?), COUNT(*) FROM symbols
+            WHERE country = ? GROUP BY 1, 2, 3
+            """,
+            (UNKNOWN, UNKNOWN, country),
+        )
+
+    def sync(self, countries=None):
+        """
+        Reindexes the lists whose files changed since they were indexed and drops lists
+        whose files are gone. With `countries`, only those lists are checked.
+
+        Returns:
+            int: The number of lists reindexed.
+        """
+        if countries is None:
+            paths = {record_name(path): str(path) for path in list_record_files(self.exchanges_dir)}
+            indexed = [row[0] for row in self.conn.execute("SELECT country FROM lists")]
+            with self.conn:
+                for country in indexed:
+                    if country not in paths:
+                        for table in ("symbols", "lists", "summary"):
+                            self.conn.execute(f"DELETE FROM {table} WHERE country = ?", (country,))
+        else:
+            paths = {country: find_record(self.exchanges_dir, country) for country in countries}
+        count = 0
+        for country, path in paths.items():
+            if path is None:
+                continue
+            stat = os.stat(path)
+            row = self.conn.execute("SELECT mtime, size FROM lists WHERE country = ?", (country,)).fetchone()
+            if row is not None and row == (stat.st_mtime, stat.st_size):
+                continue
+            self.update_list(country, read_record(path), path)
+            logging.debug(f"Indexed symbol list {path}")
+            count += 1
+        return count
+
+    def countries(self):
+        """
+        Returns the codes of every indexed list.
+        """
+        return [row[0] for row in self.conn.execute("SELECT country FROM lists ORDER BY country")]
+
+    def summary(self, country=None):
+        """
+        Returns (country, exchange, type, count) for every combination present, of one list
+        or of all of them. Missing exchanges and types are reported as UNKNOWN.
+        """
+        if country is None:
+            rows = self.conn.execute("SELECT country, exchange, type, count FROM summary ORDER BY 1, 2, 3")
+        else:
+            rows = self.conn.execute("SELECT country, exchange, type, count FROM summary WHERE country = ? "
+                                     "ORDER BY 2, 3", (country,))
+        return rows.fetchall()
+
+    def refresh_times(self):
+        """
+        Returns a dict mapping each list's code to its file's modification time, i.e. when
+        it was last downloaded.
+        """
+        return dict(self.conn.execute("SELECT country, mtime FROM lists").fetchall())
+
+    def exchanges(self, country=None):
+        """
+        Returns the distinct listing exchanges, of one list or of all of them.
+        """
+        if country is None:
+            rows = self.conn.execute("SELECT DISTINCT exchange FROM symbols WHERE exchange IS NOT NULL ORDER BY exchange")
+        else:
+            rows = self.conn.execute("SELECT DISTINCT exchange FROM symbols WHERE country = ? AND exchange IS NOT NULL "
+                                     "ORDER BY exchange", (country,))
+        return [row[0] for row in rows]
+
+    def lookup(self, code, country=None):
+        """
+        Returns the Listings of a code, on every list or on one.
+        """
+        if country is None:
+            rows = self.conn.execute("SELECT country, code, name, exchange, type, currency, isin FROM symbols "
+                                     "WHERE code = ? ORDER BY country", (code,))
+        else:
+            rows = self.conn.execute("SELECT country, code, name, exchange, type, currency, isin FROM symbols "
+                                     "WHERE code = ? AND country = ?", (code, country))
+        return [Listing(*row) for row in rows]
+
+    def listings(self, country=None, exchange=None, asset_type=None, currency=None):
+        """
+        Returns the Listings matching every given filter, in list order.
+        """
+        filters = {"country": country, "exchange": exchange, "type": asset_type, "currency": currency}
+        clauses = [f"{column} = ?" for column, value in filters.items() if value is not None]
+        params = [value for value in filters.values() if value is not None]
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        rows = self.conn.execute(f"SELECT country, code, name, exchange, type, currency, isin FROM symbols {where} "
+                                 f"ORDER BY country, position", params)
+        return [Listing(*row) for row in rows]
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    parser = argparse.ArgumentParser(description="Query the index of all exchange symbol lists.")
+    parser.add_argument("--data_dir", default="./data/exchanges", help="Directory of exchange symbol lists.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("sync", help="Reindex the symbol lists that changed on disk.")
+    lookup_parser = subparsers.add_parser("lookup", help="Show every listing of a code.")
+    lookup_parser.add_argument("code", help="Symbol code, e.g. AAPL.")
+    list_parser = subparsers.add_parser("list", help="List the symbols matching the given filters.")
+    list_parser.add_argument("--country", help="Exchange list code, e.g. US.")
+    list_parser.add_argument("--exchange", help="Listing exchange, e.g. NASDAQ.")
+    list_parser.add_argument("--type", help="Asset type, e.g. 'Common Stock' or ETF.")
+    list_parser.add_argument("--currency", help="Currency code, e.g. USD.")
+    args = parser.parse_args()
+
+    master = SymbolMaster(args.data_dir)
+    if args.command == "sync":
+        print(f"Reindexed {master.sync()} symbol lists.")
+    else:
+        master.sync()
+        if args.command == "lookup":
+            listings = master.lookup(args.code.upper())
+        else:
+            listings = master.listings(args.country and args.country.upper(), args.exchange, args.type, args.currency)
+        for listing in listings:
+            print(f"{listing.code}.{listing.country}  {listing.exchange or '-'}  {listing.type or '-'}  "
+                  f"{listing.currency or '-'}  {listing.isin or '-'}  {listing.name or ''}")
+    master.close()
@@ -0,0 +1,11 @@
+import os
+import sys
+
+import pytest
+
+# The modules live at the repository root, next to the scripts that import them
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+@pytest.fixture
+def data_dir(tmp_path):
+    return str(tmp_path / "fundamental_data")
@@ -0,0 +1,31 @@
+def make_record(code, asset_type="Common Stock", market_cap=1_000_000_000, exchange="NASDAQ"):
+    """
+    Returns a small fundamentals record with the sections the tools read.
+    """
+    return {
+        "General": {"Code": code, "Type": asset_type, "Exchange": exchange, "CurrencyCode": "USD",
+                    "Sector": "Technology", "IsDelisted": False},
+        "Highlights": {"MarketCapitalization": market_cap, "PERatio": 12.5},
+        "Valuation": {"TrailingPE": 11.0},
+        "Earnings": {"History": {"2024-12-31": {"reportDate": "2025-01-30", "date": "2024-12-31", "epsActual": 1.2}}},
+    }
+
+class FakeClient:
+    """
+    Stands in for EODHDClient in the fetch loop. `records` maps tickers to the payload the
+    API returns for them, or to an exception it raises; unknown tickers return nothing.
+    """
+
+    def __init__(self, records=None):
+        self.records = dict(records or {})
+        self.calls = []
+
+    def get_fundamentals_data(self, ticker, sections=None):
+        self.calls.append((ticker, sections))
+        record = self.records.get(ticker)
+        if isinstance(record, Exception):
+            raise record
+        if record is None or not sections:
+            return record
+        # Like the API's filter, keyed by section and without the sections the symbol lacks
+        return {section: record[section] for section in sections if section in record}
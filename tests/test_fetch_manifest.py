@@ -0,0 +1,120 @@
+import sqlite3
+import time
+
+import pytest
+
+from backoff import (NOT_FOUND, CLIENT_ERROR, RATE_LIMITED, SERVER_ERROR, NETWORK_ERROR, UNAUTHORIZED,
+                     INTERNAL_ERROR)
+from fetch_manifest import (FetchManifest, MIGRATIONS, DEAD_LETTER_THRESHOLD, QUARANTINE_BASE_DAYS,
+                            QUARANTINE_MAX_DAYS)
+
+# The fetches table as the first manifests created it, before any migration
+ORIGINAL_SCHEMA = """
+CREATE TABLE fetches (
+    symbol TEXT PRIMARY KEY,
+    exchange TEXT,
+    fetched_at REAL,
+    attempted_at REAL,
+    status TEXT,
+    payload_size INTEGER,
+    content_hash TEXT
+);
+"""
+
+@pytest.fixture
+def manifest(tmp_path):
+    manifest = FetchManifest(str(tmp_path / "_manifest.sqlite"))
+    yield manifest
+    manifest.close()
+
+def columns(manifest):
+    return {row[1] for row in manifest.conn.execute("PRAGMA table_info(fetches)")}
+
+def fetch_row(manifest, symbol, *fields):
+    return manifest.conn.execute(f"SELECT {', '.join(fields)} FROM fetches WHERE symbol = ?", (symbol,)).fetchone()
+
+def test_an_original_manifest_is_migrated_and_backfilled(tmp_path):
+    path = str(tmp_path / "_manifest.sqlite")
+    fetched_at = time.time() - 3600
+    conn = sqlite3.connect(path)
+    conn.executescript(ORIGINAL_SCHEMA)
+    conn.executemany("INSERT INTO fetches VALUES (?, ?, ?, ?, ?, ?, ?)", [
+        ("AAPL.US", "NASDAQ", fetched_at, fetched_at, "ok", 1000, "abc"),
+        ("GONE.US", "NYSE", None, fetched_at, "not_found", None, None),
+    ])
+    conn.commit()
+    conn.close()
+
+    manifest = FetchManifest(path)
+    assert {column for column, _, _ in MIGRATIONS} <= columns(manifest)
+    assert fetch_row(manifest, "AAPL.US", "full_fetched_at", "sections", "changed_at", "failure_count") == \
+        (fetched_at, "*", fetched_at, 0)
+    assert fetch_row(manifest, "GONE.US", "full_fetched_at", "sections", "failure_count") == (None, None, 0)
+    # A complete fetch from before the migration still counts as fresh
+    assert manifest.due_symbols(["AAPL.US", "GONE.US", "NEW.US"], days=1) == ["GONE.US", "NEW.US"]
+    manifest.close()
+
+    # Opening a migrated manifest again changes nothing
+    manifest = FetchManifest(path)
+    assert fetch_row(manifest, "AAPL.US", "full_fetched_at", "sections") == (fetched_at, "*")
+    manifest.close()
+
+def test_section_fetches_only_refresh_their_sections(manifest):
+    manifest.record_success("AAPL.US", "NASDAQ", 100, "h1", sections=["Highlights"])
+    manifest.commit()
+    assert manifest.due_symbols(["AAPL.US"], days=1, sections=["Highlights"]) == []
+    assert manifest.due_symbols(["AAPL.US"], days=1, sections=["Highlights", "Earnings"]) == ["AAPL.US"]
+    assert manifest.due_symbols(["AAPL.US"], days=1) == ["AAPL.US"]
+    manifest.record_success("AAPL.US", "NASDAQ", 100, "h2")
+    manifest.commit()
+    assert manifest.due_symbols(["AAPL.US"], days=1, sections=["Earnings"]) == []
+
+def test_symbols_are_quarantined_after_the_threshold(manifest):
+    now = time.time()
+    for attempt in range(DEAD_LETTER_THRESHOLD - 1):
+        manifest.record_failure("GONE.US", "NYSE", NOT_FOUND, attempted_at=now)
+        manifest.commit()
+        assert fetch_row(manifest, "GONE.US", "failure_count", "quarantined_until") == (attempt + 1, None)
+    assert manifest.due_symbols(["GONE.US"], days=1) == ["GONE.US"]
+
+    manifest.record_failure("GONE.US", "NYSE", NOT_FOUND, attempted_at=now)
+    manifest.commit()
+    assert fetch_row(manifest, "GONE.US", "quarantined_until") == (now + QUARANTINE_BASE_DAYS * 86400,)
+    assert manifest.due_symbols(["GONE.US"], days=1) == []
+    assert [row[0] for row in manifest.dead_letters()] == ["GONE.US"]
+
+    # Every further failure doubles the re-probe interval, up to the maximum
+    manifest.record_failure("GONE.US", "NYSE", CLIENT_ERROR, attempted_at=now)
+    manifest.commit()
+    assert fetch_row(manifest, "GONE.US", "quarantined_until") == (now + 2 * QUARANTINE_BASE_DAYS * 86400,)
+    for _ in range(10):
+        manifest.record_failure("GONE.US", "NYSE", NOT_FOUND, attempted_at=now)
+    manifest.commit()
+    assert fetch_row(manifest, "GONE.US", "quarantined_until") == (now + QUARANTINE_MAX_DAYS * 86400,)
+
+@pytest.mark.parametrize("status", [RATE_LIMITED, SERVER_ERROR, NETWORK_ERROR, UNAUTHORIZED, INTERNAL_ERROR])
+def test_failures_that_are_not_the_symbols_never_count(manifest, status):
+    for _ in range(DEAD_LETTER_THRESHOLD):
+        manifest.record_failure("AAPL.US", "NASDAQ", NOT_FOUND)
+    manifest.commit()
+    quarantined = fetch_row(manifest, "AAPL.US", "failure_count", "quarantined_until")
+
+    for _ in range(DEAD_LETTER_THRESHOLD + 1):
+        manifest.record_failure("AAPL.US", "NASDAQ", status)
+        manifest.record_failure("MSFT.US", "NASDAQ", status)
+    manifest.commit()
+    assert fetch_row(manifest, "AAPL.US", "status", "failure_count", "quarantined_until") == (status, *quarantined)
+    assert fetch_row(manifest, "MSFT.US", "failure_count", "quarantined_until") == (0, None)
+
+def test_success_and_release_clear_the_quarantine(manifest):
+    for symbol in ("A.US", "B.US"):
+        for _ in range(DEAD_LETTER_THRESHOLD):
+            manifest.record_failure(symbol, "NYSE", NOT_FOUND)
+    manifest.commit()
+    manifest.record_success("A.US", "NYSE", 100, "h")
+    manifest.commit()
+    assert fetch_row(manifest, "A.US", "failure_count", "quarantined_until") == (0, None)
+
+    assert manifest.release_dead_letters(["B.US"]) == 1
+    assert fetch_row(manifest, "B.US", "failure_count", "quarantined_until") == (0, None)
+    assert manifest.due_symbols(["B.US"], days=1) == ["B.US"]
@@ -0,0 +1,96 @@
+import os
+
+import pytest
+
+from helpers import FakeClient, make_record
+from fetch_manifest import FetchManifest, manifest_path
+from fundamental_io import read_record, resolve_record
+from get_fundamental_data import fetch_symbols
+from rate_limiter import TokenBucket
+from record_writer import RecordWriter
+
+SYMBOLS = [("AAPL.US", "NASDAQ"), ("SPY.US", "NYSE ARCA")]
+
+@pytest.fixture
+def manifest(data_dir):
+    manifest = FetchManifest(manifest_path(data_dir))
+    yield manifest
+    manifest.close()
+
+@pytest.fixture
+def client():
+    return FakeClient({"AAPL.US": make_record("AAPL"), "SPY.US": make_record("SPY", asset_type="ETF")})
+
+def fetch(client, data_dir, manifest, sections=None, days=0, symbols=SYMBOLS):
+    # days=0 makes every symbol due
+    return fetch_symbols(client, symbols, RecordWriter(data_dir), days, TokenBucket(60000), manifest,
+                         sections=sections)
+
+def stored(data_dir, symbol):
+    return read_record(resolve_record(data_dir, symbol), data_dir)
+
+def fetch_row(manifest, symbol, *fields):
+    return manifest.conn.execute(f"SELECT {', '.join(fields)} FROM fetches WHERE symbol = ?", (symbol,)).fetchone()
+
+def test_a_section_fetch_is_merged_into_the_stored_record(client, data_dir, manifest):
+    assert fetch(client, data_dir, manifest)["ok"] == 2
+
+    client.records["AAPL.US"] = make_record("AAPL", market_cap=2_000_000_000)
+    client.records["AAPL.US"]["Earnings"] = {}
+    assert fetch(client, data_dir, manifest, sections=["Highlights"], symbols=SYMBOLS[:1])["ok"] == 1
+    assert client.calls[-1] == ("AAPL.US", ["Highlights"])
+
+    record = stored(data_dir, "AAPL.US")
+    assert record["Highlights"]["MarketCapitalization"] == 2_000_000_000
+    # Sections that weren't requested are kept as stored
+    assert record["Earnings"] == make_record("AAPL")["Earnings"]
+    assert record["General"] == make_record("AAPL")["General"]
+
+def test_a_section_the_symbol_lacks_is_ok_and_never_quarantines_it(client, data_dir, manifest):
+    fetch(client, data_dir, manifest)
+    for _ in range(4):
+        outcomes = fetch(client, data_dir, manifest, sections=["ETF_Data"], symbols=SYMBOLS[:1])
+        assert outcomes["ok"] == 1
+    assert stored(data_dir, "AAPL.US") == make_record("AAPL")
+    assert fetch_row(manifest, "AAPL.US", "status", "failure_count", "quarantined_until") == ("ok", 0, None)
+    assert manifest.due_symbols(["AAPL.US"], days=1, sections=["ETF_Data"]) == []
+
+def test_an_unchanged_payload_is_not_rewritten(client, data_dir, manifest):
+    fetch(client, data_dir, manifest)
+    path = resolve_record(data_dir, "AAPL.US")
+    os.utime(path, (1, 1))
+    fetched_at, changed_at = fetch_row(manifest, "AAPL.US", "fetched_at", "changed_at")
+
+    outcomes = fetch(client, data_dir, manifest)
+    assert outcomes["ok"] == 2
+    assert outcomes["unchanged"] == 2
+    assert os.stat(path).st_mtime == 1
+    refetched_at, rechanged_at = fetch_row(manifest, "AAPL.US", "fetched_at", "changed_at")
+    assert refetched_at > fetched_at
+    assert rechanged_at == changed_at
+
+def test_a_changed_payload_is_rewritten(client, data_dir, manifest):
+    fetch(client, data_dir, manifest)
+    changed_at = fetch_row(manifest, "AAPL.US", "changed_at")[0]
+    client.records["AAPL.US"] = make_record("AAPL", market_cap=3_000_000_000)
+
+    outcomes = fetch(client, data_dir, manifest)
+    assert outcomes["unchanged"] == 1
+    assert stored(data_dir, "AAPL.US")["Highlights"]["MarketCapitalization"] == 3_000_000_000
+    assert fetch_row(manifest, "AAPL.US", "changed_at")[0] > changed_at
+
+def test_an_unchanged_section_fetch_is_short_circuited(client, data_dir, manifest):
+    fetch(client, data_dir, manifest)
+    path = resolve_record(data_dir, "AAPL.US")
+    os.utime(path, (1, 1))
+    outcomes = fetch(client, data_dir, manifest, sections=["Highlights"], symbols=SYMBOLS[:1])
+    assert outcomes["unchanged"] == 1
+    assert os.stat(path).st_mtime == 1
+    assert manifest.due_symbols(["AAPL.US"], days=1, sections=["Highlights"]) == []
+
+def test_a_missing_record_is_written_even_if_the_manifest_knows_its_hash(client, data_dir, manifest):
+    fetch(client, data_dir, manifest)
+    os.remove(resolve_record(data_dir, "AAPL.US"))
+    outcomes = fetch(client, data_dir, manifest, symbols=SYMBOLS[:1])
+    assert outcomes["unchanged"] == 0
+    assert stored(data_dir, "AAPL.US") == make_record("AAPL")
@@ -0,0 +1,96 @@
+import os
+
+import pytest
+
+from helpers import make_record
+import pack_store
+from pack_store import PackStore
+
+def crash(store):
+    """
+    Drops a writer without committing its index, as a killed process would.
+    """
+    store.writer.flush()
+    store.writer.close()
+    store.conn.close()
+    if store._lock is not None:
+        store._lock.close()
+
+def test_get_returns_stored_records(data_dir):
+    store = PackStore(data_dir)
+    store.put("AAPL.US", make_record("AAPL"))
+    store.flush()
+    assert store.get("AAPL.US") == make_record("AAPL")
+    assert store.get("MSFT.US") is None
+    store.close()
+
+def test_reopening_truncates_the_uncommitted_tail(data_dir):
+    store = PackStore(data_dir)
+    store.put("A.US", make_record("A"))
+    store.flush()
+    segment_path = store.segment_path(1)
+    committed_size = os.path.getsize(segment_path)
+    store.put("B.US", make_record("B"))
+    crash(store)
+    assert os.path.getsize(segment_path) > committed_size
+
+    store = PackStore(data_dir)
+    assert os.path.getsize(store.segment_path(1)) == committed_size
+    assert store.get("A.US") == make_record("A")
+    assert "B.US" not in store
+    # New records append after the committed data
+    store.put("C.US", make_record("C"))
+    store.flush()
+    assert store.get("C.US") == make_record("C")
+    store.close()
+
+@pytest.mark.skipif(pack_store.fcntl is None, reason="the writer lock needs fcntl")
+def test_a_second_writer_is_refused(data_dir):
+    store = PackStore(data_dir)
+    store.put("A.US", make_record("A"))
+    store.writer.flush()
+    with pytest.raises(RuntimeError, match="already open for writing"):
+        PackStore(data_dir)
+    # The running writer's flushed but uncommitted record survived the attempt
+    store.put("B.US", make_record("B"))
+    store.flush()
+    assert store.get("A.US") == make_record("A")
+    store.close()
+
+    # Readers never take the lock, and the lock is released on close
+    reader = PackStore(data_dir, readonly=True)
+    assert reader.get("B.US") == make_record("B")
+    reader.close()
+    PackStore(data_dir).close()
+
+def test_compaction_moves_live_records_and_keeps_stored_at(data_dir):
+    store = PackStore(data_dir, segment_size=2000)
+    for i in range(12):
+        store.put(f"S{i}.US", make_record(f"S{i}"))
+    for i in range(0, 12, 2):
+        store.delete(f"S{i}.US")
+    store.flush()
+    segments = store.segments()
+    stored_at = {symbol: time for symbol, time, _ in store.entries()}
+
+    assert store.compact(min_garbage_ratio=0.3) > 0
+    assert set(store.segments()) != set(segments)
+    assert {symbol: time for symbol, time, _ in store.entries()} == stored_at
+    for i in range(1, 12, 2):
+        assert store.get(f"S{i}.US") == make_record(f"S{i}")
+    store.close()
+
+    # The compacted store reopens intact
+    store = PackStore(data_dir)
+    assert len(store) == 6
+    assert store.get("S11.US") == make_record("S11")
+    store.close()
+
+def test_compaction_skips_the_active_segment(data_dir):
+    store = PackStore(data_dir)
+    store.put("A.US", make_record("A"))
+    store.put("A.US", make_record("A", market_cap=5))
+    store.flush()
+    assert store.compact(min_garbage_ratio=0.1) == 0
+    assert store.get("A.US")["Highlights"]["MarketCapitalization"] == 5
+    store.close()
@@ -0,0 +1,43 @@
+import os
+
+import pytest
+
+from fundamental_io import (symbol_key, qualify_symbol, symbol_from_path, fundamentals_path, resolve_record,
+                            write_record, migrate_layout, shard_of)
+
+@pytest.mark.parametrize("code, exchange, key", [
+    ("aapl", "us", "AAPL.US"),
+    ("AAPL", "US", "AAPL.US"),
+    ("SAP", "XETRA", "SAP.XETRA"),
+    ("7203", "tse", "7203.TSE"),
+])
+def test_symbol_key(code, exchange, key):
+    assert symbol_key(code, exchange) == key
+
+@pytest.mark.parametrize("symbol, key", [
+    ("aapl", "AAPL.US"),
+    ("AAPL.US", "AAPL.US"),
+    ("sap.xetra", "SAP.XETRA"),
+])
+def test_qualify_symbol(symbol, key):
+    assert qualify_symbol(symbol) == key
+
+def test_qualify_symbol_with_another_default_exchange():
+    assert qualify_symbol("vod", "LSE") == "VOD.LSE"
+    assert qualify_symbol("VOD.US", "LSE") == "VOD.US"
+
+def test_equal_codes_on_two_exchanges_get_their_own_files(data_dir):
+    paths = {fundamentals_path(data_dir, "ABC.US"), fundamentals_path(data_dir, "ABC.LSE")}
+    assert len(paths) == 2
+    for path in paths:
+        assert os.path.basename(os.path.dirname(path)) == shard_of(symbol_from_path(path))
+
+def test_records_resolve_from_the_sharded_and_the_flat_layout(data_dir):
+    write_record({"General": {"Code": "AAPL"}}, os.path.join(data_dir, "aapl.json"))
+    assert resolve_record(data_dir, "AAPL.US") == os.path.join(data_dir, "aapl.json")
+    assert resolve_record(data_dir, "aapl") == os.path.join(data_dir, "aapl.json")
+    assert resolve_record(data_dir, "AAPL.LSE") is None
+
+    assert migrate_layout(data_dir) == 1
+    assert resolve_record(data_dir, "aapl") == fundamentals_path(data_dir, "AAPL.US")
+    assert symbol_from_path(resolve_record(data_dir, "AAPL.US")) == "AAPL.US"
@@ -0,0 +1,74 @@
+import time
+
+import pytest
+
+from work_queue import WorkQueue
+
+ITEMS = [(f"S{i}.US", "NYSE") for i in range(5)]
+
+class Clock:
+    def __init__(self):
+        self.now = time.time()
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(time, "time", clock)
+    return clock
+
+@pytest.fixture
+def queue_path(tmp_path):
+    return str(tmp_path / "queue.sqlite")
+
+def worker(queue_path, name, batch_size=2):
+    return WorkQueue(queue_path, owner=name, lease_seconds=60, batch_size=batch_size)
+
+def test_workers_split_the_queue_in_priority_order(queue_path, clock):
+    first, second = worker(queue_path, "first"), worker(queue_path, "second")
+    assert first.enqueue(ITEMS) == 5
+    # Enqueuing the same plan again leaves pending and leased items alone
+    assert second.enqueue(ITEMS) == 0
+    assert first.claim() == ITEMS[:2]
+    assert second.claim() == ITEMS[2:4]
+    assert first.leased_by_others()
+    first.complete([(symbol, "ok") for symbol, _ in ITEMS[:2]])
+    assert first.claim() == ITEMS[4:]
+    assert second.claim() == []
+
+def test_expired_leases_are_reclaimed(queue_path, clock):
+    dead, alive = worker(queue_path, "dead"), worker(queue_path, "alive")
+    dead.enqueue(ITEMS[:2])
+    assert dead.claim() == ITEMS[:2]
+    clock.now += 59
+    assert alive.claim() == []
+    assert alive.leased_by_others()
+
+    clock.now += 2
+    assert not alive.leased_by_others()
+    assert alive.claim() == ITEMS[:2]
+    # The late worker can no longer complete items it lost
+    dead.complete([(ITEMS[0][0], "ok")])
+    alive.complete([(ITEMS[1][0], "ok")])
+    states = dict(alive.conn.execute("SELECT symbol, owner FROM items WHERE state = 'leased'").fetchall())
+    assert states == {ITEMS[0][0]: "alive"}
+
+def test_heartbeats_keep_leases_alive(queue_path, clock):
+    busy, idle = worker(queue_path, "busy"), worker(queue_path, "idle")
+    busy.enqueue(ITEMS[:2])
+    busy.claim()
+    for _ in range(3):
+        clock.now += 50
+        busy.heartbeat(force=True)
+        assert idle.claim() == []
+
+def test_release_returns_leases_and_done_items_can_be_requeued(queue_path, clock):
+    queue = worker(queue_path, "only", batch_size=5)
+    queue.enqueue(ITEMS)
+    queue.claim()
+    queue.complete([(ITEMS[0][0], "ok")])
+    queue.release()
+    assert queue.claim() == ITEMS[1:]
+    assert queue.enqueue(ITEMS[:1]) == 1
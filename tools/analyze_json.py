@@ -1,8 +1,14 @@
 import os
+import sys
 import json
 import argparse
 import logging
 import re
+from pathlib import Path
+
+# Shared storage helpers live in the repository root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from fundamental_io import read_record
 
 # Configure logging to display DEBUG messages with indentation
 logging.basicConfig(level=logging.DEBUG, format='%(message)s')
@@ -17,10 +23,9 @@ def load_json(filepath):
         logger.error(f"File not found: {filepath}")
         return None
     try:
-        with open(filepath, 'r') as file:
-            data = json.load(file)
-            logger.debug(f"Successfully loaded JSON file: {filepath}\n")
-            return data
+        data = read_record(filepath)
+        logger.debug(f"Successfully loaded JSON file: {filepath}\n")
+        return data
     except json.JSONDecodeError as e:
         logger.error(f"JSON Decode Error in file {filepath}: {e}")
     except Exception as e:
@@ -2,13 +2,17 @@
 
 import os
 import csv
-import json
 import sys
 import argparse
 from pathlib import Path
 from collections import Counter, defaultdict
 from math import isclose
 
+# Shared storage helpers live in the repository root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from fundamental_store import FundamentalStore
+from parallel_scan import DEFAULT_WORKERS
+
 try:
     from tqdm import tqdm
 except ImportError:
@@ -49,6 +53,12 @@ def parse_arguments():
         default="../data/etfs.csv",
         help="Path to the output CSV."
     )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=DEFAULT_WORKERS,
+        help="Number of processes decoding ETF records. Default: one per CPU."
+    )
     return parser.parse_args()
 
 
@@ -94,6 +104,57 @@ def calculate_peers(etf_holdings_map):
     return result
 
 
+def extract_etf_row(record_symbol, data):
+    """
+    Builds the CSV row of one ETF record (peers are filled in later). Runs in the scan
+    worker processes.
+
+    Returns:
+        tuple: The row (or None), the codes of its valid holdings (or None) and the error
+        category the ETF falls in (or None).
+    """
+    try:
+        general_data = data.get("General", {})
+        symbol = general_data.get("Code", "")
+        etf_data = data.get("ETF_Data", {})
+        total_assets_raw = etf_data.get("TotalAssets", None)
+        try:
+            total_assets = float(total_assets_raw)
+        except (TypeError, ValueError):
+            return [symbol, None, None, "", "", "", 0], None, "Invalid TotalAssets"
+        avg_mkt_cap = etf_data.get("Average_Mkt_Cap_Mil", "")
+        holdings = etf_data.get("Holdings", {})
+        holding_codes_plain = []
+        holding_codes_display_list = []
+        for code, info in holdings.items():
+            if "." in code and len(code.split(".")[-1]) == 2:
+                holding_codes_plain.append(code)
+                assets_percent = info.get("Assets_%", None)
+                if assets_percent is not None:
+                    holding_codes_display_list.append(
+                        f"{code}({assets_percent})"
+                    )
+                else:
+                    holding_codes_display_list.append(code)
+        if not holding_codes_plain:
+            return [symbol, total_assets, avg_mkt_cap, "", "", "", 0], None, "No valid holdings"
+        holding_codes_str = ",".join(holding_codes_display_list)
+        country_dist_raw = calculate_country_distribution(holding_codes_plain)
+        row = [
+            symbol,
+            total_assets,
+            avg_mkt_cap,
+            country_dist_raw,
+            holding_codes_str,
+            "",
+            0
+        ]
+        return row, holding_codes_plain, None
+    except Exception as e:
+        print(f"Error processing {record_symbol}: {e}")
+        return None, None, "Other Errors"
+
+
 def main():
     args = parse_arguments()
     json_dir = args.json_dir
@@ -106,57 +167,17 @@ def main():
     error_categories = defaultdict(list)
 
     etf_holdings_map = {}
-    json_files = list(Path(json_dir).glob("*.json"))
-
-    for json_file in tqdm(json_files, desc="Reading JSON files"):
-        try:
-            with open(json_file, "r", encoding="utf-8") as file:
-                data = json.load(file)
-            general_data = data.get("General", {})
-            if general_data.get("Type") == "ETF":
-                symbol = general_data.get("Code", "")
-                etf_data = data.get("ETF_Data", {})
-                total_assets_raw = etf_data.get("TotalAssets", None)
-                try:
-                    total_assets = float(total_assets_raw)
-                except (TypeError, ValueError):
-                    error_categories["Invalid TotalAssets"].append(symbol)
-                    rows.append([symbol, None, None, "", "", "", 0])
-                    continue
-                avg_mkt_cap = etf_data.get("Average_Mkt_Cap_Mil", "")
-                holdings = etf_data.get("Holdings", {})
-                holding_codes_plain = []
-                holding_codes_display_list = []
-                for code, info in holdings.items():
-                    if "." in code and len(code.split(".")[-1]) == 2:
-                        holding_codes_plain.append(code)
-                        assets_percent = info.get("Assets_%", None)
-                        if assets_percent is not None:
-                            holding_codes_display_list.append(
-                                f"{code}({assets_percent})"
-                            )
-                        else:
-                            holding_codes_display_list.append(code)
-                if not holding_codes_plain:
-                    error_categories["No valid holdings"].append(symbol)
-                    rows.append([symbol, total_assets, avg_mkt_cap, "", "", "", 0])
-                    continue
-                holding_codes_str = ",".join(holding_codes_display_list)
-                country_dist_raw = calculate_country_distribution(holding_codes_plain)
-                rows.append([
-                    symbol,
-                    total_assets,
-                    avg_mkt_cap,
-                    country_dist_raw,
-                    holding_codes_str,
-                    "",
-                    0
-                ])
-                etf_holdings_map[symbol] = set(holding_codes_plain)
-        except Exception as e:
-            error_categories["Other Errors"].append(json_file.name)
-            print(f"Error processing {json_file}: {e}")
-
+    store = FundamentalStore(json_dir, workers=args.workers)
+    etf_symbols = [symbol for symbol, _ in store.scan(fields=("General.Type",), where={"General.Type": "ETF"})]
+    etfs = store.map(extract_etf_row, etf_symbols)
+    for record_symbol, (row, holdings, error) in tqdm(etfs, total=len(etf_symbols), desc="Reading JSON files"):
+        if error:
+            error_categories[error].append(row[0] if row else record_symbol)
+        if row:
+            rows.append(row)
+        if holdings:
+            etf_holdings_map[row[0]] = set(holdings)
+    store.close()
     rows.sort(key=lambda x: x[1] if x[1] is not None else 0, reverse=True)
 
     peers_dict = calculate_peers(etf_holdings_map)
@@ -1,12 +1,19 @@
 import os
-import json
+import sys
 import argparse
 import logging
 import plotly.graph_objs as go
 from datetime import datetime
+from functools import partial
 from pathlib import Path
 import plotly.graph_objs as go
 
+# Shared storage helpers live in the repository root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from fundamental_io import qualify_symbol
+from fundamental_store import FundamentalStore
+from parallel_scan import DEFAULT_WORKERS
+
 # Configure logging to display DEBUG messages
 logging.basicConfig(level=logging.DEBUG, format='%(levelname)s:%(message)s')
 
@@ -839,60 +846,52 @@ def generate_html_with_dropdown(data, output_filepath):
 # Market Cap categorization logic       #
 #########################################
 
-def extract_market_caps(data_dir: str) -> dict:
+def parse_market_cap(market_cap):
     """
-    Extracts market capitalization data from JSON files in the specified directory.
-    Returns a dict mapping symbol to market cap.
+    Returns a Highlights.MarketCapitalization value as an int, or None if it is not numeric.
     """
-    market_caps = {}
-    for json_file in Path(data_dir).glob("*.json"):
+    if isinstance(market_cap, str):
         try:
-            with open(json_file, "r") as file:
-                data = json.load(file)
-
-            symbol = json_file.stem.upper()
-
-            # Skip if it's a FUND type
-            general_data = data.get("General", {})
-            if general_data.get("Type") == "FUND":
-                continue
+            market_cap = int(market_cap.replace(",", ""))
+        except ValueError:
+            return None
+    return market_cap if isinstance(market_cap, int) else None
+
+def market_cap_category(cap: int) -> str:
+    if cap < 50_000_000:
+        return 'nano'
+    elif 50_000_000 <= cap < 300_000_000:
+        return 'micro'
+    elif 300_000_000 <= cap < 2_000_000_000:
+        return 'small'
+    elif 2_000_000_000 <= cap < 10_000_000_000:
+        return 'mid'
+    elif 10_000_000_000 <= cap < 200_000_000_000:
+        return 'large'
+    elif cap >= 200_000_000_000:
+        return 'mega'
+    return 'unknown'
+
+def in_market_cap_category(category: str):
+    """
+    Returns a FundamentalStore filter on Highlights.MarketCapitalization selecting the
+    symbols of a market cap category.
+    """
+    def check(market_cap):
+        market_cap = parse_market_cap(market_cap)
+        return market_cap is not None and market_cap_category(market_cap) == category
+    return check
 
-            market_cap = data.get("Highlights", {}).get("MarketCapitalization")
-            if isinstance(market_cap, str):
-                market_cap = int(market_cap.replace(",", ""))
-            if isinstance(market_cap, int):
-                market_caps[symbol] = market_cap
-        except Exception as e:
-            logging.error(f"Error processing file {json_file}: {e}")
-    return market_caps
-
-def categorize_market_caps(market_caps: dict) -> dict:
-    categories = {
-        'nano': [],
-        'micro': [],
-        'small': [],
-        'mid': [],
-        'large': [],
-        'mega': [],
-        'unknown': []
-    }
-
-    for symbol, cap in market_caps.items():
-        if cap < 50_000_000:
-            categories['nano'].append(symbol)
-        elif 50_000_000 <= cap < 300_000_000:
-            categories['micro'].append(symbol)
-        elif 300_000_000 <= cap < 2_000_000_000:
-            categories['small'].append(symbol)
-        elif 2_000_000_000 <= cap < 10_000_000_000:
-            categories['mid'].append(symbol)
-        elif 10_000_000_000 <= cap < 200_000_000_000:
-            categories['large'].append(symbol)
-        elif cap >= 200_000_000_000:
-            categories['mega'].append(symbol)
-        else:
-            categories['unknown'].append(symbol)
-    return categories
+def render_record(output_dir, symbol, data):
+    """
+    Writes the HTML page of one record. Runs in the scan worker processes.
+    """
+    try:
+        output_filepath = os.path.join(output_dir, f"{symbol.lower()}.html")
+        generate_html_with_dropdown(data, output_filepath)
+        return output_filepath
+    except Exception as e:
+        logging.error(f"Error generating HTML for {symbol}: {e}")
 
 #########################################
 # Main execution                        #
@@ -904,7 +903,7 @@ if __name__ == "__main__":
         "--symbol",
         type=str,
         required=False,
-        help="Symbol to generate HTML for (e.g., 'aapl')"
+        help="Symbol to generate HTML for, qualified with its exchange (e.g., 'aapl.us'); a bare code means US"
     )
     parser.add_argument(
         "--market-cap",
@@ -925,46 +924,44 @@ if __name__ == "__main__":
         default="../html/",
         help="Directory to save generated HTML files."
     )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=DEFAULT_WORKERS,
+        help="Number of processes rendering pages with --market-cap. Default: one per CPU."
+    )
 
     args = parser.parse_args()
 
-    # If market-cap is provided, ignore symbol and process all in that category
+    store = FundamentalStore(args.data_dir, workers=args.workers)
+
+    # If market-cap is provided, ignore symbol and process all in that category.
+    # The category is selected from the summary index, then each selected record is
+    # decoded and rendered once, in the worker processes.
     if args.market_cap:
-        market_caps = extract_market_caps(args.data_dir)
-        categories = categorize_market_caps(market_caps)
-        selected_symbols = categories.get(args.market_cap, [])
+        selected = store.scan(fields=("General.Type",),
+                              where={"General.Type": lambda asset_type: asset_type != "FUND",
+                                     "Highlights.MarketCapitalization": in_market_cap_category(args.market_cap)})
+        selected_symbols = [sym for sym, _ in selected]
         if not selected_symbols:
             logging.info(f"No symbols found for category '{args.market_cap}'.")
-        else:
-            for sym in selected_symbols:
-                symbol_file = os.path.join(args.data_dir, f"{sym.lower()}.json")
-                if not os.path.exists(symbol_file):
-                    logging.warning(f"No JSON data found for symbol: {sym}")
-                    continue
-                try:
-                    with open(symbol_file, "r") as file:
-                        data = json.load(file)
-                    output_filepath = os.path.join(args.output_dir, f"{sym.lower()}.html")
-                    generate_html_with_dropdown(data, output_filepath)
-                except Exception as e:
-                    logging.error(f"Error generating HTML for {sym}: {e}")
+        for sym, output_filepath in store.map(partial(render_record, args.output_dir), selected_symbols):
+            logging.debug(f"Wrote {output_filepath}")
     else:
         # Process a single symbol
         if not args.symbol:
             logging.error("You must provide either --symbol or --market-cap.")
             exit(1)
 
-        symbol = args.symbol.lower()
-        json_file = os.path.join(args.data_dir, f"{symbol}.json")
-        if not os.path.exists(json_file):
-            logging.error(f"Error: File {json_file} not found.")
-            exit(1)
+        symbol = qualify_symbol(args.symbol).lower()
         try:
-            with open(json_file, "r") as file:
-                data = json.load(file)
+            data = store.get(symbol)
         except Exception as e:
             logging.error(f"Error reading JSON file: {e}")
             exit(1)
+        if data is None:
+            logging.error(f"Error: No record for {symbol.upper()} found in {args.data_dir}.")
+            exit(1)
 
         output_filepath = os.path.join(args.output_dir, f"{symbol}.html")
         generate_html_with_dropdown(data, output_filepath)
@@ -1,11 +1,16 @@
 import os
-import json
+import sys
 import csv
 import argparse
 import logging
 from pathlib import Path
 from typing import Dict
 
+# Shared storage helpers live in the repository root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from fundamental_store import FundamentalStore, open_store
+from parallel_scan import DEFAULT_WORKERS
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
@@ -15,28 +20,23 @@ def extract_market_caps(data_dir: str) -> Dict[str, int]:
     Extracts market capitalization data from JSON files in the specified directory.
 
     Args:
-        data_dir (str): Path to the directory containing JSON files.
+        data_dir (str): Path to the directory containing JSON files, or a FundamentalStore.
 
     Returns:
         Dict[str, int]: A dictionary mapping symbols to their market capitalizations.
     """
     market_caps = {}
 
-    for json_file in Path(data_dir).glob("*.json"):
+    store = open_store(data_dir)
+    for symbol, fields in store.scan(fields=("General.Type", "Highlights.MarketCapitalization")):
         try:
-            with open(json_file, "r") as file:
-                data = json.load(file)
-
-            symbol = json_file.stem.upper()
-
             # Skip mutual funds
-            general_data = data.get("General", {})
-            if general_data.get("Type") == "FUND":
+            if fields["General.Type"] == "FUND":
                 logging.info(f"Skipping mutual fund: {symbol}")
                 continue
 
             # Extract market capitalization
-            market_cap = data.get("Highlights", {}).get("MarketCapitalization")
+            market_cap = fields["Highlights.MarketCapitalization"]
             if isinstance(market_cap, str):
                 market_cap = int(market_cap.replace(",", ""))
             elif not isinstance(market_cap, int):
@@ -45,7 +45,7 @@ def extract_market_caps(data_dir: str) -> Dict[str, int]:
 
             market_caps[symbol] = market_cap
         except Exception as e:
-            logging.error(f"Error processing file {json_file}: {e}")
+            logging.error(f"Error processing record {symbol}: {e}")
 
     return market_caps
 
@@ -126,10 +126,16 @@ if __name__ == "__main__":
         default="../market_cap_categories/",
         help="Directory to save the categorized market cap CSV files. Default: ./market_cap_categories/"
     )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=DEFAULT_WORKERS,
+        help="Processes decoding records missing from the summary index. Default: one per CPU."
+    )
     args = parser.parse_args()
 
     logging.info("Starting market cap categorization...")
-    market_caps = extract_market_caps(args.data_dir)
+    market_caps = extract_market_caps(FundamentalStore(args.data_dir, workers=args.workers))
     categories = categorize_market_caps(market_caps)
     write_categories_to_csv(categories, args.output_dir)
     logging.info("Market cap categorization complete.")
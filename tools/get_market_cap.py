@@ -1,11 +1,16 @@
 import os
-import json
+import sys
 import csv
 import logging
 import argparse
 from pathlib import Path
 from typing import Dict
 
+# Shared storage helpers live in the repository root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from fundamental_store import FundamentalStore, open_store
+from parallel_scan import DEFAULT_WORKERS
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
@@ -49,10 +54,10 @@ def categorize_market_caps(market_caps: Dict[str, int]) -> Dict[str, list]:
 
 def get_market_caps(data_dir, output_csv):
     """
-    Processes all JSON files in the specified directory to extract market capitalization data.
+    Processes all JSON records in the specified directory to extract market capitalization data.
 
     Args:
-        data_dir (str): Path to the directory containing JSON files.
+        data_dir (str): Path to the directory containing JSON files, or a FundamentalStore.
         output_csv (str): Path to the CSV file to save the results.
 
     Returns:
@@ -60,23 +65,17 @@ def get_market_caps(data_dir, output_csv):
     """
     market_caps = []
 
-    # Iterate through all JSON files in the directory
-    for json_file in Path(data_dir).glob("*.json"):
+    # Iterate through all JSON records in the directory
+    store = open_store(data_dir)
+    for symbol, fields in store.scan(fields=("General.Type", "Highlights.MarketCapitalization")):
         try:
-            with open(json_file, "r") as file:
-                data = json.load(file)
-
-            # Extract the symbol from the filename
-            symbol = json_file.stem.upper()
-
             # Check if the symbol is a mutual fund
-            general_data = data.get("General", {})
-            if general_data.get("Type") == "FUND":
+            if fields["General.Type"] == "FUND":
                 logging.info(f"Skipping mutual fund: {symbol}")
                 continue
 
             # Navigate to the 'MarketCapitalization' field in 'Highlights'
-            market_cap = data.get("Highlights", {}).get("MarketCapitalization")
+            market_cap = fields["Highlights.MarketCapitalization"]
 
             if market_cap:
                 # Ensure the value is numeric, either as an int or from a string
@@ -92,7 +91,7 @@ def get_market_caps(data_dir, output_csv):
             else:
                 logging.warning(f"Market cap not found for {symbol}. Skipping.")
         except Exception as e:
-            logging.error(f"Error processing file {json_file}: {e}")
+            logging.error(f"Error processing record {symbol}: {e}")
 
     # Sort by market capitalization in descending order
     market_caps.sort(key=lambda x: x[1], reverse=True)
@@ -131,11 +130,17 @@ if __name__ == "__main__":
         choices=['nano', 'micro', 'small', 'mid', 'large', 'mega', 'unknown'],
         help="If provided, return a list of symbols in that market cap category."
     )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=DEFAULT_WORKERS,
+        help="Processes decoding records missing from the summary index. Default: one per CPU."
+    )
 
     args = parser.parse_args()
 
     logging.info("Starting market cap extraction...")
-    market_caps_list = get_market_caps(args.data_dir, args.output_csv)
+    market_caps_list = get_market_caps(FundamentalStore(args.data_dir, workers=args.workers), args.output_csv)
     logging.info("Market cap extraction complete.")
 
     # Convert list of tuples to dict for categorization
@@ -0,0 +1,252 @@
+import os
+import socket
+import sqlite3
+import argparse
+import logging
+import time
+import uuid
+
+# Seconds a claimed item stays leased without a heartbeat before other workers may reclaim it
+LEASE_SECONDS = 300
+
+# Number of items claimed per round trip to the queue
+CLAIM_BATCH_SIZE = 50
+
+# Longest a worker with nothing to claim waits before checking for reclaimable items again
+POLL_INTERVAL = 5
+
+# Yielded by a worker's claim loop when nothing is claimable yet but other workers still
+# hold leases that may expire
+QUEUE_WAIT = object()
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS items (
+    symbol TEXT PRIMARY KEY,
+    exchange TEXT,
+    position INTEGER NOT NULL,
+    state TEXT NOT NULL,
+    owner TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    outcome TEXT,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_items_claim ON items(state, position);
+CREATE INDEX IF NOT EXISTS idx_items_owner ON items(owner);
+"""
+
+class WorkQueue:
+    """
+    Lease-based work queue in a SQLite file that several fetch processes (on one host, or
+    on hosts sharing the file) use to split one work list between them.
+
+    The queue uses a rollback journal rather than WAL: WAL keeps its index in shared memory,
+    which processes on different hosts can't see, so it breaks on network filesystems.
+    Those still need working file locks (e.g. NFS with lockd).
+
+    A worker claims a batch of pending items, which leases them to it for `lease_seconds`.
+    It renews its leases with `heartbeat()` while it works and marks items done with
+    `complete()` once their results are committed. Items whose lease expires, because their
+    worker died or hung, become claimable again.
+
+    Items move through the states pending -> leased -> done. Enqueuing a symbol that is
+    done puts it back to pending; pending and leased items are left untouched, so every
+    worker may enqueue the same plan.
+    """
+
+    def __init__(self, db_path, owner=None, lease_seconds=LEASE_SECONDS, batch_size=CLAIM_BATCH_SIZE):
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.owner = owner or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.lease_seconds = lease_seconds
+        self.batch_size = batch_size
+        self.poll_interval = min(POLL_INTERVAL, lease_seconds / 3)
+        self.last_heartbeat = time.monotonic()
+        # Transactions are managed explicitly so claims can take the write lock up front
+        self.conn = sqlite3.connect(db_path, timeout=60, isolation_level=None)
+        try:
+            journal_mode = self.conn.execute("PRAGMA journal_mode=DELETE").fetchone()[0]
+        except sqlite3.OperationalError:
+            journal_mode = "wal"
+        if journal_mode.lower() != "delete":
+            # Leaving WAL needs the file to itself, e.g. a queue created by an older version still in use
+            self.conn.close()
+            raise RuntimeError(f"Could not switch work queue {db_path} from WAL to a rollback journal; "
+                               f"stop the other processes using it and retry.")
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def enqueue(self, items):
+        """
+        Adds work in priority order.
+
+        Args:
+            items (list): (symbol, exchange) pairs.
+
+        Returns:
+            int: The number of items that became pending.
+        """
+        now = time.time()
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            start = self.conn.execute("SELECT COALESCE(MAX(position), -1) + 1 FROM items").fetchone()[0]
+            before = self.conn.total_changes
+            self.conn.executemany(
+                """
+                INSERT INTO items (symbol, exchange, position, state, updated_at) VALUES (?, ?, ?, 'pending', ?)
+                ON CONFLICT(symbol) DO UPDATE SET
+                    exchange = excluded.exchange,
+                    position = excluded.position,
+                    state = 'pending',
+                    owner = NULL,
+                    lease_expires = NULL,
+                    outcome = NULL,
+                    updated_at = excluded.updated_at
+                WHERE items.state = 'done'
+                """,
+                [(symbol, exchange, start + i, now) for i, (symbol, exchange) in enumerate(items)],
+            )
+            added = self.conn.total_changes - before
+            self.conn.execute("COMMIT")
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        return added
+
+    def claim(self):
+        """
+        Leases the next batch of pending or expired items to this worker.
+
+        Returns:
+            list: (symbol, exchange) pairs in priority order; empty when no work is left.
+        """
+        now = time.time()
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = self.conn.execute(
+                """
+                SELECT symbol, exchange, state FROM items
+                WHERE state = 'pending' OR (state = 'leased' AND lease_expires < ?)
+                ORDER BY position LIMIT ?
+                """,
+                (now, self.batch_size),
+            ).fetchall()
+            self.conn.executemany(
+                """
+                UPDATE items SET state = 'leased', owner = ?, lease_expires = ?, attempts = attempts + 1,
+                                 updated_at = ?
+                WHERE symbol = ?
+                """,
+                [(self.owner, now + self.lease_seconds, now, symbol) for symbol, _, _ in rows],
+            )
+            self.conn.execute("COMMIT")
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        reclaimed = sum(1 for _, _, state in rows if state == "leased")
+        if reclaimed:
+            logging.warning(f"Reclaimed {reclaimed} items whose lease expired.")
+        return [(symbol, exchange) for symbol, exchange, _ in rows]
+
+    def leased_by_others(self):
+        """
+        Returns whether other workers hold leases that have not expired.
+        """
+        return self.conn.execute(
+            "SELECT 1 FROM items WHERE state = 'leased' AND owner != ? AND lease_expires >= ? LIMIT 1",
+            (self.owner, time.time()),
+        ).fetchone() is not None
+
+    def heartbeat(self, force=False):
+        """
+        Renews the leases held by this worker. Without `force`, only does so once a third
+        of the lease period has passed since the last renewal.
+        """
+        if not force and time.monotonic() - self.last_heartbeat < self.lease_seconds / 3:
+            return
+        self.conn.execute(
+            "UPDATE items SET lease_expires = ? WHERE owner = ? AND state = 'leased'",
+            (time.time() + self.lease_seconds, self.owner),
+        )
+        self.last_heartbeat = time.monotonic()
+
+    def complete(self, outcomes):
+        """
+        Marks leased items as done.
+
+        Args:
+            outcomes (list): (symbol, outcome) pairs.
+        """
+        if not outcomes:
+            return
+        now = time.time()
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            self.conn.executemany(
+                """
+                UPDATE items SET state = 'done', outcome = ?, lease_expires = NULL, updated_at = ?
+                WHERE symbol = ? AND owner = ? AND state = 'leased'
+                """,
+                [(outcome, now, symbol, self.owner) for symbol, outcome in outcomes],
+            )
+            self.conn.execute("COMMIT")
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+
+    def release(self):
+        """
+        Returns every item still leased to this worker to the pending state.
+        """
+        self.conn.execute(
+            "UPDATE items SET state = 'pending', owner = NULL, lease_expires = NULL WHERE owner = ? AND state = 'leased'",
+            (self.owner,),
+        )
+
+    def retire(self, symbols):
+        """
+        Removes symbols that should no longer be fetched (e.g. delisted ones). Items
+        currently leased are left to their worker.
+
+        Returns:
+            int: The number of items removed.
+        """
+        before = self.conn.total_changes
+        self.conn.executemany("DELETE FROM items WHERE symbol = ? AND state != 'leased'", [(s,) for s in symbols])
+        return self.conn.total_changes - before
+
+    def counts(self):
+        """
+        Returns a dict mapping item state to the number of items in that state.
+        """
+        return dict(self.conn.execute("SELECT state, COUNT(*) FROM items GROUP BY state").fetchall())
+
+    def workers(self):
+        """
+        Returns (owner, leased items, latest lease expiry) for every worker holding leases.
+        """
+        return self.conn.execute(
+            "SELECT owner, COUNT(*), MAX(lease_expires) FROM items WHERE state = 'leased' GROUP BY owner ORDER BY owner"
+        ).fetchall()
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    parser = argparse.ArgumentParser(description="Inspect a shared fetch work queue.")
+    parser.add_argument("--queue", required=True, help="Path of the work queue SQLite file.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("status", help="Show the number of items per state and the workers holding leases.")
+    subparsers.add_parser("reset", help="Return every leased item to pending, e.g. after all workers were stopped.")
+    args = parser.parse_args()
+
+    queue = WorkQueue(args.queue)
+    if args.command == "status":
+        for state, count in sorted(queue.counts().items()):
+            print(f"{state}: {count}")
+        for owner, leased, expires in queue.workers():
+            print(f"{owner}: {leased} leased, lease expires in {expires - time.time():.0f} seconds")
+    elif args.command == "reset":
+        queue.conn.execute("UPDATE items SET state = 'pending', owner = NULL, lease_expires = NULL WHERE state = 'leased'")
+        print(f"Pending items: {queue.counts().get('pending', 0)}")
+    queue.close()